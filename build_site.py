@@ -7,6 +7,11 @@ from datetime import datetime
 from typing import Callable, Any
 from core.film import Film
 from core.filemanager import FM
+from core.cache import DictCache, iter_caches, cache_report
+from core.cache_gc import get_gc
+from core.integrity import scan
+from core.req import Req
+from core.web import Web
 import re
 from datetime import date
 from core.collector import Collector
@@ -18,6 +23,8 @@ logger = logging.getLogger(__name__)
 
 NOW = datetime.now()
 
+integrity_report = scan()
+
 films = tuple(Collector().get_films())
 films = tuple(sorted(films, key=lambda f: f.publication, reverse=True))
 
@@ -157,6 +164,14 @@ j.save(
 )
 
 FM.dump("out/films.json", films)
+gc_report = get_gc().run()
+for c in iter_caches(DictCache):
+    c.dump_manifest()
+FM.dump("out/cache_report.json", {
+    **cache_report(Req, Web),
+    "gc": gc_report,
+    "integrity": integrity_report
+})
 for g, c in sorted(count_genres.items(), key=lambda kv: (-kv[1], kv[0])):
     logger.debug(f"{c} x {g}")
 
@@ -1,21 +1,61 @@
 import functools
-import os
+import inspect
 import time
 import logging
 import hashlib
 from datetime import datetime
 import re
+from pathlib import Path
+from typing import Callable, Iterable, Any
+from contextlib import nullcontext
 from core.req import R
+from core.revalidate import REVALIDATION, NotModified
+from core.store import FileStore, SqliteStore, get_store, FILE_STORE
+from core.prefetch import POOL
+from core.cachestats import CacheStats, memo_stats
+from core.memcache import MEMORY
+from core.raw import RAW
+from threading import Lock
+from urllib.parse import urlsplit
 
-from .filemanager import FM
+from .filemanager import FM, ZstdDictNotFound
 
 logger = logging.getLogger(__name__)
 
+CACHES: list["Cache"] = []
+
 
 def myhash(s: str) -> str:
     return hashlib.sha256(s.encode('utf-8')).hexdigest()
 
 
+def get_version(func: Callable, version: str | int | bool | Callable | tuple[Callable, ...]) -> str | None:
+    """
+    None o False: sin version
+    str o int: version explicita
+    True: hash del codigo de func
+    funcion(es): hash del codigo de func y de esas funciones
+    (por ejemplo el _clean_js que transforma la respuesta)
+    """
+    if version is None or version is False:
+        return None
+    if isinstance(version, (str, int)) and not isinstance(version, bool):
+        return str(version)
+    fncs = [func]
+    if callable(version):
+        fncs.append(version)
+    elif isinstance(version, tuple):
+        fncs.extend(version)
+    src = []
+    for f in fncs:
+        try:
+            src.append(inspect.getsource(inspect.unwrap(f)))
+        except (OSError, TypeError) as e:
+            logger.warning(f"No se puede obtener el codigo de {f}: {e}")
+            return None
+    return myhash("\n".join(src))[:12]
+
+
 def to_timestamp(s):
     if not isinstance(s, str):
         return None
@@ -23,8 +63,19 @@ def to_timestamp(s):
 
 
 class Cache:
-    def __init__(self, file: str, *args, kwself=None, reload: bool = False, skip: bool = False, maxOld=1, loglevel=None, **kwargs):
+    def __init__(self, file: str, *args, kwself=None, reload: bool = False, skip: bool = False, maxOld=1, loglevel=None, revalidate: bool = False, store: FileStore | SqliteStore | str = None, version: str | int | bool | Callable | tuple[Callable, ...] = None, rebuild: Callable = None, raw: Callable = None, **kwargs):
         self.file = file
+        self._version = version
+        # rebuild(*args) regenera la entrada sin red (a partir de la respuesta original)
+        # cuando la version no coincide, recibe los mismos argumentos que la funcion
+        self.rebuild = rebuild
+        # raw(*args) url de la respuesta original guardada en RAW (la que usa rebuild),
+        # recibe los mismos argumentos que la funcion; sirve para que CacheGC no la borre
+        self.raw = raw
+        self.version: str | None = None
+        self.__current: dict[str, float] = {}
+        self.store = store if isinstance(store, (FileStore, SqliteStore)) else get_store(store)
+        self.revalidate = revalidate
         self.func = None
         self.reload = reload
         self.maxOld = maxOld
@@ -34,53 +85,226 @@ class Cache:
             self.maxOld = time.time() - (maxOld * 86400)
         self._kwargs = kwargs
         self.skip = skip
+        self.name = file
+        self.stats = CacheStats()
+        # claves usadas en esta ejecucion (las que no estan aqui son candidatas al gc)
+        self.used: set[str] = set()
+        # entradas leidas de una vez con preload, read las entrega una sola vez
+        self.__preloaded: dict[str, Any] = {}
+        CACHES.append(self)
 
     def parse_file_name(self, *args, slf=None, **kwargs):
         if args or kwargs:
             return self.file.format(*args, **kwargs)
         return self.file
 
+    def preload(self, keys: Iterable[str]) -> int:
+        """
+        Lee de una vez (store.load_many) las entradas que se van a pedir
+        a continuacion para no ir al store clave a clave
+        """
+        keys = tuple(k for k in keys if k is not None and k not in self.__preloaded)
+        if len(keys) == 0:
+            return 0
+        with self.stats.timer("preload"):
+            data = self.store.load_many(keys, **self._kwargs)
+        self.__preloaded.update(data)
+        self.stats.incr("preloaded", len(data))
+        return len(data)
+
+    def stale(self, slf, args: Iterable) -> tuple:
+        """
+        De args (el argumento de cada llamada, ej: ids de fichas) devuelve
+        los que hay que pedir de nuevo y precarga las entradas del resto
+        """
+        keys = {a: self.get_file_name(slf, a) for a in args}
+        todo = tuple(a for a, k in keys.items() if self.needUpdate(k))
+        skip = set(todo)
+        self.preload(k for a, k in keys.items() if a not in skip)
+        return todo
+
     def read(self, file, *args, **kwargs):
-        return FM.load(file, **self._kwargs)
+        data = self.__preloaded.pop(file, None)
+        if data is not None:
+            return data
+        key = (self.store, file)
+        mtime = self.store.mtime(file)
+        data = MEMORY.get(key, mtime)
+        if data is not None:
+            self.stats.incr("memory")
+            return data
+        with self.stats.timer("read"):
+            try:
+                data = self.store.load(file, **self._kwargs)
+            except ZstdDictNotFound as e:
+                # no se va a poder leer nunca, se trata como si no existiera
+                logger.warning(f"Cache.read({file}): {e}")
+                self.store.rm(file)
+                MEMORY.discard(key)
+                return None
+        self.stats.incr("bytes_read", self.store.size(file))
+        MEMORY.put(key, mtime, data)
+        return data
 
     def save(self, file, data, *args, **kwargs):
         if file is None:
             return
-        FM.dump(file, data, **self._kwargs)
+        self.__preloaded.pop(file, None)
+        MEMORY.discard((self.store, file))
+        with self.stats.timer("save"):
+            self.store.dump(file, data, **self._kwargs)
+        self.stats.incr("bytes_written", self.store.size(file))
 
-    def tooOld(self, fl: str):
-        if fl is None:
-            return True
-        if not os.path.isfile(fl):
+    def read_meta(self, file) -> dict:
+        return self.store.load_meta(file)
+
+    def save_meta(self, file, **kwargs):
+        meta = {**self.read_meta(file), **kwargs}
+        self.store.dump_meta(file, meta)
+
+    def touch(self, file, mtime: float = None):
+        self.store.touch(file, mtime)
+        MEMORY.retime((self.store, file), self.store.mtime(file))
+
+    def isTooOld(self, mtime: float | None):
+        if mtime is None:
             return True
         if self.reload:
             return True
         if self.maxOld is None:
             return False
-        if os.stat(fl).st_mtime < self.maxOld:
+        if mtime < self.maxOld:
             return True
         return False
 
+    def tooOld(self, fl: str):
+        if fl is None:
+            return True
+        return self.isTooOld(self.store.mtime(fl))
+
     def log(self, txt):
         if self.loglevel is not None:
             logger.log(self.loglevel, txt)
 
-    def callCache(self, slf, *args, **kwargs):
+    def get_file_name(self, slf, *args, **kwargs):
         flkwargs = dict(kwargs)
         if isinstance(self.kwself, str):
             flkwargs[self.kwself] = slf
-        fl = self.parse_file_name(*args, **flkwargs)
-        if not self.tooOld(fl):
+        return self.parse_file_name(*args, **flkwargs)
+
+    def keys(self) -> tuple[str, ...]:
+        return self.store.keys(self.file)
+
+    def isCurrent(self, fl: str):
+        """
+        True si la entrada fue generada con la version actual
+        """
+        if self.version is None or fl is None:
+            return True
+        mtime = self.store.mtime(fl)
+        if mtime is None:
+            return False
+        if self.__current.get(fl) == mtime:
+            return True
+        if self.read_meta(fl).get('version') != self.version:
+            return False
+        self.__current[fl] = mtime
+        return True
+
+    def needUpdate(self, fl: str):
+        return self.tooOld(fl) or not self.isCurrent(fl)
+
+    def parse_key(self, key: str) -> tuple[str, ...] | None:
+        """
+        Argumentos con los que se genero la clave (ej: rec/rtve/ficha/123.json -> ('123', ))
+        """
+        if "{}" not in self.file:
+            return None
+        rg = "^" + re.escape(self.file).replace(re.escape("{}"), "(.+?)") + "$"
+        m = re.match(rg, key)
+        return m.groups() if m else None
+
+    def save_rebuilt(self, fl: str, data, mtime: float = None):
+        """
+        Guarda una entrada regenerada con la version actual
+        conservando sus validadores y, si se indica, su mtime
+        """
+        self.save(fl, data)
+        self.save_meta(fl, version=self.version)
+        self.touch(fl, mtime)
+        self.stats.incr("rebuild")
+
+    def __rebuild(self, fl: str, fargs: tuple, kwargs: dict, mtime: float = None):
+        try:
+            data = self.rebuild(*fargs, **kwargs)
+        except Exception as e:
+            logger.warning(f"Cache.rebuild({fl}): {e}")
+            return None
+        if data is not None:
+            self.log(f"Cache.rebuild({fl})")
+            self.save_rebuilt(fl, data, mtime)
+        return data
+
+    def _callCache(self, fl: str, fargs: tuple, *args, **kwargs):
+        if fl is not None:
+            self.used.add(fl)
+            if self.raw is not None:
+                RAW.use(self.raw(*fargs, **kwargs))
+        current = self.isCurrent(fl)
+        if current and not self.tooOld(fl):
             self.log(f"Cache.read({fl})")
             data = self.read(fl, *args, **kwargs)
+            if data is not None:
+                self.stats.incr("hit")
+                return data
+        exists = fl is not None and self.store.exists(fl)
+        self.stats.incr("stale" if exists else "miss")
+        if exists and not current:
+            self.stats.incr("version")
+        can_rebuild = exists and not current and self.rebuild is not None
+        if can_rebuild and not self.tooOld(fl):
+            data = self.__rebuild(fl, fargs, kwargs, mtime=self.store.mtime(fl))
             if data is not None:
                 return data
-        data = self.func(slf, *args, **kwargs)
+        # una entrada de otra version solo se revalida si se puede regenerar
+        revalidate = self.revalidate and exists and (current or can_rebuild)
+        ctx = nullcontext({})
+        if self.revalidate:
+            ctx = REVALIDATION.context(self.read_meta(fl).get('validators') if revalidate else None)
+        with ctx as validators:
+            try:
+                with self.stats.timer("func"):
+                    data = self.func(*fargs, **kwargs)
+            except NotModified:
+                if not revalidate:
+                    raise
+                self.stats.incr("revalidated")
+                if current:
+                    self.log(f"Cache.touch({fl})")
+                    self.touch(fl)
+                    return self.read(fl, *args, **kwargs)
+                data = self.__rebuild(fl, fargs, kwargs)
+                if data is not None:
+                    return data
+                with REVALIDATION.context(None) as validators:
+                    with self.stats.timer("func"):
+                        data = self.func(*fargs, **kwargs)
         if data is not None:
             self.log(f"Cache.save({fl})")
             self.save(fl, data, *args, **kwargs)
+            meta = {}
+            if self.revalidate:
+                meta['validators'] = validators
+            if self.version is not None:
+                meta['version'] = self.version
+            if meta and fl is not None:
+                self.save_meta(fl, **meta)
         return data
 
+    def callCache(self, slf, *args, **kwargs):
+        fl = self.get_file_name(slf, *args, **kwargs)
+        return self._callCache(fl, (slf, ) + args, *args, **kwargs)
+
     def __call__(self, func):
         if self.skip:
             return func
@@ -89,24 +313,55 @@ class Cache:
             return self.callCache(*args, **kwargs)
         functools.update_wrapper(callCache, func)
         self.func = func
+        self.name = func.__qualname__
+        self.version = get_version(func, self._version)
         setattr(callCache, "__cache_obj__", self)
         return callCache
 
 
+def get_cache_obj(func) -> Cache | None:
+    return getattr(func, "__cache_obj__", None)
+
+
+def iter_caches(cls: type[Cache] = None):
+    for c in CACHES:
+        if cls is None or isinstance(c, cls):
+            yield c
+
+
+def cache_report(*memo: type) -> dict:
+    """
+    Estadisticas de todas las Cache usadas en la ejecucion y de los
+    metodos con functools.cache de las clases memo (Req, Web...)
+    """
+    caches = {}
+    for c in CACHES:
+        if c.stats.is_empty():
+            continue
+        caches[c.name] = {
+            "file": c.file,
+            "store": type(c.store).__name__,
+            **c.stats.to_dict()
+        }
+    memos = {}
+    for cls in memo:
+        for fnc in vars(cls).values():
+            st = memo_stats(fnc)
+            if st is not None:
+                memos[f"{cls.__name__}.{fnc.__name__}"] = st
+    return {
+        "__time__": datetime.now().strftime("%Y-%m-%d %H:%M"),
+        "cache": caches,
+        "memory": MEMORY.to_dict(),
+        "memo": memos
+    }
+
+
 class StaticCache(Cache):
     def callCache(self, *args, **kwargs):
         flkwargs = dict(kwargs)
         fl = self.parse_file_name(*args, **flkwargs)
-        if not self.tooOld(fl):
-            self.log(f"Cache.read({fl})")
-            data = self.read(fl, *args, **kwargs)
-            if data is not None:
-                return data
-        data = self.func(*args, **kwargs)
-        if data is not None:
-            self.log(f"Cache.save({fl})")
-            self.save(fl, data, *args, **kwargs)
-        return data
+        return self._callCache(fl, args, *args, **kwargs)
 
     def parse_file_name(self, *args, **kwargs):
         if args or kwargs:
@@ -123,6 +378,8 @@ class TupleCache(Cache):
 
     def read(self, file, *args, **kwargs):
         data = super().read(file, *args, **kwargs)
+        if data is None:
+            return None
         if isinstance(data, dict):
             return self.builder(data)
         return tuple((self.builder(d) for d in data))
@@ -138,17 +395,139 @@ class HashCache(Cache):
 
 
 class DictCache(Cache):
-    def __init__(self, *args, mirror: tuple[str, ...], **kwargs):
-        super().__init__(*args, **kwargs)
+    MANIFEST = "manifest.json"
+    PACK = "pack.json"
+    # a partir de cuantas entradas pendientes compensa bajar el pack entero
+    PACK_MIN = 20
+
+    def __init__(self, *args, mirror: tuple[str, ...], store=FILE_STORE, **kwargs):
+        # por defecto en ficheros, porque estos directorios se publican
+        # y sirven de mirror para otras ejecuciones
+        super().__init__(*args, store=store, **kwargs)
         self.__mirror = tuple()
         if isinstance(mirror, str):
             self.__mirror = tuple(mirror.strip().split())
         elif isinstance(mirror, tuple):
             self.__mirror = mirror
+        self.__manifests: dict[str, dict] = None
+        # nombres ya sincronizados (o intentados) en esta ejecucion
+        self.__synced: set[str] = set()
+        self.__lock = Lock()
 
-    def __find_in_mirror(self, name: str) -> tuple[str, dict] | tuple[None, None]:
+    def __get_key(self, name: str) -> str:
+        return str(Path(self.file).parent.joinpath(name))
+
+    def __get_manifests(self) -> dict[str, dict]:
+        with self.__lock:
+            if self.__manifests is None:
+                self.__manifests = {}
+                for m in self.__mirror:
+                    js = R.safe_get_json(m + DictCache.MANIFEST)
+                    if isinstance(js, dict) and isinstance(js.get('files'), dict):
+                        self.__manifests[m] = js
+            return self.__manifests
+
+    def __sync(self, names: Iterable[str]):
+        """
+        Con los manifest de los mirrors decide cuales de las entradas names
+        faltan (o son mas antiguas) en local y las baja, de una vez si son
+        muchas. Solo se bajan las que se piden, no todo lo que tenga el mirror
+        """
+        manifests = self.__get_manifests()
+        with self.__lock:
+            names = tuple(n for n in dict.fromkeys(names) if n not in self.__synced)
+            self.__synced.update(names)
+        best: dict[str, tuple[float, str]] = {}
+        for m, js in manifests.items():
+            for name in names:
+                if name not in js['files']:
+                    continue
+                ts = to_timestamp(js['files'][name]) or -1
+                if name not in best or ts > best[name][0]:
+                    best[name] = (ts, m)
+        if len(best) == 0:
+            return
+        mtimes = self.store.mtimes(map(self.__get_key, best.keys()))
+        todo: dict[str, dict[str, float]] = {}
+        for name, (ts, m) in best.items():
+            mtime = mtimes.get(self.__get_key(name))
+            if mtime is None or (self.isTooOld(mtime) and ts > mtime):
+                todo.setdefault(m, {})[name] = ts
+        for m, names in todo.items():
+            if len(names) > 1:
+                logger.info(f"{m}{DictCache.MANIFEST}: {len(names)} entradas a sincronizar")
+            pack = {}
+            pack_name = manifests[m].get('pack')
+            if pack_name and len(names) >= DictCache.PACK_MIN:
+                pack = R.safe_get_json(m + pack_name)
+                if not isinstance(pack, dict):
+                    pack = {}
+            with self.store.batch():
+                for name in names:
+                    if isinstance(pack.get(name), dict):
+                        self.__save_from_mirror(m + name, pack[name])
+            rest = tuple(n for n in names if not isinstance(pack.get(n), dict))
+            if len(rest) == 1:
+                self.__save_from_mirror(m + rest[0])
+                continue
+            POOL.prefetch(
+                lambda name: self.__save_from_mirror(m + name),
+                rest,
+                host=urlsplit(m).netloc,
+                label=f"mirror {m}"
+            )
+
+    def __save_from_mirror(self, url: str, data: dict = None):
+        if data is None:
+            data = R.safe_get_json(url)
+        if not isinstance(data, dict):
+            return
+        fl = self.__get_key(url.rsplit("/", 1)[-1])
+        tm = data.get('__time__')
+        ts_time = to_timestamp(tm)
+        self.save(fl, data)
+        # se ha pedido en esta ejecucion, no es una huerfana para CacheGC
+        self.used.add(fl)
+        self.stats.incr("mirror")
+        if ts_time is None:
+            logger.debug(f"{url} -> {fl}")
+        else:
+            logger.debug(f"{url} (time={tm}) -> {fl}")
+            self.touch(fl, ts_time)
+
+    def dump_manifest(self, pack: bool = True):
+        """
+        Genera el manifest (nombre -> __time__) y, opcionalmente, el pack
+        con todas las entradas, para que esta cache sirva de mirror
+        """
+        if not isinstance(self.store, FileStore):
+            return
+        path = FM.resolve_path(self.file)
+        files: dict[str, str] = {}
+        data: dict[str, dict] = {}
+        for fl in sorted(path.parent.glob(path.name.replace("{}", "*"))):
+            if fl.name in (DictCache.MANIFEST, DictCache.PACK) or not fl.is_file():
+                continue
+            js = FM.load(fl)
+            if isinstance(js, dict):
+                files[fl.name] = js.get('__time__')
+                data[fl.name] = js
+        manifest = {
+            "__time__": datetime.now().strftime("%Y-%m-%d %H:%M"),
+            "files": files
+        }
+        if pack:
+            FM.dump(path.parent.joinpath(DictCache.PACK), data, indent=None)
+            manifest['pack'] = DictCache.PACK
+        FM.dump(path.parent.joinpath(DictCache.MANIFEST), manifest, indent=None)
+        logger.info(f"{path.parent.joinpath(DictCache.MANIFEST)}: {len(files)} entradas")
+
+    def keys(self) -> tuple[str, ...]:
+        return tuple(k for k in super().keys() if Path(k).name not in (DictCache.MANIFEST, DictCache.PACK))
+
+    def __find_in_mirror(self, name: str, *mirrors: str) -> tuple[str, dict] | tuple[None, None]:
         u, d = None, {}
-        for m in self.__mirror:
+        for m in mirrors:
             url = m + name
             data = R.safe_get_json(url)
             if isinstance(data, dict):
@@ -160,30 +539,24 @@ class DictCache(Cache):
             return u, d
         return None, None
 
+    def stale(self, slf, args: Iterable) -> tuple:
+        args = tuple(args)
+        self.__sync(Path(self.get_file_name(slf, a)).name for a in args)
+        return super().stale(slf, args)
+
     def tooOld(self, fl: str):
         if fl is None:
             return True
-        path = FM.resolve_path(fl)
-        if not path.is_file():
-            url, data = self.__find_in_mirror(path.name)
+        self.__sync((Path(fl).name, ))
+        if not self.store.exists(fl):
+            manifests = self.__get_manifests()
+            # los mirrors con manifest ya se han sincronizado,
+            # solo se pregunta uno a uno a los que no lo tienen
+            mirrors = tuple(m for m in self.__mirror if m not in manifests)
+            url, data = self.__find_in_mirror(Path(fl).name, *mirrors)
             if isinstance(data, dict):
-                tm = data.get('__time__')
-                ts_time = to_timestamp(tm)
-                self.save(fl, data)
-                if ts_time is None:
-                    logger.debug(f"{url} -> {fl}")
-                else:
-                    logger.debug(f"{url} (time={tm}) -> {fl}")
-                    os.utime(path, (ts_time, ts_time))
-        if not path.is_file():
-            return True
-        if self.reload:
-            return True
-        if self.maxOld is None:
-            return False
-        if os.stat(fl).st_mtime < self.maxOld:
-            return True
-        return False
+                self.__save_from_mirror(url, data)
+        return super().tooOld(fl)
 
     def save(self, file, data, *args, **kwargs):
         if isinstance(data, dict) and data.get('__time__') is None:
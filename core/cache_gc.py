@@ -0,0 +1,176 @@
+from typing import NamedTuple, Iterable
+from zipfile import ZipFile, ZIP_DEFLATED
+from time import time
+from core.cache import Cache, iter_caches
+from core.store import FileStore, SqliteStore
+from core.raw import RawStore, RAW
+from core.filemanager import FM
+from core.util import get_env
+import logging
+
+logger = logging.getLogger(__name__)
+
+# ultima ejecucion en la que se uso cada entrada (clave -> timestamp),
+# la fecha de acceso del sistema de ficheros no es fiable (relatime, noatime)
+USED_FILE = "rec/cache_used.json"
+
+
+class Source(NamedTuple):
+    """
+    Conjunto de entradas que limpia CacheGC: una Cache o un RawStore
+    """
+    name: str
+    store: FileStore | SqliteStore | RawStore
+    used: set[str]
+    keys: tuple[str, ...]
+
+
+class Entry(NamedTuple):
+    source: Source
+    key: str
+    size: int
+    mtime: float
+    used: float
+
+
+def _to_mb(size: int):
+    return round(size / (1024 * 1024), 2)
+
+
+class CacheGC:
+    """
+    Limpia las Cache usadas en la ejecucion (y los RawStore, ej: RAW):
+    1. las entradas que no se han usado (huerfanas) y llevan mas de max_old dias
+    sin usarse se borran (o se archivan en un zip si se indica archive)
+    2. si aun asi se supera max_size (bytes) se borran las huerfanas
+    que hace mas que no se usan hasta quedar por debajo
+
+    La fecha de uso de cada entrada se guarda en used_file en cada ejecucion
+    (si no consta se usa la de escritura)
+
+    Las caches que no se han usado en la ejecucion no se tocan, porque
+    no se sabe cuales son sus entradas vivas
+    """
+
+    def __init__(self, max_old: float = 180, max_size: int = None, archive: str = None, dry_run: bool = False, used_file: str = USED_FILE):
+        self.max_old = max_old
+        self.used_file = used_file
+        self.max_size = max_size
+        self.archive = archive
+        self.dry_run = dry_run
+
+    def __load_used(self) -> dict[str, float]:
+        path = FM.resolve_path(self.used_file)
+        if not path.is_file():
+            return {}
+        data = FM.load(path)
+        return data if isinstance(data, dict) else {}
+
+    def __iter_entries(self, src: Source, used: dict[str, float]):
+        for key in src.keys:
+            mtime = src.store.mtime(key)
+            if mtime is None:
+                continue
+            yield Entry(
+                source=src,
+                key=key,
+                size=src.store.size(key),
+                mtime=mtime,
+                used=max(used.get(key) or 0, mtime)
+            )
+
+    def __remove(self, entries: list[Entry], zf: ZipFile | None):
+        for e in entries:
+            if self.dry_run:
+                continue
+            if zf is not None and isinstance(e.source.store, RawStore):
+                zf.write(FM.resolve_path(e.key), e.key)
+            elif zf is not None:
+                data = e.source.store.load(e.key)
+                if data is not None:
+                    zf.writestr(e.key, FM.dumps_json(data))
+            e.source.store.rm(e.key)
+
+    def run(self, caches: Iterable[Cache] = None, raws: Iterable[RawStore] = (RAW, )) -> dict:
+        sources = [
+            Source(name=c.name, store=c.store, used=c.used, keys=c.keys())
+            for c in (iter_caches() if caches is None else caches) if "{}" in c.file and len(c.used) > 0
+        ] + [
+            Source(name=r.name, store=r, used=r.used, keys=r.keys())
+            for r in (raws or tuple()) if len(r.used) > 0
+        ]
+        now = time()
+        limit = now - (self.max_old * 86400)
+        used = self.__load_used()
+        for src in sources:
+            for k in src.used:
+                used[k] = now
+        live: list[Entry] = []
+        orphan: list[Entry] = []
+        for src in sources:
+            for e in self.__iter_entries(src, used):
+                if e.key in src.used:
+                    live.append(e)
+                else:
+                    orphan.append(e)
+        size_before = sum(e.size for e in live + orphan)
+        remove = [e for e in orphan if e.used < limit]
+        keep = sorted((e for e in orphan if e.used >= limit), key=lambda e: e.used)
+        size = size_before - sum(e.size for e in remove)
+        if self.max_size is not None:
+            while keep and size > self.max_size:
+                e = keep.pop(0)
+                remove.append(e)
+                size = size - e.size
+            if size > self.max_size:
+                logger.warning(f"CacheGC: las entradas vivas ocupan {_to_mb(size)}MB > {_to_mb(self.max_size)}MB")
+        zf = None
+        if self.archive and remove and not self.dry_run:
+            path = FM.resolve_path(self.archive)
+            path.parent.mkdir(parents=True, exist_ok=True)
+            zf = ZipFile(path, "a", compression=ZIP_DEFLATED)
+        try:
+            self.__remove(remove, zf)
+        finally:
+            if zf is not None:
+                zf.close()
+        if not self.dry_run:
+            for e in remove:
+                used.pop(e.key, None)
+            FM.dump(self.used_file, used, indent=None)
+        by_cache: dict[str, dict[str, int]] = {}
+        for src in sources:
+            rm = [e for e in remove if e.source is src]
+            by_cache[src.name] = {
+                "live": len(src.used),
+                "removed": len(rm),
+                "bytes": sum(e.size for e in rm)
+            }
+        reclaimed = size_before - size
+        report = {
+            "dry_run": self.dry_run,
+            "archive": self.archive,
+            "removed": len(remove),
+            "reclaimed_bytes": reclaimed,
+            "reclaimed_mb": _to_mb(reclaimed),
+            "size_before_mb": _to_mb(size_before),
+            "size_after_mb": _to_mb(size),
+            "cache": by_cache
+        }
+        logger.info(f"CacheGC: {len(remove)} entradas eliminadas, {_to_mb(reclaimed)}MB liberados ({_to_mb(size_before)}MB -> {_to_mb(size)}MB)")
+        return report
+
+
+def get_gc() -> CacheGC:
+    """
+    Configuracion por variables de entorno:
+    CACHE_GC_DAYS (180), CACHE_GC_MAX_MB (sin limite),
+    CACHE_GC_ARCHIVE (zip donde guardar lo borrado) y CACHE_GC_DRY_RUN
+    """
+    max_mb = get_env('CACHE_GC_MAX_MB')
+    return CacheGC(
+        max_old=float(get_env('CACHE_GC_DAYS', default='180')),
+        max_size=int(float(max_mb) * 1024 * 1024) if max_mb else None,
+        archive=get_env('CACHE_GC_ARCHIVE'),
+        dry_run=get_env('CACHE_GC_DRY_RUN') not in (None, "", "0")
+    )
@@ -0,0 +1,101 @@
+from threading import Lock
+from time import perf_counter
+from contextlib import contextmanager
+from bisect import bisect_left
+from typing import Callable
+
+# limites superiores (ms) de cada tramo del histograma
+BUCKETS_MS = (1, 5, 10, 50, 100, 500, 1000, 5000, 30000)
+
+
+class Histogram:
+    def __init__(self, buckets: tuple[float, ...] = BUCKETS_MS):
+        self.__buckets = buckets
+        self.__counts = [0] * (len(buckets) + 1)
+        self.__count = 0
+        self.__total = 0
+        self.__max = 0
+
+    def add(self, ms: float):
+        self.__counts[bisect_left(self.__buckets, ms)] += 1
+        self.__count = self.__count + 1
+        self.__total = self.__total + ms
+        self.__max = max(self.__max, ms)
+
+    def to_dict(self):
+        labels = [f"<={b}ms" for b in self.__buckets] + [f">{self.__buckets[-1]}ms"]
+        return {
+            "count": self.__count,
+            "total_ms": round(self.__total, 1),
+            "avg_ms": round(self.__total / self.__count, 2) if self.__count else None,
+            "max_ms": round(self.__max, 1),
+            "buckets": {k: v for k, v in zip(labels, self.__counts) if v > 0}
+        }
+
+
+class CacheStats:
+    """
+    Contadores y tiempos de una Cache:
+    hit (se lee la entrada), miss (no existe), stale (existe pero caducada),
+    revalidated (304), mirror (entrada traida de un mirror),
+    preloaded (entradas leidas de una vez con Cache.preload),
+    memory (hit servido desde MEMORY sin leer el store),
+    bytes_read / bytes_written y tiempos de read, save y la funcion envuelta
+    """
+
+    def __init__(self):
+        self.__counters: dict[str, int] = {}
+        self.__times: dict[str, Histogram] = {}
+        self.__lock = Lock()
+
+    def incr(self, key: str, n: int = 1):
+        if not n:
+            return
+        with self.__lock:
+            self.__counters[key] = self.__counters.get(key, 0) + n
+
+    def add_time(self, key: str, ms: float):
+        with self.__lock:
+            if key not in self.__times:
+                self.__times[key] = Histogram()
+            self.__times[key].add(ms)
+
+    @contextmanager
+    def timer(self, key: str):
+        start = perf_counter()
+        try:
+            yield
+        finally:
+            self.add_time(key, (perf_counter() - start) * 1000)
+
+    def is_empty(self):
+        return len(self.__counters) == 0 and len(self.__times) == 0
+
+    def to_dict(self):
+        with self.__lock:
+            counters = dict(sorted(self.__counters.items()))
+            times = {k: v.to_dict() for k, v in sorted(self.__times.items())}
+        hit = counters.get("hit", 0)
+        total = hit + counters.get("miss", 0) + counters.get("stale", 0)
+        return {
+            **counters,
+            "hit_ratio": round(hit / total, 3) if total else None,
+            "time": times
+        }
+
+
+def memo_stats(fnc: Callable) -> dict | None:
+    """
+    Estadisticas de una funcion decorada con functools.cache / lru_cache
+    """
+    info = getattr(fnc, "cache_info", None)
+    if info is None:
+        return None
+    i = info()
+    total = i.hits + i.misses
+    return {
+        "hit": i.hits,
+        "miss": i.misses,
+        "size": i.currsize,
+        "hit_ratio": round(i.hits / total, 3) if total else None
+    }
@@ -0,0 +1,141 @@
+from dataclasses import is_dataclass, asdict
+from datetime import date, datetime
+from typing import Any, Callable
+from core.util import get_env
+import json
+import logging
+import re
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+logger = logging.getLogger(__name__)
+
+re_non_ascii = re.compile(r"[^\x00-\x7f]")
+
+
+def to_builtin(obj):
+    """
+    Convierte recursivamente NamedTuple y dataclass en dict
+    (solo hace falta con el json de la libreria estandar)
+    """
+    if getattr(obj, "_asdict", None) is not None:
+        obj = obj._asdict()
+    if is_dataclass(obj):
+        obj = asdict(obj)
+    if isinstance(obj, (list, tuple, set)):
+        return tuple(map(to_builtin, obj))
+    if isinstance(obj, dict):
+        obj = {k: to_builtin(v) for k, v in obj.items()}
+    return obj
+
+
+def _default(o):
+    if getattr(o, "_asdict", None) is not None:
+        return o._asdict()
+    if is_dataclass(o):
+        return asdict(o)
+    if isinstance(o, (set, frozenset)):
+        return tuple(o)
+    if isinstance(o, (date, datetime)):
+        return o.isoformat()
+    raise TypeError(f"Object of type {type(o).__name__} is not JSON serializable")
+
+
+def _escape(m: re.Match):
+    c = ord(m.group())
+    if c < 0x10000:
+        return f"\\u{c:04x}"
+    c = c - 0x10000
+    return f"\\u{0xd800 | (c >> 10):04x}\\u{0xdc00 | (c & 0x3ff):04x}"
+
+
+def to_ascii(js: str) -> str:
+    """
+    Escapa (\\uXXXX) los caracteres no ascii de un json ya serializado,
+    igual que ensure_ascii=True del json estandar (fuera de las cadenas
+    de un json no puede haber caracteres no ascii)
+    """
+    return re_non_ascii.sub(_escape, js)
+
+
+def _chain(default: Callable[[Any], Any] | None):
+    if default is None:
+        return _default
+
+    def _fnc(o):
+        try:
+            return default(o)
+        except TypeError:
+            return _default(o)
+    return _fnc
+
+
+class JsonCodec:
+    """
+    json de la libreria estandar
+    """
+    name = "json"
+
+    def loads(self, s: str | bytes):
+        return json.loads(s)
+
+    def dumps(self, obj, indent: int = None, default: Callable[[Any], Any] = None, ensure_ascii: bool = False) -> str:
+        return json.dumps(
+            to_builtin(obj),
+            indent=indent,
+            separators=(',', ':') if indent is None else None,
+            ensure_ascii=ensure_ascii,
+            default=_chain(default)
+        )
+
+    def dumpb(self, obj, indent: int = None, default: Callable[[Any], Any] = None, ensure_ascii: bool = False) -> bytes:
+        return self.dumps(obj, indent=indent, default=default, ensure_ascii=ensure_ascii).encode('utf-8')
+
+
+class OrjsonCodec(JsonCodec):
+    """
+    orjson serializa NamedTuple (via default) y dataclass sin copiar antes el objeto.
+    Solo soporta indent None o 2, con otro valor se usa el json estandar
+    """
+    name = "orjson"
+
+    def loads(self, s: str | bytes):
+        return orjson.loads(s)
+
+    def dumpb(self, obj, indent: int = None, default: Callable[[Any], Any] = None, ensure_ascii: bool = False) -> bytes:
+        if indent not in (None, 2):
+            return super().dumpb(obj, indent=indent, default=default, ensure_ascii=ensure_ascii)
+        option = orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME
+        if indent == 2:
+            option = option | orjson.OPT_INDENT_2
+        js = orjson.dumps(obj, default=_chain(default), option=option)
+        if ensure_ascii:
+            # orjson no tiene ensure_ascii
+            return to_ascii(js.decode('utf-8')).encode('utf-8')
+        return js
+
+    def dumps(self, obj, indent: int = None, default: Callable[[Any], Any] = None, ensure_ascii: bool = False) -> str:
+        return self.dumpb(obj, indent=indent, default=default, ensure_ascii=ensure_ascii).decode('utf-8')
+
+
+def get_codec(name: str = None) -> JsonCodec:
+    """
+    name (o la variable de entorno JSON_CODEC): orjson o json,
+    por defecto orjson si esta instalado
+    """
+    if name is None:
+        name = get_env('JSON_CODEC', default='orjson' if orjson is not None else 'json')
+    if name == 'orjson':
+        if orjson is not None:
+            return OrjsonCodec()
+        logger.warning("JSON_CODEC=orjson pero orjson no esta instalado, se usa json")
+        return JsonCodec()
+    if name == 'json':
+        return JsonCodec()
+    raise ValueError(f"JSON_CODEC={name} no soportado")
+
+
+CODEC = get_codec()
@@ -38,7 +38,7 @@ class Collector:
 
     def __get_dict_file(self, path: str):
         obj = R.safe_get_dict(f"{G.page}/{path}")
-        file = DictFile(f"out/{path}")
+        file = DictFile(f"out/{path}", journal=True)
         for k, v in obj.items():
             file.set(k, v)
         return file
@@ -1,13 +1,66 @@
 
-from sqlite3 import OperationalError, connect, Cursor
+from sqlite3 import OperationalError, connect, Cursor, Connection
 from atexit import register
+from contextlib import contextmanager
+from itertools import count, chain
+from typing import Iterable, Callable
+from threading import local, RLock
+from pathlib import Path
+from hashlib import sha1
 import logging
-from functools import cache
+from functools import cache, cached_property
 from core.film import IMDb
+from core.codec import CODEC
+from core.util import norm_title
+from core.filemanager import DictFile
+from core.git import G
+from core.req import R
 from collections import defaultdict
 
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
 logger = logging.getLogger(__name__)
 
+# busquedas de search_imdb_id sin resultado: hash de la busqueda -> version de la base de datos
+# (se publica en la web y se recupera de alli en la siguiente build)
+MISS_FILE = "imdb_miss.json"
+# tabla de titulos normalizados (se genera con tool/norm_title.py)
+NORM_TABLE = "TITLE_NORM"
+# puntuacion de search_imdb_ids cuando hay varios candidatos (ver score_candidates)
+TITLE_SCORE = {'exact': 1.0, 'fts': 0.6}
+SCORE_WEIGHTS = {'title': 0.35, 'director': 0.3, 'year': 0.15, 'duration': 0.1, 'votes': 0.1}
+SCORE_MIN = 0.7
+SCORE_MARGIN = 0.1
+# minutos de diferencia a partir de los cuales la duracion no puntua
+DURATION_GAP = 10
+# log10 de los votos con los que se obtiene la puntuacion maxima
+VOTES_LOG = 5
+# sufijo de la base de datos reducida (tool/slim_db.py)
+SLIM_SUFFIX = ".slim"
+# tabla (key, value) de la base de datos reducida con la version de la original y la ventana de años
+SLIM_TABLE = "SLIM_INFO"
+# pragmas de la conexion de solo lectura (la base de datos pesa varios GB).
+# cache_size (KiB si es negativo) es por conexion y hay una por hilo (ver DBlite.con),
+# las paginas ya estan en memoria compartida gracias a mmap_size
+PRAGMAS: dict[str, int | str] = {
+    "mmap_size": 1024 * 1024 * 1024,
+    "cache_size": -32 * 1024,
+    "temp_store": "MEMORY",
+}
+CACHED_STATEMENTS = 256
+# filtro de año y duracion sobre movie m con parametros fijos (ver _movie_filter_args)
+# para que la sql sea siempre la misma y se reutilice la sentencia preparada
+MOVIE_FILTER = """(
+    (? is null or m.year > ?) and
+    (? is null or m.year < ?) and
+    (? is null or (m.duration < ? + 10 and m.duration > ? - 10))
+)"""
+# bytes del principio y del final del fichero que se usan para calcular la version
+VERSION_CHUNK = 1024 * 1024
+
 
 def dict_factory(cursor: Cursor, row):
     d = {}
@@ -25,34 +78,246 @@ def gW(tp: tuple):
     return f"in ({prm})"
 
 
+def to_columns(cursor: Cursor) -> dict[str, tuple]:
+    """
+    Resultado por columnas: {columna: (valor fila 1, valor fila 2, ...)}
+    """
+    names = tuple(c[0] for c in cursor.description)
+    rows = cursor.fetchall()
+    cols = tuple(zip(*rows)) if rows else tuple(tuple() for _ in names)
+    return dict(zip(names, cols))
+
+
+def iter_rows(cols: dict[str, tuple]):
+    """
+    Inverso de to_columns: genera un dict por fila
+    """
+    for r in zip(*cols.values()):
+        yield dict(zip(cols.keys(), r))
+
+
+def _uniq_strip(*values: str) -> tuple[str, ...]:
+    arr = []
+    for v in values:
+        v = v.strip() if isinstance(v, str) else None
+        if v and v not in arr:
+            arr.append(v)
+    return tuple(arr)
+
+
+def _miss_key(title: str, year: int, director: tuple[str, ...], duration: int, *args) -> str:
+    data = (_uniq_strip(title), year, sorted(_uniq_strip(*(director or tuple()))), duration or None, *args)
+    return sha1(CODEC.dumps(data, indent=None).encode()).hexdigest()
+
+
+def score_candidates(cols: dict[str, tuple], year_gap: int = 5) -> dict[int, str]:
+    """
+    Puntua a la vez todos los candidatos (una fila por pelicula buscada y
+    candidato, ver DBlite.search_imdb_ids) con la media ponderada de
+    SCORE_WEIGHTS y devuelve {qid: movie} con el mejor de cada busqueda,
+    solo si supera SCORE_MIN y saca al segundo al menos SCORE_MARGIN
+    """
+    if len(cols.get('qid', tuple())) == 0:
+        return {}
+
+    def arr(k: str):
+        return np.array(cols[k], dtype=float)
+
+    features = {
+        'title': arr('title'),
+        'director': arr('director'),
+        'year': 1 - np.abs(arr('year') - arr('q_year')) / year_gap,
+        'duration': 1 - np.abs(arr('duration') - arr('q_duration')) / DURATION_GAP,
+        'votes': np.nan_to_num(np.log10(arr('votes') + 1) / VOTES_LOG, nan=0),
+    }
+    mtx = np.column_stack([features[k] for k in SCORE_WEIGHTS.keys()])
+    # lo que no se sabe (ej: duracion desconocida) ni suma ni resta
+    mtx = np.nan_to_num(np.clip(mtx, 0, 1), nan=0.5)
+    score = mtx @ np.array(tuple(SCORE_WEIGHTS.values()))
+
+    qid = np.array(cols['qid'], dtype=np.int64)
+    movie = np.array(cols['movie'], dtype=object)
+    order = np.lexsort((-score, qid))
+    qid, score, movie = qid[order], score[order], movie[order]
+    first = np.flatnonzero(np.r_[True, qid[1:] != qid[:-1]])
+    size = np.diff(np.r_[first, len(qid)])
+    best = score[first]
+    second = np.where(size > 1, score[np.minimum(first + 1, len(qid) - 1)], 0)
+    ok = (best >= SCORE_MIN) & (best - second >= SCORE_MARGIN)
+    return dict(zip(qid[first][ok].tolist(), movie[first][ok].tolist()))
+
+
+def _movie_filter_args(min_year: int = None, max_year: int = None, duration: int = None):
+    # los 0 se tratan como None, igual que antes con if min_year / if duration
+    min_year = min_year or None
+    max_year = max_year or None
+    duration = duration or None
+    return (min_year, min_year, max_year, max_year, duration, duration, duration)
+
+
 def escape_fts5(text: str) -> str:
     text = text.replace('"', '""')
     return f'"{text}"'
 
 
+def resolve_db_file(file: str) -> str:
+    """
+    Si file no existe pero si su version reducida (generada con
+    tool/slim_db.py, ej: imdb.slim.sqlite) se usa esta
+    """
+    path = Path(file)
+    slim = path.with_name(path.stem + SLIM_SUFFIX + path.suffix)
+    if not path.is_file() and slim.is_file():
+        return str(slim)
+    return file
+
+
+class _Lease:
+    """
+    Conexion asignada a un hilo, se guarda en el threading.local del
+    DBlite y cuando el hilo termina (y con el su local) se devuelve al pool
+    """
+
+    def __init__(self, con: Connection, release: Callable[[Connection], None]):
+        self.con = con
+        self.__release = release
+
+    def __del__(self):
+        self.__release(self.con)
+
+
 class DBlite:
-    def __init__(self, file: str):
-        self.__file = file
-        self.__con = None
+    """
+    Acceso de solo lectura a imdb.sqlite. Cada hilo usa su propia conexion,
+    que se saca de un pool de conexiones libres (o se crea) la primera vez
+    y vuelve al pool cuando el hilo termina, de manera que se puede
+    consultar en paralelo (ej: con core.prefetch.POOL)
+    """
+
+    def __init__(self, file: str, pragmas: dict[str, int | str] = PRAGMAS, use_misses: bool = True):
+        """
+        pragmas: se aplican al abrir la conexion (ver PRAGMAS)
+        use_misses: recordar las busquedas sin resultado (ver misses)
+        """
+        self.__file = resolve_db_file(file)
+        self.__pragmas = dict(pragmas or {})
+        self.__use_misses = use_misses
+        self.__local = local()
+        self.__lock = RLock()
+        # todas las conexiones abiertas y las que no tiene asignadas ningun hilo
+        self.__cons: list[Connection] = []
+        self.__idle: list[Connection] = []
+        self.__misses: DictFile = None
+        self.__seq = count()
         register(self.close)
 
     @property
     def file(self):
         return self.__file
 
+    @cached_property
+    def version(self) -> str | None:
+        """
+        Huella de la base de datos. El fichero se descarga de nuevo en cada
+        build (la fecha no sirve) y leerlo entero es lento, asi que se usa
+        el tamaño, la cabecera y el final del fichero.
+        La version reducida (tool/slim_db.py) usa la de la base de datos
+        de la que sale y su ventana de años (ver SLIM_TABLE), que no cambian
+        aunque se regenere con otros ids
+        """
+        path = Path(self.__file)
+        if not path.is_file():
+            return None
+        if self.has_table(SLIM_TABLE):
+            version = self.one(f"select value from {SLIM_TABLE} where key = 'version'")
+            if version:
+                return version
+        size = path.stat().st_size
+        h = sha1(str(size).encode())
+        with open(path, "rb") as f:
+            h.update(f.read(VERSION_CHUNK))
+            if size > VERSION_CHUNK:
+                f.seek(max(VERSION_CHUNK, size - VERSION_CHUNK))
+                h.update(f.read())
+        return h.hexdigest()[:16]
+
     @property
-    def con(self):
-        if self.__con is None:
-            logger.info(f"Connecting to {self.__file}")
-            self.__con = connect(
-                f"file:{self.__file}?mode=ro&immutable=1",
-                uri=True
-            )
-        return self.__con
+    def misses(self) -> DictFile:
+        """
+        Cache de busquedas sin resultado, solo se conservan
+        las hechas con la version actual de la base de datos
+        """
+        with self.__lock:
+            if self.__misses is None:
+                self.__misses = self.__load_misses()
+            return self.__misses
+
+    def __load_misses(self):
+        file = DictFile(f"out/{MISS_FILE}", journal=True)
+        for k, v in R.safe_get_dict(f"{G.page}/{MISS_FILE}").items():
+            if file.get(k) is None:
+                file.set(k, v)
+        for k, v in list(file.items()):
+            if v != self.version:
+                file.discard(k)
+        return file
+
+    @cache
+    def has_table(self, name: str) -> bool:
+        return self.one("select 1 from sqlite_master where type='table' and name = ? COLLATE NOCASE", name) is not None
+
+    def __is_miss(self, key: str):
+        if not self.__use_misses or self.version is None:
+            return False
+        return self.misses.get(key) == self.version
+
+    def __add_miss(self, key: str):
+        if self.__use_misses:
+            self.misses.set(key, self.version)
+
+    def __connect(self) -> Connection:
+        logger.info(f"Connecting to {self.__file}")
+        # la conexion la usa un solo hilo a la vez, pero se puede devolver
+        # al pool o cerrar (atexit) desde otro.
+        # isolation_level=None (autocommit): sqlite3 no abre transacciones
+        # implicitas (ver mem_table) que dejarian las lecturas en una transaccion sin cerrar
+        con = connect(
+            f"file:{self.__file}?mode=ro&immutable=1",
+            uri=True,
+            check_same_thread=False,
+            cached_statements=CACHED_STATEMENTS,
+            isolation_level=None
+        )
+        for k, v in self.__pragmas.items():
+            con.execute(f"PRAGMA {k}={v}")
+        # la base de datos es inmutable, las tablas auxiliares van a memoria
+        con.execute("attach database ':memory:' as mem")
+        return con
+
+    def __release(self, con: Connection):
+        with self.__lock:
+            if con in self.__cons:
+                self.__idle.append(con)
+
+    @property
+    def con(self) -> Connection:
+        """
+        Conexion del hilo actual
+        """
+        lease: _Lease = getattr(self.__local, "lease", None)
+        if lease is not None and lease.con in self.__cons:
+            return lease.con
+        with self.__lock:
+            con = self.__idle.pop() if self.__idle else None
+            if con is None:
+                con = self.__connect()
+                self.__cons.append(con)
+        self.__local.lease = _Lease(con, self.__release)
+        return con
 
     def select(self, sql: str, *args, row_factory=None, **kwargs):
-        self.con.row_factory = row_factory
         cursor = self.con.cursor()
+        cursor.row_factory = row_factory
         try:
             if len(args):
                 cursor.execute(sql, args)
@@ -61,10 +326,11 @@ class DBlite:
         except OperationalError:
             logger.critical(sql)
             raise
-        for r in cursor:
-            yield r
-        cursor.close()
-        self.con.row_factory = None
+        try:
+            for r in cursor:
+                yield r
+        finally:
+            cursor.close()
 
     def one(self, sql: str, *args, **kwargs):
         for r in self.select(sql, *args, **kwargs):
@@ -90,12 +356,81 @@ class DBlite:
             obj[k].add(v)
         return dict(obj)
 
+    @contextmanager
+    def mem_table(self, columns: str, rows: Iterable[tuple]):
+        """
+        Crea una tabla auxiliar en memoria (mem.tb_N) con las columnas dadas
+        (ej: "id TEXT PRIMARY KEY"), la rellena con rows y la borra al salir
+        """
+        name = f"mem.tb_{next(self.__seq)}"
+        self.con.execute(f"create table {name} ({columns})")
+        try:
+            rows = iter(rows)
+            first = next(rows, None)
+            if first is not None:
+                prm = ", ".join(["?"] * len(first))
+                # una sola transaccion para todas las filas, cerrada antes de consultar
+                self.con.execute("begin")
+                try:
+                    self.con.executemany(f"insert or ignore into {name} values ({prm})", chain((first, ), rows))
+                    self.con.execute("commit")
+                except BaseException:
+                    self.con.execute("rollback")
+                    raise
+            yield name
+        finally:
+            self.con.execute(f"drop table {name}")
+
+    def keys_table(self, keys: Iterable[str]):
+        """
+        Carga keys en una tabla en memoria para cruzarla con un join
+        en vez de usar id in (?, ?, ...), que con miles de ids
+        supera el limite de variables de sqlite
+        """
+        return self.mem_table("id TEXT PRIMARY KEY", ((k, ) for k in keys if k is not None))
+
+    def get_movies(self, ids: Iterable[str]) -> dict[str, tuple]:
+        """
+        Datos de movie, extra y title de todos los ids en una sola consulta.
+        Devuelve el resultado por columnas (ver to_columns), titles es
+        una tupla de titulos por pelicula. Los ids que no existen se ignoran
+        """
+        with self.keys_table(ids) as keys:
+            cursor = self.con.execute(f"""
+                select
+                    m.id,
+                    m.type,
+                    m.year,
+                    m.duration,
+                    m.rating,
+                    m.votes,
+                    e.filmaffinity,
+                    e.wikipedia,
+                    e.countries,
+                    (select json_group_array(t.title) from title t where t.movie=m.id) titles
+                from
+                    {keys} k join
+                    movie m on m.id=k.id left join
+                    extra e on e.movie=m.id
+                order by m.id
+            """)
+            try:
+                cols = to_columns(cursor)
+            finally:
+                cursor.close()
+        cols['titles'] = tuple(tuple(CODEC.loads(t)) if t else tuple() for t in cols['titles'])
+        return cols
+
     def close(self):
-        if self.__con is None:
+        with self.__lock:
+            cons = self.__cons
+            self.__cons = []
+            self.__idle = []
+        if len(cons) == 0:
             return
-        logger.info(f"Closing {self.__file}")
-        self.__con.close()
-        self.__con = None
+        logger.info(f"Closing {self.__file} ({len(cons)} conexiones)")
+        for con in cons:
+            con.close()
 
     @cache
     def __search_person(self, name: str) -> tuple[str, ...]:
@@ -106,7 +441,7 @@ class DBlite:
             return tuple()
         sql = "select id from {t} where {w}"
         for t, w in (
-            ('PERSON', "lower(name) = ? COLLATE NOCASE"),
+            ('PERSON', "name = ? COLLATE NOCASE"),
             ('PERSON_FTS', "name MATCH ?"),
             #('', "lower(name) like ('%' || ? || '%')")
         ):
@@ -160,6 +495,23 @@ class DBlite:
     ) -> int | None:
         if year is None:
             return None
+        key = _miss_key(title, year, director, duration, year_gap, full_match)
+        if self.__is_miss(key):
+            return None
+        imdb = self.__search_imdb_id(title, year, director, duration, year_gap, full_match)
+        if imdb is None:
+            self.__add_miss(key)
+        return imdb
+
+    def __search_imdb_id(
+            self,
+            title: str,
+            year: int,
+            director: tuple[str, ...],
+            duration: int,
+            year_gap: int,
+            full_match: bool
+    ) -> int | None:
         if director is None:
             director = tuple()
         id_titles = self.__search_movie_by_title(title, min_year=year-year_gap, max_year=year+year_gap, duration=duration)
@@ -173,6 +525,165 @@ class DBlite:
             return ok.pop()
         return None
 
+    def search_imdb_ids(
+            self,
+            items: Iterable[tuple[str, int, tuple[str, ...], int]],
+            year_gap: int = 5,
+            full_match: bool = False,
+            score: bool = True
+    ) -> tuple[str | None, ...]:
+        """
+        Igual que search_imdb_id pero para muchas peliculas a la vez,
+        items son tuplas (title, year, director, duration) y se devuelve
+        el id de imdb (o None) de cada una en el mismo orden.
+        Los candidatos por titulo y por director se sacan con dos consultas
+        que cruzan todas las peliculas a la vez.
+        Con score=True (y numpy instalado), las que quedan sin decidir
+        por tener varios candidatos se resuelven con score_candidates
+        """
+        items = tuple(items)
+        score = score and not full_match and np is not None
+        keys = tuple(_miss_key(*i, year_gap, full_match, score) for i in items)
+        q_rows = []
+        t_rows = []
+        d_rows = []
+        for qid, (title, year, director, duration) in enumerate(items):
+            if year is None or self.__is_miss(keys[qid]):
+                continue
+            q_rows.append((qid, year, year-year_gap, year+year_gap, duration or None))
+            for t in _uniq_strip(title):
+                t_rows.append((qid, t, escape_fts5(t), norm_title(t)))
+            for d in _uniq_strip(*(director or tuple())):
+                d_rows.append((qid, d, escape_fts5(d)))
+        if len(q_rows) == 0:
+            return tuple(None for _ in items)
+        where = """
+            m.year > q.min_year and m.year < q.max_year and (
+                q.duration is null or (m.duration < q.duration+10 and m.duration > q.duration-10)
+            )
+        """
+        todo = set(r[0] for r in q_rows)
+        arr: list[str | None] = [None] * len(items)
+        with self.mem_table("qid INTEGER PRIMARY KEY, year INTEGER, min_year INTEGER, max_year INTEGER, duration INTEGER", q_rows) as q, \
+             self.mem_table("qid INTEGER, title TEXT, fts TEXT, norm TEXT", t_rows) as qt, \
+             self.mem_table("qid INTEGER, name TEXT, fts TEXT", d_rows) as qd, \
+             self.mem_table("qid INTEGER, movie TEXT, score REAL, PRIMARY KEY (qid, movie)", tuple()) as tc, \
+             self.mem_table("qid INTEGER, movie TEXT, PRIMARY KEY (qid, movie)", tuple()) as dc:
+            if self.has_table(NORM_TABLE):
+                # solo si el titulo normalizado no es ambiguo y ningun titulo coincide tal cual
+                self.con.execute(f"""
+                    insert or ignore into {tc}
+                    select t.qid, min(x.movie), {TITLE_SCORE['exact']} from {qt} t
+                    join {q} q on q.qid=t.qid
+                    cross join {NORM_TABLE} x on x.norm = t.norm and x.year > q.min_year and x.year < q.max_year
+                    join movie m on m.id=x.movie
+                    where {where} and t.qid not in (
+                        select e.qid from {qt} e
+                        join {q} q on q.qid=e.qid
+                        cross join TITLE x on x.title = e.title COLLATE NOCASE
+                        join movie m on m.id=x.movie
+                        where {where}
+                    )
+                    group by t.qid
+                    having count(distinct x.movie) = 1
+                """)
+            self.con.execute(f"""
+                insert or ignore into {tc}
+                select c.qid, c.movie, max(c.score) from (
+                    select t.qid, x.movie, {TITLE_SCORE['exact']} score from {qt} t cross join TITLE x on x.title = t.title COLLATE NOCASE
+                    where t.qid not in (select qid from {tc})
+                    union all
+                    select t.qid, x.movie, {TITLE_SCORE['fts']} score from {qt} t cross join TITLE_FTS x on x.title MATCH t.fts
+                    where t.qid not in (select qid from {tc})
+                ) c
+                join {q} q on q.qid=c.qid
+                join movie m on m.id=c.movie
+                where {where}
+                group by c.qid, c.movie
+            """)
+            self.con.execute(f"""
+                insert or ignore into {dc}
+                select distinct p.qid, d.movie from (
+                    select t.qid, x.id person from {qd} t cross join PERSON x on x.name = t.name COLLATE NOCASE
+                    union
+                    select t.qid, x.id person from {qd} t cross join PERSON_FTS x on x.name MATCH t.fts
+                ) p
+                join director d on d.person=p.person
+                join {q} q on q.qid=p.qid
+                join movie m on m.id=d.movie
+                where {where}
+            """)
+            id_titles = self.get_dict_set(f"select qid, movie from {tc}")
+            id_director = self.get_dict_set(f"select qid, movie from {dc}")
+            for qid in todo:
+                titles = id_titles.get(qid, set())
+                directors = id_director.get(qid, set())
+                if not full_match and len(titles) == 1:
+                    arr[qid] = next(iter(titles))
+                    continue
+                if not full_match and len(directors) == 1:
+                    arr[qid] = next(iter(directors))
+                    continue
+                ok = titles.intersection(directors)
+                if len(ok) == 1:
+                    arr[qid] = ok.pop()
+            pending = tuple(
+                (qid, ) for qid in todo
+                if arr[qid] is None and (qid in id_titles or qid in id_director)
+            )
+            if score and len(pending):
+                with self.mem_table("qid INTEGER PRIMARY KEY", pending) as pd:
+                    cursor = self.con.execute(f"""
+                        select
+                            c.qid,
+                            c.movie,
+                            max(c.title) title,
+                            max(c.director) director,
+                            q.year q_year,
+                            q.duration q_duration,
+                            m.year,
+                            m.duration,
+                            m.votes
+                        from (
+                            select qid, movie, score title, 0 director from {tc}
+                            union all
+                            select qid, movie, 0 title, 1 director from {dc}
+                        ) c
+                        join {pd} p on p.qid=c.qid
+                        join {q} q on q.qid=c.qid
+                        join movie m on m.id=c.movie
+                        group by c.qid, c.movie
+                    """)
+                    try:
+                        cols = to_columns(cursor)
+                    finally:
+                        cursor.close()
+                scored = score_candidates(cols, year_gap)
+                for qid, imdb in scored.items():
+                    arr[qid] = imdb
+                logger.info(f"search_imdb_ids: {len(scored)}/{len(pending)} resueltas por puntuacion")
+        for qid in todo:
+            if arr[qid] is None:
+                self.__add_miss(keys[qid])
+        if self.__use_misses:
+            self.misses.dump()
+        return tuple(arr)
+
+    def __search_movie_by_norm_title(self, *titles: str, min_year=None, max_year=None, duration: int = None) -> tuple[str, ...]:
+        norms = tuple(sorted(set(filter(None, map(norm_title, titles)))))
+        if len(norms) == 0:
+            return tuple()
+        return self.to_tuple(f"""
+            select distinct n.movie from {NORM_TABLE} n join movie m on m.id=n.movie
+            where n.norm {gW(norms)} and {MOVIE_FILTER}
+        """, *norms, *_movie_filter_args(min_year, max_year, duration))
+
+    def __search_movie_by_exact_title(self, *titles: str, min_year=None, max_year=None, duration: int = None) -> tuple[str, ...]:
+        return self.to_tuple(f"""
+            select distinct t.movie from TITLE t join movie m on m.id=t.movie
+            where t.title COLLATE NOCASE {gW(titles)} and {MOVIE_FILTER}
+        """, *titles, *_movie_filter_args(min_year, max_year, duration))
+
     @cache
     def __search_movie_by_title(self, *titles: str, min_year=None, max_year=None, duration: int = None) -> tuple[tuple[str, ...], ...]:
         arr_titles = []
@@ -182,6 +693,11 @@ class DBlite:
                 arr_titles.append(t)
         if len(arr_titles) == 0:
             return tuple()
+        if self.has_table(NORM_TABLE):
+            ids = self.__search_movie_by_norm_title(*arr_titles, min_year=min_year, max_year=max_year, duration=duration)
+            # solo si no es ambiguo y ningun titulo coincide tal cual
+            if len(ids) == 1 and len(self.__search_movie_by_exact_title(*arr_titles, min_year=min_year, max_year=max_year, duration=duration)) == 0:
+                return ids
         sql = []
         arg = []
         for title in arr_titles:
@@ -193,21 +709,11 @@ class DBlite:
                 tt = escape_fts5(title) if t.endswith("_FTS") else title
                 sql.append(f"select movie from {t} where {w}")
                 arg.append(tt)
-        main_sql = "select distinct movie from (" + (" union ".join(sql)) + ")"
-        where = []
-        if duration:
-            where.append(f"duration < {duration+10}")
-            where.append(f"duration > {duration-10}")
-        if min_year:
-            where.append(f"year > {min_year}")
-        if max_year:
-            where.append(f"year < {max_year}")
-        if where:
-            main_sql = main_sql+" where movie in (select id from movie where " 
-            main_sql = main_sql+(" and ".join(where)) + ")"
+        main_sql = "select distinct c.movie from (" + (" union ".join(sql)) + ") c join movie m on m.id=c.movie where " + MOVIE_FILTER
         ids = self.to_tuple(
             main_sql,
-            *arg
+            *arg,
+            *_movie_filter_args(min_year, max_year, duration)
         )
         return ids
 
@@ -224,28 +730,18 @@ class DBlite:
         arg = []
         for director in arr_directors:
             for t, w in (
-                ('PERSON', "lower(name) = ? COLLATE NOCASE"),
+                ('PERSON', "name = ? COLLATE NOCASE"),
                 ('PERSON_FTS', "name MATCH ?"),
                 #('', "lower(name) like ('%' || ? || '%')")
             ):
                 n = escape_fts5(director) if t.endswith("_FTS") else director
                 sql.append(f"select id from {t} where {w}")
                 arg.append(n)
-        main_sql = "select distinct movie from director where person in (" + (" union ".join(sql)) + ")"
-        where = []
-        if duration:
-            where.append(f"duration < {duration+10}")
-            where.append(f"duration > {duration-10}")
-        if min_year:
-            where.append(f"year > {min_year}")
-        if max_year:
-            where.append(f"year < {max_year}")
-        if where:
-            main_sql = main_sql+" and movie in (select id from movie where "
-            main_sql = main_sql+(" and ".join(where)) + ")"
+        main_sql = "select distinct d.movie from director d join movie m on m.id=d.movie where d.person in (" + (" union ".join(sql)) + ") and " + MOVIE_FILTER
         ids = self.to_tuple(
             main_sql,
-            *arg
+            *arg,
+            *_movie_filter_args(min_year, max_year, duration)
         )
         return ids
 
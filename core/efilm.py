@@ -1,18 +1,23 @@
 from typing import Any
-from core.cache import Cache
+from core.cache import Cache, get_cache_obj
 from core.util import mapdict
 import requests
-from requests.exceptions import JSONDecodeError as RequestsJSONDecodeError
+from requests.exceptions import JSONDecodeError as RequestsJSONDecodeError, ConnectionError, Timeout
 from json.decoder import JSONDecodeError as DecoderJSONDecodeError
 from typing import NamedTuple
 import logging
-import time
 from core.util import tp_split
 import re
 from core.dblite import DB
 from core.filemanager import DictFile, FM
 from types import MappingProxyType
 from core.util import clean_html, mk_re, plain_text
+from core.prefetch import POOL
+from core.raw import RAW
+from urllib.parse import urlsplit, urlunsplit, parse_qsl, urlencode
+from math import ceil
+from core.ratelimit import RL
+from core.retry import RetryPolicy
 
 
 logger = logging.getLogger(__name__)
@@ -110,6 +115,13 @@ def _clean_js(k: str, obj: list | dict | str):
     return obj
 
 
+def _set_query(url: str, **kwargs):
+    spl = urlsplit(url)
+    qr = dict(parse_qsl(spl.query, keep_blank_values=True))
+    qr.update({k: str(v) for k, v in kwargs.items()})
+    return urlunsplit(spl._replace(query=urlencode(qr)))
+
+
 def _g_date(dt: str):
     if dt is None:
         return None
@@ -119,17 +131,49 @@ def _g_date(dt: str):
     return "{0:04d}-{1:02d}-{2:02d} {3:02d}:{4:02d}".format(*num)
 
 
+def _ficha_url(id: int):
+    return f"https://{EFilm.API_HOST}/api/v1/videos/audiovisuals/{id}/"
+
+
+def _parse_ficha(url: str, js: dict) -> dict:
+    return mapdict(_clean_js, js, compact=True)
+
+
+def _raw_url(slf, id: int):
+    return _ficha_url(id)
+
+
+def _rebuild_ficha(slf, id: int):
+    url = _ficha_url(id)
+    js = RAW.load_json(url)
+    if js is None:
+        return None
+    return _parse_ficha(url, js)
+
+
 class EFilm:
     CONSOLIDATED: MappingProxyType[int, str] = MappingProxyType(FM.load("cache/efilm.dct.txt"))
+    API_HOST = "backend-prod.efilm.online"
+    RETRY = RetryPolicy(
+        tries=4,
+        base=5,
+        max_wait=30,
+        deadline=120,
+        statuses=(500, 502, 503, 504),
+        retry_on=(DecoderJSONDecodeError, RequestsJSONDecodeError, ConnectionError, Timeout),
+        name="efilm"
+    )
 
     def __init__(
         self,
         origin: str = 'https://cinemadrid.efilm.online',
         min_duration=50,
-        exclude_topis: tuple[str] = tuple()
+        exclude_topis: tuple[str] = tuple(),
+        parallel: bool = True
     ):
-        self.__new_cache = DictFile("cache/efilm.new.dct.txt")
-        self.__s = requests.Session()
+        self.__new_cache = DictFile("cache/efilm.new.dct.txt", journal=True)
+        self.__parallel = parallel
+        self.__s = RL.mount(requests.Session())
         self.__min_duration = min_duration
         self.__origin = origin
         self.__s.headers.update({
@@ -172,51 +216,80 @@ class EFilm:
             )
         }
 
-    def get_json(self, url: str):
-        max_tries = 3
+    def __get_json(self, url: str, raw: bool = False):
+        r = self.__s.get(url)
+        if r.status_code in EFilm.RETRY.statuses:
+            r.raise_for_status()
+        try:
+            js = r.json()
+        except (DecoderJSONDecodeError, RequestsJSONDecodeError):
+            logger.warning(f"{r.status_code} {url}")
+            raise
+        if raw:
+            RAW.save(url, r.content)
+        return js
+
+    def get_json(self, url: str, raw: bool = False):
         logger.debug(url)
-        while True:
-            r = self.__s.get(url)
-            if max_tries > 0 and r.status_code in (500, 502):
-                max_tries = max_tries - 1
-                time.sleep(30)
-                continue
-            try:
-                return r.json()
-            except (DecoderJSONDecodeError, RequestsJSONDecodeError):
-                if max_tries > 0:
-                    max_tries = max_tries - 1
-                    time.sleep(30)
-                    continue
-                logger.critical(f"{r.status_code} {url}")
-                raise
+        try:
+            return EFilm.RETRY.call(self.__get_json, url, raw=raw)
+        except (DecoderJSONDecodeError, RequestsJSONDecodeError):
+            logger.critical(f"JSON no valido en {url}")
+            raise
+
+    def __get_page(self, url: str) -> dict[str, Any]:
+        js = self.get_json(url)
+        if isinstance(js, list) and len(js) == 1:
+            js = js[0]
+        return js
 
     def get_list(self, url: str) -> list[dict[str, Any]]:
         prc = url.split("://")[0]
-        result = []
+        js = self.__get_page(url)
+        result = list(js['results'])
+        if self.__parallel:
+            pages = self.__get_pages_url(url, js)
+            if pages is not None:
+                for js in POOL.map(self.__get_page, pages, host=EFilm.API_HOST):
+                    result.extend(js['results'])
+                return result
+        url = js['next']
         while url:
             url = f"{prc}://" + url.split("://", 1)[1]
-            js = self.get_json(url)
-            if isinstance(js, list) and len(js) == 1:
-                js = js[0]
+            js = self.__get_page(url)
             result.extend(js['results'])
             url = js['next']
         return result
 
+    def __get_pages_url(self, url: str, first: dict[str, Any]) -> tuple[str, ...] | None:
+        if not first.get('next'):
+            return tuple()
+        count = first.get('count')
+        size = len(first['results'])
+        page = dict(parse_qsl(urlsplit(url).query)).get('page', '1')
+        if not isinstance(count, int) or size == 0 or page != '1':
+            return None
+        return tuple(_set_query(url, page=p) for p in range(2, ceil(count / size) + 1))
+
     def get_audiovisual(self):
         "https://backend-prod.efilm.online/api/v1/videos/audiovisuals/audiovisual_type/?audiovisual_type=Pel%C3%ADculas"
 
     @Cache("rec/efilm/items.json")
     def get_items(self) -> list[dict]:
-        root = f"https://backend-prod.efilm.online/api/v1/products/products/relevant/?duration_gte={self.__min_duration}&page=1&page_size=1000&product_type=audiovisual&skip_chapters=true"
+        root = f"https://{EFilm.API_HOST}/api/v1/products/products/relevant/?duration_gte={self.__min_duration}&page=1&page_size=1000&product_type=audiovisual&skip_chapters=true"
         done: set[int] = set()
         arr = []
         i: dict
-        for query in (
+        queries = (
             "&languages=1",
             "&subtitles=1"
-        ):
-            js = self.get_list(root+query)
+        )
+        urls = tuple(root+q for q in queries)
+        if self.__parallel:
+            lists = POOL.map(self.get_list, urls)
+        else:
+            lists = map(self.get_list, urls)
+        for js in lists:
             for i in mapdict(_clean_js, js, compact=True):
                 if i['id'] not in done:
                     done.add(i['id'])
@@ -254,12 +327,11 @@ class EFilm:
             arr.append(f'provider={provider}')
         return tuple(arr)
 
-    @Cache("rec/efilm/ficha/{}.json")
+    @Cache("rec/efilm/ficha/{}.json.zst", revalidate=True, version=(_clean_js, _parse_ficha), rebuild=_rebuild_ficha, raw=_raw_url, zstd_dict="efilm_ficha")
     def get_ficha(self, id: int) -> dict:
-        url = f"https://backend-prod.efilm.online/api/v1/videos/audiovisuals/{id}/"
-        js = self.get_json(url)
-        js = mapdict(_clean_js, js, compact=True)
-        return js
+        url = _ficha_url(id)
+        js = self.get_json(url, raw=True)
+        return _parse_ficha(url, js)
 
     def get_video(self, id: int, i: dict = None):
         if i is None:
@@ -329,9 +401,18 @@ class EFilm:
                 v = v._replace(countries=("ES", ))
         return v
 
+    def prefetch_fichas(self, *ids: int):
+        cch = get_cache_obj(self.get_ficha)
+        if cch is not None:
+            ids = cch.stale(self, ids)
+        POOL.prefetch(self.get_ficha, ids, host=EFilm.API_HOST, label="efilm.get_ficha")
+
     def get_videos(self):
         arr: set[Video] = set()
-        for i in self.get_items():
+        items = self.get_items()
+        if self.__parallel:
+            self.prefetch_fichas(*(i['id'] for i in items))
+        for i in items:
             v = self.get_video(i['id'], i)
             if v is None:
                 continue
@@ -341,12 +422,14 @@ class EFilm:
             if v.provider and v.provider.lower() == 'teatrix' and not set(v.countries).intersection({"ESP", "USA", "GBR"}):
                 logger.debug(f"[KO] provider={v.provider} countries={v.countries} {v.get_url()}")
                 continue
-            if v.id not in EFilm.CONSOLIDATED and v.imdb is None:
-                imdb = DB.search_imdb_id(v.name, v.year, v.director, v.duration)
-                if imdb:
-                    v = v._replace(imdb=imdb)
-                    self.__new_cache.set(v.id, imdb)
             arr.add(v)
+        unmatched = [v for v in arr if v.id not in EFilm.CONSOLIDATED and v.imdb is None]
+        found = DB.search_imdb_ids((v.name, v.year, v.director, v.duration) for v in unmatched)
+        for v, imdb in zip(unmatched, found):
+            if imdb:
+                arr.discard(v)
+                arr.add(v._replace(imdb=imdb))
+                self.__new_cache.set(v.id, imdb)
         self.__new_cache.dump()
         logger.info(f"{len(arr)} recuperados de efilm")
         return tuple(sorted(arr, key=lambda v: v.id))
@@ -1,18 +1,42 @@
 import json
 import logging
-from os import makedirs
+from os import makedirs, replace, fsync, getpid
 from os.path import dirname, realpath
 from pathlib import Path
 from functools import cache
+from contextlib import contextmanager
+from threading import get_ident, RLock
+from atexit import register
 
 import requests
 from bs4 import BeautifulSoup, Tag
 from json.decoder import JSONDecodeError
-from dataclasses import is_dataclass, asdict
+from core.codec import CODEC, to_builtin
 import re
 
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
 logger = logging.getLogger(__name__)
 
+# sufijo de los ficheros temporales de las escrituras atomicas
+TMP_SUFFIX = ".tmp"
+# sufijo del log de cambios de DictFile(journal=True)
+JOURNAL_SUFFIX = ".journal"
+ZSTD_LEVEL = 10
+# diccionarios zstd compartidos (entrenados con tool/zstd.py)
+ZSTD_DICT_DIR = "cache/zstd"
+
+
+class ZstdDictNotFound(Exception):
+    """
+    El .json.zst se comprimio con un diccionario que ya no esta en ZSTD_DICT_DIR,
+    el fichero no esta corrupto pero no se puede leer (para la Cache es un fallo)
+    """
+    pass
+
 
 def myex(e, msg):
     largs = list(e.args)
@@ -75,7 +99,8 @@ class FileManager:
         s_file = str(file).lower()
         for k, v in {
             ".dct.txt": "dct",
-            ".qw.txt": "qw"
+            ".qw.txt": "qw",
+            ".json.zst": "zst"
         }.items():
             if s_file.endswith(k):
                 return v
@@ -112,13 +137,34 @@ class FileManager:
     def cached_load(self, file, *args, **kwargs):
         return self.load(file, *args, **kwargs)
 
+    @contextmanager
+    def atomic(self, file):
+        """
+        Devuelve un fichero temporal en el mismo directorio que file
+        y, si todo va bien, lo sincroniza en disco y lo renombra a file,
+        de manera que file nunca queda a medio escribir
+        """
+        file = self.resolve_path(file)
+        makedirs(file.parent, exist_ok=True)
+        tmp = file.with_name(f".{file.name}.{getpid()}.{get_ident()}{TMP_SUFFIX}")
+        try:
+            yield tmp
+            # dump_x puede no escribir nada (ej: dump_dct de algo que no es un dict)
+            if tmp.exists():
+                with open(tmp, "rb") as f:
+                    fsync(f.fileno())
+                replace(tmp, file)
+        finally:
+            if tmp.exists():
+                tmp.unlink()
+
     def dump(self, file, obj, *args, **kwargs):
         """
         Guarda un fichero en funcion de su extension
         Para que haya soporte para esa extension ha de exisitir una funcion dump_extension
+        La escritura es atomica (fichero temporal + fsync + rename)
         """
         file = self.resolve_path(file)
-        makedirs(file.parent, exist_ok=True)
 
         ext = self.__get_ext(file)
 
@@ -127,7 +173,8 @@ class FileManager:
             raise Exception(
                 "No existe metodo para guardar ficheros {} [{}]".format(ext, file.name))
 
-        dump_fl(file, obj, *args, **kwargs)
+        with self.atomic(file) as tmp:
+            dump_fl(tmp, obj, *args, **kwargs)
 
     def dwn(self, file, url, verify=True, overwrite=False, headers=None):
         """
@@ -145,21 +192,89 @@ class FileManager:
 
         if overwrite or not file.exists():
             r = requests.get(url, verify=verify, headers=headers)
-            makedirs(file.parent, exist_ok=True)
-            with open(file, "wb") as f:
-                f.write(r.content)
+            with self.atomic(file) as tmp:
+                with open(tmp, "wb") as f:
+                    f.write(r.content)
         return file
 
     def load_json(self, file, *args, **kwargs):
-        with open(file, "r") as f:
+        if args or kwargs:
+            # opciones especificas del json estandar
+            with open(file, "r") as f:
+                try:
+                    return json.load(f, *args, **kwargs)
+                except JSONDecodeError as e:
+                    raise myex(e, str(file))
+        with open(file, "rb") as f:
             try:
-                return json.load(f, *args, **kwargs)
+                return CODEC.loads(f.read())
             except JSONDecodeError as e:
                 raise myex(e, str(file))
 
+    def loads_json(self, s: str | bytes, *args, **kwargs):
+        if args or kwargs:
+            return json.loads(s, *args, **kwargs)
+        return CODEC.loads(s)
+
+    def dumps_json(self, obj, *args, indent=2, **kwargs) -> str:
+        if args or kwargs:
+            return json.dumps(to_builtin(obj), *args, indent=indent, **kwargs)
+        return CODEC.dumps(obj, indent=indent)
+
     def dump_json(self, file, obj, *args, indent=2, **kwargs):
-        with open(file, "w") as f:
-            json.dump(self.__parse(obj), f, *args, indent=indent, **kwargs)
+        if args or kwargs:
+            with open(file, "w") as f:
+                json.dump(to_builtin(obj), f, *args, indent=indent, **kwargs)
+            return
+        with open(file, "wb") as f:
+            f.write(CODEC.dumpb(obj, indent=indent))
+
+    def __check_zstd(self):
+        if zstandard is None:
+            raise Exception("Para usar ficheros .json.zst hay que instalar zstandard")
+
+    @cache
+    def get_zstd_dict(self, name: str):
+        self.__check_zstd()
+        file = self.resolve_path(ZSTD_DICT_DIR).joinpath(name + ".dict")
+        if not file.is_file():
+            logger.debug(f"{file} no existe, se comprime sin diccionario")
+            return None
+        return zstandard.ZstdCompressionDict(file.read_bytes())
+
+    @cache
+    def __get_zstd_dicts(self):
+        dicts = {}
+        for file in sorted(self.resolve_path(ZSTD_DICT_DIR).glob("*.dict")):
+            dct = self.get_zstd_dict(file.stem)
+            dicts[dct.dict_id()] = dct
+        return dicts
+
+    def loads_zst(self, data: bytes, *args, **kwargs):
+        self.__check_zstd()
+        dict_id = zstandard.get_frame_parameters(data).dict_id
+        dct = self.__get_zstd_dicts().get(dict_id) if dict_id else None
+        if dict_id and dct is None:
+            raise ZstdDictNotFound(f"No se encuentra el diccionario zstd {dict_id} en {ZSTD_DICT_DIR}")
+        dzst = zstandard.ZstdDecompressor(dict_data=dct) if dct else zstandard.ZstdDecompressor()
+        return self.loads_json(dzst.decompress(data))
+
+    def dumps_zst(self, obj, *args, zstd_dict: str = None, level: int = ZSTD_LEVEL, **kwargs) -> bytes:
+        self.__check_zstd()
+        dct = self.get_zstd_dict(zstd_dict) if zstd_dict else None
+        czst = zstandard.ZstdCompressor(level=level, dict_data=dct) if dct else zstandard.ZstdCompressor(level=level)
+        return czst.compress(self.dumps_json(obj, indent=None).encode('utf-8'))
+
+    def load_zst(self, file, *args, **kwargs):
+        with open(file, "rb") as f:
+            try:
+                return self.loads_zst(f.read())
+            except JSONDecodeError as e:
+                raise myex(e, str(file))
+
+    def dump_zst(self, file, obj, *args, **kwargs):
+        with open(file, "wb") as f:
+            f.write(self.dumps_zst(obj, **kwargs))
 
     def load_html(self, file, *args, parser="lxml", **kwargs):
         with open(file, "r") as f:
@@ -226,17 +341,6 @@ class FileManager:
         txt = "\n".join(lns)
         self.dump_txt(file, txt)
 
-    def __parse(self, obj):
-        if getattr(obj, "_asdict", None) is not None:
-            obj = obj._asdict()
-        if is_dataclass(obj):
-            obj = asdict(obj)
-        if isinstance(obj, (list, tuple, set)):
-            return tuple(map(self.__parse, obj))
-        if isinstance(obj, dict):
-            obj = {k: self.__parse(v) for k, v in obj.items()}
-        return obj
-
     def rm(self, file: str | Path):
         file = self.resolve_path(file)
         if not file.exists():
@@ -262,23 +366,82 @@ for mth in dir(FileManager):
 
 
 class DictFile:
-    def __init__(self, file: str):
+    """
+    Diccionario respaldado por un fichero (normalmente .dct.txt).
+    Con journal=True cada set/discard se anade en el momento a un
+    fichero de log (.<nombre>.journal) que se reproduce al cargar y
+    se compacta en el fichero ordenado al hacer dump (o al salir),
+    de manera que no se pierde el progreso si la ejecucion se interrumpe
+    """
+
+    def __init__(self, file: str, journal: bool = False):
         self.__file = file
         path = FM.resolve_path(file)
+        self.__journal = path.with_name(f".{path.name}{JOURNAL_SUFFIX}")
+        self.__lock = RLock()
+        self.__log = None
+        self.__journaling = journal
         self.__data: dict[int | str, str] = FM.load(file) if path.is_file() else {}
+        self.__replay()
+        if journal:
+            register(self.__close)
+
+    def __replay(self):
+        if not self.__journal.is_file():
+            return
+        count = 0
+        with open(self.__journal, "r", encoding="utf-8") as f:
+            for ln in f:
+                try:
+                    op, k, *v = CODEC.loads(ln)
+                except (ValueError, TypeError):
+                    # ultima linea a medio escribir
+                    continue
+                if op == "set" and len(v) == 1:
+                    self.__data[k] = v[0]
+                elif op == "del":
+                    self.__data.pop(k, None)
+                count = count + 1
+        logger.info(f"{self.__file}: {count} cambios recuperados de {self.__journal.name}")
+
+    def __append(self, *op):
+        if not self.__journaling:
+            return
+        if self.__log is None:
+            makedirs(self.__journal.parent, exist_ok=True)
+            self.__log = open(self.__journal, "a", encoding="utf-8")
+        self.__log.write(CODEC.dumps(list(op), indent=None) + "\n")
+        self.__log.flush()
 
     def dump(self):
-        FM.dump(self.__file, self.__data)
+        with self.__lock:
+            FM.dump(self.__file, self.__data)
+            if self.__log is not None:
+                self.__log.close()
+                self.__log = None
+            FM.rm(self.__journal)
+
+    def __close(self):
+        # compacta al salir solo si quedan cambios sin volcar
+        if self.__journal.is_file():
+            self.dump()
 
     def get(self, k: int | str, default=None):
         return self.__data.get(k, default)
 
     def discard(self, k: int | str):
-        self.__data.pop(k, None)
+        with self.__lock:
+            if k in self.__data:
+                self.__data.pop(k)
+                self.__append("del", k)
 
     def set(self, k: int | str, v: str):
-        if isinstance(v, str):
-            self.__data[k] = v
+        if not isinstance(v, str):
+            return
+        with self.__lock:
+            if self.__data.get(k) != v:
+                self.__data[k] = v
+                self.__append("set", k, v)
 
     def items(self):
         return self.__data.items()
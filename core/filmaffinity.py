@@ -8,15 +8,17 @@ import cloudscraper
 import logging
 from datetime import datetime
 from functools import cache
-from core.cache import DictCache
+from core.cache import DictCache, get_cache_obj
+from core.prefetch import POOL
 from core.git import G
+from core.ratelimit import RL
 
 
 logger = logging.getLogger(__name__)
 
 re_sp = re.compile(r"\s+")
 
-FM_SCRAPER = cloudscraper.create_scraper()
+FM_SCRAPER = RL.mount(cloudscraper.create_scraper())
 
 
 class FilmAffinityError(ValueError):
@@ -24,11 +26,15 @@ class FilmAffinityError(ValueError):
 
 
 @cache
-def _get_html(id: int):
+def _get_html(id: int, retry: bool = True):
     url = f"https://www.filmaffinity.com/es/film{id}.html"
     soup = buildSoup(url, FM_SCRAPER.get(url).text)
     title_none = "not title found"
     txt = get_text(soup.select_one("title")) or title_none
+    if retry and txt.lower() in ("too many request", ):
+        # bloquea el host en el RateLimiter y reintenta una vez
+        RL.penalize(url)
+        return _get_html(id, retry=False)
     if txt.lower() in (title_none, "too many request", ):
         raise FilmAffinityError(txt)
     return str(soup)
@@ -58,6 +64,13 @@ class FilmAffinity(NamedTuple):
 
 class FilmAffinityApi:
     ACTIVE = True
+    HOST = "www.filmaffinity.com"
+
+    def prefetch(self, *ids: int):
+        cch = get_cache_obj(self.__get)
+        if cch is not None:
+            ids = cch.stale(self, ids)
+        return POOL.prefetch(self.__get, ids, host=FilmAffinityApi.HOST, label="filmaffinity")
 
     @cache
     def get(self, id: int):
@@ -8,10 +8,12 @@ import re
 from core.web import buildSoup, get_text, WEB, find_by_text
 from core.wiki import WIKI
 from typing import NamedTuple, Optional
-from core.dblite import DB, dict_factory, gW
+from core.dblite import DB, iter_rows
 from core.country import CF
-from core.cache import DictCache
+from core.cache import DictCache, get_cache_obj
+from core.prefetch import POOL
 from core.git import G
+from core.ratelimit import RL
 
 
 logger = logging.getLogger(__name__)
@@ -67,12 +69,14 @@ class IMDBInfo(NamedTuple):
 
 
 class IMDBApi:
+    OMDBAPI_HOST = "www.omdbapi.com"
+
     def __init__(self):
         key = environ['OMDBAPI_KEY']
-        self.__omdbapi = f"http://www.omdbapi.com/?apikey={key}&i="
+        self.__omdbapi = f"http://{IMDBApi.OMDBAPI_HOST}/?apikey={key}&i="
         self.__imdb = "https://www.imdb.com/es-es/title/"
         self.__omdbapi_activate = True
-        self.__s = Session()
+        self.__s = RL.mount(Session())
 
     @cache
     @DictCache(
@@ -105,24 +109,15 @@ class IMDBApi:
             return None
         return js
 
+    def prefetch(self, *ids: str):
+        cch = get_cache_obj(self.__get_from_omdbapi)
+        if cch is not None:
+            ids = cch.stale(self, ids)
+        return POOL.prefetch(self.__get_from_omdbapi, ids, host=IMDBApi.OMDBAPI_HOST, label="imdb.omdbapi")
+
     def get(self, *ids: str):
         obj: dict[str, IMDBInfo] = dict()
-        for row in DB.select(f'''
-            select
-                  m.id,
-                  m.type,
-                  m.year,
-                  m.duration,
-                  m.rating,
-                  m.votes,
-                  e.filmaffinity,
-                  e.wikipedia,
-                  e.countries
-            from
-                  movie m left join extra e on e.movie=m.id
-            where
-                  id {gW(ids)}
-        ''', *ids, row_factory=dict_factory):
+        for row in iter_rows(DB.get_movies(ids)):
             obj[row['id']] = IMDBInfo(
                 id=row['id'],
                 title=None,
@@ -0,0 +1,113 @@
+"""
+Comprueba al arrancar que los ficheros de las Cache se pueden leer
+y aparta (cuarentena) los que esten corruptos en lugar de dejar que
+la build falle al leerlos. Tambien borra los temporales que haya dejado
+una escritura atomica interrumpida.
+
+python -m core.integrity [--full]
+"""
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from pathlib import Path
+from time import time
+from os import cpu_count
+from core.filemanager import FM, TMP_SUFFIX, ZstdDictNotFound
+from core.store import FileStore
+from core.cache import iter_caches
+from core.log import config_log
+import argparse
+import logging
+
+logger = logging.getLogger(__name__)
+
+QUARANTINE = "rec/quarantine"
+STATE = "rec/integrity.json"
+
+
+def _check(file: str) -> str | None:
+    try:
+        FM.load(file)
+    except ZstdDictNotFound:
+        # no esta corrupto, la Cache lo descarta al leerlo
+        return None
+    except Exception as e:
+        return f"{type(e).__name__}: {e}"
+    return None
+
+
+def iter_cache_files():
+    for c in iter_caches():
+        if not isinstance(c.store, FileStore) or "{}" not in c.file:
+            continue
+        for k in c.keys():
+            path = FM.resolve_path(k)
+            if not path.is_file():
+                # entrada .json.zst que aun se lee del .json antiguo
+                path = path.with_suffix("")
+            if path.is_file():
+                yield path
+
+
+def rm_tmp(*dirs: Path):
+    count = 0
+    for d in dirs:
+        for fl in d.glob(f".*{TMP_SUFFIX}"):
+            fl.unlink()
+            count = count + 1
+    return count
+
+
+def quarantine(path: Path, error: str):
+    now = datetime.now().strftime("%Y%m%d%H%M%S")
+    if path.is_relative_to(FM.root):
+        name = path.relative_to(FM.root)
+    else:
+        name = Path(*path.parts[1:])
+    target = FM.resolve_path(QUARANTINE).joinpath(name.parent, f"{name.name}.{now}")
+    target.parent.mkdir(parents=True, exist_ok=True)
+    path.rename(target)
+    logger.warning(f"{path} -> {target} ({error})")
+
+
+def scan(full: bool = False, workers: int = None) -> dict:
+    """
+    Si full es False solo se revisan los ficheros modificados (ctime)
+    desde el ultimo escaneo correcto
+    """
+    start = time()
+    state = FM.resolve_path(STATE)
+    since = 0
+    if not full and state.is_file():
+        since = (FM.load(state) or {}).get('time') or 0
+    files = sorted(set(iter_cache_files()))
+    tmp = rm_tmp(*set(f.parent for f in files))
+    todo = [f for f in files if f.stat().st_ctime >= since]
+    bad: dict[Path, str] = {}
+    if todo:
+        with ProcessPoolExecutor(max_workers=workers or cpu_count()) as ex:
+            for f, error in zip(todo, ex.map(_check, map(str, todo), chunksize=64)):
+                if error is not None:
+                    bad[f] = error
+    for f, error in bad.items():
+        quarantine(f, error)
+    FM.dump(state, {"time": start})
+    report = {
+        "files": len(files),
+        "checked": len(todo),
+        "quarantine": len(bad),
+        "tmp": tmp,
+        "seconds": round(time() - start, 1)
+    }
+    logger.info(f"integrity: {len(todo)}/{len(files)} ficheros revisados, {len(bad)} en cuarentena, {tmp} temporales borrados")
+    return report
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Aparta los ficheros de cache corruptos')
+    parser.add_argument('--full', action='store_true', help='revisar todos los ficheros, no solo los modificados')
+    parser.add_argument('--workers', type=int, default=None, help='numero de procesos')
+    args = parser.parse_args()
+    config_log("log/integrity.log")
+    # importar los modulos que declaran las Cache
+    import core.collector  # noqa: F401
+    scan(full=args.full, workers=args.workers)
@@ -13,6 +13,8 @@ from zoneinfo import ZoneInfo
 
 import bs4
 from jinja2 import Environment, FileSystemLoader
+from core.codec import CODEC
+from core.filemanager import FM
 
 re_br = re.compile(r"<br/>(\s*</)")
 re_sp = re.compile(r"\s+")
@@ -25,37 +27,45 @@ def get_text(n: Tag):
     return re_sp.sub(" ", n.get_text()).strip()
 
 
+def js_default(o):
+    if isinstance(o, date) and not isinstance(o, datetime):
+        o = datetime.combine(o, datetime.min.time(), tzinfo=MADRID_TZ)
+        o = o.replace(tzinfo=MADRID_TZ)
+    if isinstance(o, datetime):
+        return ["<<Date>>", o.isoformat(), "<</END>>"]
+    if isinstance(o, dict_items):
+        return ["<<Map>>", list(o), "<</END>>"]
+    if isinstance(o, dict):
+        return ["<<Map>>", list(o.items()), "<</END>>"]
+    raise TypeError(f"Object of type {type(o).__name__} is not JSON serializable")
+
+
+def js_parse(o):
+    if isinstance(o, dict):
+        return ["<<Map>>", list(
+                map(lambda kv: (
+                    kv[0], js_parse(kv[1])), o.items())
+                ), "<</END>>"]
+    if isinstance(o, set):
+        o = list(map(js_parse, o))
+        if len(o) > 0 and len(set(map(lambda x: type(x), o))) == 1:
+            if isinstance(o[0], (str, int, float)):
+                o = sorted(o)
+        return ["<<Set>>", o, "<</END>>"]
+    if isinstance(o, (list, tuple)):
+        return list(map(js_parse, o))
+    return o
+
+
 class CustomEncoder(json.JSONEncoder):
     def default(self, o):
-        if isinstance(o, date) and not isinstance(o, datetime):
-            o = datetime.combine(o, datetime.min.time(), tzinfo=MADRID_TZ)
-            o = o.replace(tzinfo=MADRID_TZ)
-        if isinstance(o, datetime):
-            return ["<<Date>>", o.isoformat(), "<</END>>"]
-        if isinstance(o, dict_items):
-            return ["<<Map>>", list(o), "<</END>>"]
-        if isinstance(o, dict):
-            return ["<<Map>>", list(o.items()), "<</END>>"]
-        return super().default(o)
-
-    def __parse(self, o):
-        if isinstance(o, dict):
-            return ["<<Map>>", list(
-                    map(lambda kv: (
-                        kv[0], self.__parse(kv[1])), o.items())
-                    ), "<</END>>"]
-        if isinstance(o, set):
-            o = list(map(self.__parse, o))
-            if len(o) > 0 and len(set(map(lambda x: type(x), o))) == 1:
-                if isinstance(o[0], (str, int, float)):
-                    o = sorted(o)
-            return ["<<Set>>", o, "<</END>>"]
-        if isinstance(o, (list, tuple)):
-            return list(map(self.__parse, o))
-        return o
+        try:
+            return js_default(o)
+        except TypeError:
+            return super().default(o)
 
     def encode(self, o):
-        return super().encode(self.__parse(o))
+        return super().encode(js_parse(o))
 
 
 def simplify(s: str):
@@ -234,8 +244,9 @@ class Jnj2():
         if not exists(directorio):
             makedirs(directorio)
 
-        with open(destino, "wb") as fh:
-            fh.write(bytes(html, 'UTF-8'))
+        with FM.atomic(destino) as tmp:
+            with open(tmp, "wb") as fh:
+                fh.write(bytes(html, 'UTF-8'))
         return html
 
     def add_favicon(self, html: str):
@@ -337,8 +348,7 @@ class Jnj2():
         indent = 2
         if self.minify:
             indent = None
-        separators = (',', ':') if indent is None else None
-        with open(destino, "w") as f:
+        with FM.atomic(destino) as tmp, open(tmp, "w", encoding="utf-8") as f:
             for i, (k, v) in enumerate(kargv.items()):
                 if i > 0:
                     f.write("\n")
@@ -346,11 +356,12 @@ class Jnj2():
                 if isinstance(v, str):
                     f.write(v+";")
                     continue
-                js = json.dumps(
-                    v,
+                # ensure_ascii, como con json.dumps, para que el script no dependa del charset
+                js = CODEC.dumps(
+                    js_parse(v),
                     indent=indent,
-                    separators=separators,
-                    cls=CustomEncoder
+                    default=js_default,
+                    ensure_ascii=True
                 )
                 js = re.sub(r'\[\s*"<<(Map|Set|Date)>>"\s*,\s*', r'new \1(', js)
                 js = re.sub(r'\s*,\s*"<</END>>"\s*\]', ')', js)
@@ -0,0 +1,103 @@
+from collections import OrderedDict
+from copy import deepcopy
+from threading import Lock
+from typing import Any, Hashable
+from core.util import get_env
+from core.codec import CODEC
+import logging
+
+logger = logging.getLogger(__name__)
+
+MB = 1024 * 1024
+
+
+class MemoryLRU:
+    """
+    Cache en memoria (LRU acotada en bytes) delante de los store de las Cache,
+    para no releer y parsear el mismo fichero en cada llamada.
+    Cada entrada guarda el mtime con el que se leyo y se descarta
+    si el del store ha cambiado.
+    El tamaño de cada entrada es el del objeto ya decodificado (serializado
+    a json, no el del fichero, que puede estar comprimido) y se guarda y
+    devuelve una copia, de manera que el que llama puede modificarla
+    """
+
+    def __init__(self, max_bytes: int):
+        self.__max_bytes = max(0, max_bytes)
+        self.__data: OrderedDict[Hashable, tuple[float, int, Any]] = OrderedDict()
+        self.__bytes = 0
+        self.__lock = Lock()
+
+    @property
+    def bytes(self):
+        return self.__bytes
+
+    def __len__(self):
+        return len(self.__data)
+
+    def __pop(self, key: Hashable):
+        _, size, _ = self.__data.pop(key)
+        self.__bytes = self.__bytes - size
+
+    def get(self, key: Hashable, mtime: float | None):
+        with self.__lock:
+            item = self.__data.get(key)
+            if item is None:
+                return None
+            if mtime is None or item[0] != mtime:
+                self.__pop(key)
+                return None
+            self.__data.move_to_end(key)
+            data = item[2]
+        return deepcopy(data)
+
+    def put(self, key: Hashable, mtime: float | None, data: Any):
+        if data is None or mtime is None:
+            self.discard(key)
+            return
+        try:
+            size = len(CODEC.dumpb(data))
+        except (TypeError, ValueError) as e:
+            logger.debug(f"MemoryLRU.put({key}): {e}")
+            size = None
+        if size is None or size > self.__max_bytes:
+            self.discard(key)
+            return
+        data = deepcopy(data)
+        with self.__lock:
+            if key in self.__data:
+                self.__pop(key)
+            self.__data[key] = (mtime, size, data)
+            self.__bytes = self.__bytes + size
+            while self.__bytes > self.__max_bytes:
+                self.__pop(next(iter(self.__data)))
+
+    def retime(self, key: Hashable, mtime: float | None):
+        with self.__lock:
+            item = self.__data.get(key)
+            if item is None:
+                return
+            if mtime is None:
+                self.__pop(key)
+                return
+            self.__data[key] = (mtime, item[1], item[2])
+
+    def discard(self, key: Hashable):
+        with self.__lock:
+            if key in self.__data:
+                self.__pop(key)
+
+    def clear(self):
+        with self.__lock:
+            self.__data.clear()
+            self.__bytes = 0
+
+    def to_dict(self):
+        return {
+            "entries": len(self.__data),
+            "mb": round(self.__bytes / MB, 2),
+            "max_mb": round(self.__max_bytes / MB, 2)
+        }
+
+
+MEMORY = MemoryLRU(int(float(get_env('CACHE_MEMORY_MB', default='64')) * MB))
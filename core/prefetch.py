@@ -0,0 +1,105 @@
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from threading import BoundedSemaphore, Lock
+from typing import Callable, Iterable, TypeVar, Any
+from core.util import get_env
+import logging
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar('T')
+
+DEFAULT_WORKERS = 4
+HOST_WORKERS: dict[str, int] = {
+    "api.rtve.es": 8,
+    "backend-prod.efilm.online": 4,
+    "www.omdbapi.com": 4,
+    "www.filmaffinity.com": 1,
+}
+# cada cuantos elementos (como minimo) se informa del progreso
+PROGRESS_MIN = 25
+
+
+def _parse_workers(s: str | None):
+    """
+    PREFETCH_WORKERS=8 -> 8 hilos para cualquier host
+    PREFETCH_WORKERS="api.rtve.es=8 backend-prod.efilm.online=4" -> por host
+    """
+    default = None
+    hosts: dict[str, int] = {}
+    for i in (s or "").replace(",", " ").split():
+        k, v = i.rsplit("=", 1) if "=" in i else (None, i)
+        if not v.isdecimal():
+            logger.warning(f"PREFETCH_WORKERS: {i} ignorado")
+            continue
+        if k is None:
+            default = int(v)
+        else:
+            hosts[k] = int(v)
+    return default, hosts
+
+
+class HostPool:
+    def __init__(self, default: int = DEFAULT_WORKERS, hosts: dict[str, int] = None):
+        env_default, env_hosts = _parse_workers(get_env('PREFETCH_WORKERS'))
+        self.__default = env_default or default
+        self.__hosts = {**(hosts or {}), **env_hosts}
+        self.__sem: dict[str, BoundedSemaphore] = {}
+        self.__lock = Lock()
+
+    def workers(self, host: str = None) -> int:
+        return max(1, self.__hosts.get(host, self.__default))
+
+    def __semaphore(self, host: str) -> BoundedSemaphore:
+        with self.__lock:
+            if host not in self.__sem:
+                self.__sem[host] = BoundedSemaphore(self.workers(host))
+            return self.__sem[host]
+
+    def __run(self, host: str, fnc: Callable[[T], Any], arg: T):
+        if host is None:
+            return fnc(arg)
+        with self.__semaphore(host):
+            return fnc(arg)
+
+    def map(self, fnc: Callable[[T], Any], args: Iterable[T], host: str = None) -> list:
+        """
+        Como map(fnc, args) pero concurrente, respetando el limite de host.
+        Conserva el orden y propaga la primera excepcion
+        """
+        args = list(args)
+        if len(args) < 2 or self.workers(host) == 1:
+            return list(map(fnc, args))
+        with ThreadPoolExecutor(max_workers=min(len(args), self.workers(host))) as ex:
+            return list(ex.map(lambda a: self.__run(host, fnc, a), args))
+
+    def prefetch(self, fnc: Callable[[T], Any], args: Iterable[T], host: str = None, label: str = None) -> int:
+        """
+        Ejecuta fnc(arg) para cada arg de manera concurrente solo por
+        su efecto secundario (normalmente rellenar una Cache).
+        Los errores se registran y se ignoran, el camino secuencial
+        que venga despues los volvera a encontrar.
+        Devuelve el numero de llamadas que terminaron sin error
+        """
+        args = list(args)
+        if len(args) == 0:
+            return 0
+        label = label or getattr(fnc, "__name__", str(fnc))
+        workers = min(len(args), self.workers(host))
+        logger.info(f"prefetch {label}: {len(args)} items, {workers} workers ({host})")
+        ok = 0
+        step = max(PROGRESS_MIN, len(args) // 10)
+        with ThreadPoolExecutor(max_workers=workers) as ex:
+            futures = {ex.submit(self.__run, host, fnc, a): a for a in args}
+            for done, f in enumerate(as_completed(futures), start=1):
+                e = f.exception()
+                if e is None:
+                    ok = ok + 1
+                else:
+                    logger.warning(f"prefetch {label}({futures[f]}): {e}")
+                if done % step == 0 and done < len(args):
+                    logger.info(f"prefetch {label}: {done}/{len(args)}")
+        logger.info(f"prefetch {label}: {ok}/{len(args)} OK")
+        return ok
+
+
+POOL = HostPool(hosts=HOST_WORKERS)
@@ -0,0 +1,165 @@
+from threading import Lock
+from time import monotonic, sleep
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from urllib.parse import urlsplit
+from requests import Session, Response, PreparedRequest
+from requests.adapters import BaseAdapter, HTTPAdapter
+from core.util import get_env
+from core.revalidate import REVALIDATION
+import logging
+
+logger = logging.getLogger(__name__)
+
+# host: (peticiones por segundo, rafaga)
+HOST_LIMITS: dict[str, tuple[float, int]] = {
+    "api.rtve.es": (10, 10),
+    "www.rtve.es": (5, 5),
+    "recomsys.rtve.es": (5, 5),
+    "backend-prod.efilm.online": (5, 5),
+    "www.omdbapi.com": (5, 5),
+    "www.imdb.com": (2, 2),
+    "www.filmaffinity.com": (0.5, 1),
+    "query.wikidata.org": (1, 2),
+}
+# segundos que se bloquea un host que responde 429/503 sin Retry-After
+DEFAULT_COOLDOWN = 60
+
+
+def _parse_limits(s: str | None):
+    """
+    RATE_LIMIT="api.rtve.es=10/10 www.filmaffinity.com=0.5/1"
+    """
+    hosts: dict[str, tuple[float, int]] = {}
+    for i in (s or "").replace(",", " ").split():
+        try:
+            host, val = i.split("=", 1)
+            rate, burst = (val.split("/", 1) + [None])[:2]
+            rate = float(rate)
+            hosts[host] = (rate, int(burst) if burst else max(1, int(rate)))
+        except ValueError:
+            logger.warning(f"RATE_LIMIT: {i} ignorado")
+    return hosts
+
+
+def get_retry_after(r: Response) -> float | None:
+    if not isinstance(r, Response):
+        return None
+    val = (r.headers.get("Retry-After") or "").strip()
+    if len(val) == 0:
+        return None
+    if val.isdecimal():
+        return float(val)
+    try:
+        dt = parsedate_to_datetime(val)
+    except (TypeError, ValueError):
+        return None
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=timezone.utc)
+    return max(0, (dt - datetime.now(timezone.utc)).total_seconds())
+
+
+class TokenBucket:
+    def __init__(self, rate: float = None, burst: int = 1):
+        self.__rate = rate if rate and rate > 0 else None
+        self.__burst = max(1, burst)
+        self.__tokens = float(self.__burst)
+        self.__last = monotonic()
+        self.__until = 0
+        self.__lock = Lock()
+
+    def reserve(self) -> float:
+        """
+        Consume un token y devuelve cuantos segundos hay que esperar
+        antes de usarlo (0 si se puede usar ya)
+        """
+        with self.__lock:
+            now = monotonic()
+            wait = max(0, self.__until - now)
+            if self.__rate is None:
+                return wait
+            self.__tokens = min(self.__burst, self.__tokens + (now - self.__last) * self.__rate)
+            self.__last = now
+            self.__tokens = self.__tokens - 1
+            if self.__tokens < 0:
+                wait = max(wait, -self.__tokens / self.__rate)
+            return wait
+
+    def acquire(self):
+        wait = self.reserve()
+        if wait > 0:
+            sleep(wait)
+        return wait
+
+    def block(self, seconds: float):
+        with self.__lock:
+            self.__until = max(self.__until, monotonic() + seconds)
+
+
+class RateLimiter:
+    def __init__(self, hosts: dict[str, tuple[float, int]] = None, cooldown: float = DEFAULT_COOLDOWN):
+        self.__hosts = {**(hosts or {}), **_parse_limits(get_env('RATE_LIMIT'))}
+        self.__cooldown = float(get_env('RATE_LIMIT_COOLDOWN', default=str(cooldown)))
+        self.__buckets: dict[str, TokenBucket] = {}
+        self.__lock = Lock()
+
+    def bucket(self, url: str) -> TokenBucket:
+        host = urlsplit(url).netloc.lower() if "://" in url else url.lower()
+        with self.__lock:
+            if host not in self.__buckets:
+                rate, burst = self.__hosts.get(host, (None, 1))
+                self.__buckets[host] = TokenBucket(rate, burst)
+            return self.__buckets[host]
+
+    def wait(self, url: str):
+        wait = self.bucket(url).acquire()
+        if wait > 1:
+            logger.debug(f"RateLimiter: {wait:.1f}s {url}")
+
+    def penalize(self, url: str, seconds: float = None, response: Response = None):
+        """
+        Bloquea el host de url durante Retry-After si la respuesta lo trae,
+        o durante seconds (o el cooldown por defecto) si no
+        """
+        wait = get_retry_after(response)
+        if wait is None:
+            wait = self.__cooldown if seconds is None else seconds
+        if wait > 0:
+            logger.info(f"RateLimiter: {urlsplit(url).netloc} bloqueado {wait:.0f}s")
+            self.bucket(url).block(wait)
+
+    def mount(self, session: Session, pool_maxsize: int = 16):
+        for prefix, adapter in list(session.adapters.items()):
+            if isinstance(adapter, RateLimitAdapter):
+                continue
+            if type(adapter) is HTTPAdapter:
+                adapter = HTTPAdapter(pool_connections=pool_maxsize, pool_maxsize=pool_maxsize)
+            session.mount(prefix, RateLimitAdapter(self, adapter))
+        return session
+
+
+class RateLimitAdapter(BaseAdapter):
+    """
+    Envuelve el adaptador original de la sesion (para no perder, por ejemplo,
+    el de cloudscraper) y pasa cada peticion por el RateLimiter
+    """
+
+    def __init__(self, limiter: RateLimiter, adapter: BaseAdapter):
+        super().__init__()
+        self.__limiter = limiter
+        self.__adapter = adapter
+
+    def send(self, request: PreparedRequest, **kwargs):
+        REVALIDATION.prepare(request)
+        self.__limiter.wait(request.url)
+        r = self.__adapter.send(request, **kwargs)
+        if r.status_code == 429 or (r.status_code == 503 and get_retry_after(r) is not None):
+            self.__limiter.penalize(request.url, response=r)
+        REVALIDATION.process(request, r)
+        return r
+
+    def close(self):
+        self.__adapter.close()
+
+
+RL = RateLimiter(hosts=HOST_LIMITS)
@@ -0,0 +1,94 @@
+from pathlib import Path
+from hashlib import sha256
+from urllib.parse import urlsplit
+from core.filemanager import FM
+from core.util import get_env
+from core.codec import CODEC
+import gzip
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class RawStore:
+    """
+    Guarda comprimido (gzip) el cuerpo original de las respuestas http,
+    indexado por url, para poder volver a transformarlo (por ejemplo
+    cuando cambia un _clean_js) sin volver a pedirlo al servidor.
+    Las claves (ver key) son las rutas de los ficheros y las que se usan
+    en la ejecucion se anotan en used para CacheGC
+    """
+
+    def __init__(self, root: str = "rec/raw"):
+        self.__root = root
+        self.name = f"RawStore({root})"
+        self.used: set[str] = set()
+
+    def path(self, url: str) -> Path:
+        h = sha256(url.encode('utf-8')).hexdigest()
+        host = urlsplit(url).netloc or "_"
+        return FM.resolve_path(self.__root).joinpath(host, h[:2], h + ".gz")
+
+    def __key(self, path: Path) -> str:
+        if path.is_relative_to(FM.root):
+            return str(path.relative_to(FM.root))
+        return str(path)
+
+    def key(self, url: str) -> str:
+        return self.__key(self.path(url))
+
+    def use(self, url: str):
+        """
+        Marca la respuesta de url como viva aunque no se lea
+        (ej: la entrada de la Cache que sale de ella sigue siendo valida)
+        """
+        self.used.add(self.key(url))
+
+    def keys(self) -> tuple[str, ...]:
+        root = FM.resolve_path(self.__root)
+        return tuple(sorted(self.__key(fl) for fl in root.glob("*/*/*.gz") if fl.is_file()))
+
+    def mtime(self, key: str) -> float | None:
+        path = FM.resolve_path(key)
+        if not path.is_file():
+            return None
+        return path.stat().st_mtime
+
+    def size(self, key: str) -> int:
+        path = FM.resolve_path(key)
+        if not path.is_file():
+            return 0
+        return path.stat().st_size
+
+    def rm(self, key: str):
+        FM.rm(FM.resolve_path(key))
+
+    def exists(self, url: str) -> bool:
+        return self.path(url).is_file()
+
+    def save(self, url: str, body: bytes):
+        self.use(url)
+        with FM.atomic(self.path(url)) as tmp:
+            with gzip.open(tmp, "wb", compresslevel=6) as f:
+                f.write(body)
+
+    def load(self, url: str) -> bytes | None:
+        path = self.path(url)
+        if not path.is_file():
+            return None
+        self.use(url)
+        try:
+            with gzip.open(path, "rb") as f:
+                return f.read()
+        except (OSError, EOFError) as e:
+            logger.warning(f"{path}: {e}")
+            return None
+
+    def load_json(self, url: str):
+        body = self.load(url)
+        if body is None:
+            return None
+        return CODEC.loads(body)
+
+
+RAW = RawStore(get_env('RAW_STORE', default='rec/raw'))
@@ -2,8 +2,10 @@ import requests
 from requests.exceptions import RequestException, Timeout, HTTPError
 from functools import cache
 import logging
-from time import sleep
 from json.decoder import JSONDecodeError
+from core.ratelimit import RL
+from core.retry import RetryPolicy
+from core.codec import CODEC
 
 logger = logging.getLogger(__name__)
 
@@ -15,9 +17,20 @@ def _get_http_code(x):
         return x.status_code
 
 
+class WaitStatusError(HTTPError):
+    """
+    HTTPError con un codigo de estado de wait_if_status, ya penalizado en RL
+    """
+    pass
+
+
+# sin retry: un intento mas (tras la espera de RL) si el codigo de estado esta en wait_if_status
+WAIT_RETRY = RetryPolicy(tries=2, base=0, jitter=0, statuses=tuple(), retry_on=(WaitStatusError, ), name="wait_if_status")
+
+
 class Req:
     def __init__(self):
-        self.__S = requests.Session()
+        self.__S = RL.mount(requests.Session())
 
     def __get_response(self, url: str, headers: frozenset = None, data: bytes = None):
         hdrs = dict(headers or frozenset())
@@ -37,7 +50,7 @@ class Req:
     @cache
     def __get_json(self, url: str, headers: frozenset = None, data: bytes = None) -> str:
         r = self.__get_response(url, headers=headers, data=data)
-        js = r.json()
+        js = CODEC.loads(r.content)
         return js
 
     def get_json(
@@ -45,18 +58,28 @@ class Req:
         url: str,
         headers: dict = None,
         data: bytes = None,
-        wait_if_status: dict[int, int] = None
+        wait_if_status: dict[int, int] = None,
+        retry: RetryPolicy = None
     ) -> list | dict:
+        """
+        Sin retry se hace un solo intento (uno mas, con WAIT_RETRY, si el
+        codigo de estado esta en wait_if_status). Los reintentos son opcionales
+        porque retry_fetch (wiki) ya reintenta reduciendo la consulta y el
+        sondeo de mirrors prefiere fallar rapido
+        """
         frz = frozenset(headers.items()) if headers else None
-        try:
-            js = self.__get_json(url, headers=frz, data=data)
-            return js
-        except HTTPError as e:
-            wait = (wait_if_status or {}).get(_get_http_code(e), 0)
-            if wait <= 0:
-                raise
-        sleep(wait)
-        return self.get_json(url, headers, data, wait_if_status=tuple())
+
+        def _get_json():
+            try:
+                return self.__get_json(url, headers=frz, data=data)
+            except HTTPError as e:
+                wait = (wait_if_status or {}).get(_get_http_code(e), 0)
+                if wait <= 0:
+                    raise
+                RL.penalize(url, wait, response=e.response)
+                raise WaitStatusError(*e.args, request=e.request, response=e.response) from e
+
+        return (retry or WAIT_RETRY).call(_get_json)
 
     def safe_get_json(self, url, *args, **kwargs):
         try:
@@ -0,0 +1,146 @@
+from threading import Lock
+from functools import update_wrapper
+from time import monotonic, sleep
+from typing import Callable, Iterator, TypeVar
+from random import uniform
+from requests import Response
+from requests.exceptions import HTTPError, ConnectionError, Timeout
+from core.util import get_env
+import logging
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar('T')
+
+RETRY_STATUS = (429, 500, 502, 503, 504)
+
+
+class RetryBudget:
+    """
+    Numero maximo de reintentos para toda la ejecucion, compartido
+    por todas las RetryPolicy, para que un servicio caido no se coma
+    el tiempo de la build a base de esperas
+    """
+
+    def __init__(self, total: int):
+        self.__total = total
+        self.__used = 0
+        self.__lock = Lock()
+
+    @property
+    def used(self):
+        return self.__used
+
+    def take(self) -> bool:
+        with self.__lock:
+            if self.__used >= self.__total:
+                if self.__used == self.__total:
+                    logger.warning(f"RetryBudget agotado ({self.__total} reintentos)")
+                    self.__used = self.__used + 1
+                return False
+            self.__used = self.__used + 1
+            return True
+
+
+def _get_status(e: Exception | Response) -> int | None:
+    if isinstance(e, HTTPError):
+        e = e.response
+    if isinstance(e, Response):
+        return e.status_code
+    return getattr(e, "http_code", None)
+
+
+class RetryPolicy:
+    def __init__(
+        self,
+        tries: int = 3,
+        base: float = 1,
+        factor: float = 2,
+        max_wait: float = 30,
+        jitter: float = 0.5,
+        deadline: float = None,
+        statuses: tuple[int, ...] = RETRY_STATUS,
+        retry_on: tuple[type[Exception], ...] = (ConnectionError, Timeout),
+        budget: RetryBudget = None,
+        name: str = None
+    ):
+        """
+        Parameters
+        ----------
+        tries: int
+            numero total de intentos (el primero incluido)
+        base, factor, max_wait:
+            la espera antes del intento n es min(max_wait, base * factor**(n-1))
+        jitter: float
+            fraccion de la espera que se aleatoriza (0 = sin jitter, 1 = full jitter)
+        deadline: float
+            segundos maximos desde el primer intento, None = sin limite
+        statuses:
+            codigos http que se reintentan (HTTPError o excepciones con http_code)
+        retry_on:
+            excepciones que se reintentan siempre
+        """
+        self.tries = max(1, tries)
+        self.base = base
+        self.factor = factor
+        self.max_wait = max_wait
+        self.jitter = min(1, max(0, jitter))
+        self.deadline = deadline
+        self.statuses = frozenset(statuses or tuple())
+        self.retry_on = tuple(retry_on or tuple())
+        self.budget = BUDGET if budget is None else budget
+        self.name = name
+
+    def is_retryable(self, e: Exception) -> bool:
+        if isinstance(e, self.retry_on):
+            return True
+        return _get_status(e) in self.statuses
+
+    def backoff(self, attempt: int) -> float:
+        if attempt < 1:
+            return 0
+        wait = min(self.max_wait, self.base * (self.factor ** (attempt - 1)))
+        return wait - uniform(0, wait * self.jitter)
+
+    def attempts(self) -> Iterator[int]:
+        """
+        Genera el numero de intento (0, 1, 2...) esperando lo que toque
+        antes de cada reintento. Se para al agotar intentos, deadline o
+        presupuesto. El que itera decide con break cuando ya no hace falta seguir
+        """
+        start = monotonic()
+        for attempt in range(self.tries):
+            if attempt > 0:
+                wait = self.backoff(attempt)
+                if self.deadline is not None:
+                    left = self.deadline - (monotonic() - start)
+                    if left <= 0:
+                        return
+                    wait = min(wait, left)
+                if not self.budget.take():
+                    return
+                if wait > 0:
+                    logger.debug(f"{self.name or 'retry'}: intento {attempt+1}/{self.tries} en {wait:.1f}s")
+                    sleep(wait)
+            yield attempt
+
+    def call(self, fnc: Callable[..., T], *args, **kwargs) -> T:
+        last: Exception = None
+        for attempt in self.attempts():
+            try:
+                return fnc(*args, **kwargs)
+            except Exception as e:
+                if not self.is_retryable(e):
+                    raise
+                last = e
+                logger.debug(f"{self.name or getattr(fnc, '__name__', 'retry')}: {e}")
+        raise last
+
+    def __call__(self, func: Callable[..., T]) -> Callable[..., T]:
+        def retryCall(*args, **kwargs):
+            return self.call(func, *args, **kwargs)
+        update_wrapper(retryCall, func)
+        return retryCall
+
+
+BUDGET = RetryBudget(int(get_env('RETRY_BUDGET', default='200')))
@@ -0,0 +1,69 @@
+from threading import local
+from contextlib import contextmanager
+from requests import Response, PreparedRequest
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class NotModified(Exception):
+    """
+    Se lanza cuando el servidor responde 304 a una peticion condicional,
+    la Cache la captura y reutiliza el fichero que ya tenia
+    """
+
+    def __init__(self, url: str):
+        super().__init__(f"304 Not Modified {url}")
+        self.url = url
+
+
+class Revalidation:
+    """
+    Contexto por hilo que une la Cache con la capa http:
+    la Cache indica los validadores (ETag / Last-Modified) de la entrada que va
+    a refrescar y el adaptador http los envia como If-None-Match /
+    If-Modified-Since y recoge los de la respuesta
+    """
+
+    def __init__(self):
+        self.__local = local()
+
+    @contextmanager
+    def context(self, validators: dict[str, str] = None):
+        old = getattr(self.__local, "ctx", None)
+        ctx = {
+            "sent": {k: v for k, v in (validators or {}).items() if v},
+            "received": {}
+        }
+        self.__local.ctx = ctx
+        try:
+            yield ctx['received']
+        finally:
+            self.__local.ctx = old
+
+    def prepare(self, request: PreparedRequest):
+        ctx = getattr(self.__local, "ctx", None)
+        if ctx is None or request.method != "GET":
+            return
+        etag = ctx['sent'].get('etag')
+        last_modified = ctx['sent'].get('last-modified')
+        if etag:
+            request.headers['If-None-Match'] = etag
+        if last_modified:
+            request.headers['If-Modified-Since'] = last_modified
+
+    def process(self, request: PreparedRequest, r: Response):
+        ctx = getattr(self.__local, "ctx", None)
+        if ctx is None or request.method != "GET":
+            return
+        if r.status_code == 304 and ctx['sent']:
+            raise NotModified(request.url)
+        if r.status_code == 200:
+            ctx['received'].clear()
+            for k in ('etag', 'last-modified'):
+                v = r.headers.get(k)
+                if v:
+                    ctx['received'][k] = v
+
+
+REVALIDATION = Revalidation()
@@ -6,7 +6,7 @@ from collections import defaultdict
 from typing import Any
 from bs4 import Tag
 import logging
-from core.cache import Cache
+from core.cache import Cache, get_cache_obj
 from core.util import dict_walk, trim, re_or, mapdict, tp_split, dict_walk_positive
 import re
 from functools import cache
@@ -15,6 +15,8 @@ from core.filemanager import DictFile, FM
 from core.dblite import DB
 from types import MappingProxyType
 from core.util import clean_html
+from core.prefetch import POOL
+from core.raw import RAW
 
 
 logger = logging.getLogger(__name__)
@@ -113,6 +115,35 @@ class Video(NamedTuple):
     description: str
 
 
+def _ficha_url(id: int):
+    return f"https://{Rtve.API_HOST}/api/videos/{id}.json"
+
+
+def _parse_ficha(url: str, js: dict) -> dict[str, Any] | None:
+    if not isinstance(js, dict):
+        raise ValueError(f"not dict {url}")
+    error = js.get("http error 404")
+    if error:
+        logger.critical(f"{error} in {url}")
+        return None
+    page = js.get('page')
+    if not isinstance(page, dict):
+        raise ValueError(f"not dict[page] {url}")
+    return mapdict(_clean_js, page['items'][0], compact=True)
+
+
+def _raw_url(slf, id: int):
+    return _ficha_url(id)
+
+
+def _rebuild_ficha(slf, id: int):
+    url = _ficha_url(id)
+    js = RAW.load_json(url)
+    if js is None:
+        return None
+    return _parse_ficha(url, js)
+
+
 class Rtve(Web):
     CONSOLIDATED: MappingProxyType[int, str] = MappingProxyType(FM.load("cache/rtve.dct.txt"))
     JSONS = (
@@ -126,8 +157,10 @@ class Rtve(Web):
         'https://recomsys.rtve.es/recommendation/tops?source=apps&recoId=tve-playz&size=999'
     )
 
+    API_HOST = "api.rtve.es"
+
     def __init__(self, *args, **kwargv):
-        self.__new = DictFile("cache/rtve.new.dct.txt")
+        self.__new = DictFile("cache/rtve.new.dct.txt", journal=True)
         super().__init__(*args, **kwargv)
 
     @cached_property
@@ -157,12 +190,9 @@ class Rtve(Web):
         return ids
 
     @cache
-    def get_videos(self, *urls: str):
-        if len(urls) == 0:
-            urls = tuple(self.urls)
+    def __get_listing(self, *urls: str) -> tuple[tuple[int, ...], dict[int, Tag]]:
         id_li: dict[int, Tag] = dict()
         ids: set[int] = set()
-        col: dict[id, set[Video]] = defaultdict(set)
         set_urls = set(urls)
         js_urls = set_urls.intersection(Rtve.JSONS)
         ids = ids.union(self.__get_ids(*js_urls))
@@ -180,17 +210,31 @@ class Rtve(Web):
                     ids.add(ficha_id)
                     id_li[ficha_id] = li
         ids_ko = self.__get_ids(*Rtve.BAN_IDS)
-        for ficha_id in sorted(ids):
-            if ficha_id not in ids_ko:
-                v = self.get_video(ficha_id, id_li.get(ficha_id))
-                if v is None:
-                    continue
-                if v.idImdb is None:
-                    v = v._replace(
-                        idImdb=DB.search_imdb_id(v.title, v.productionDate, v.director, v.duration)
-                    )
-                    self.__new.set(v.id, v.idImdb)
-                col[v.id].add(v)
+        return tuple(sorted(ids.difference(ids_ko))), id_li
+
+    def get_ids(self, *urls: str) -> tuple[int, ...]:
+        if len(urls) == 0:
+            urls = tuple(self.urls)
+        return self.__get_listing(*urls)[0]
+
+    @cache
+    def get_videos(self, *urls: str):
+        if len(urls) == 0:
+            urls = tuple(self.urls)
+        col: dict[id, set[Video]] = defaultdict(set)
+        ids, id_li = self.__get_listing(*urls)
+        self.prefetch_fichas(*ids)
+        videos = [self.get_video(ficha_id, id_li.get(ficha_id)) for ficha_id in ids]
+        videos = [v for v in videos if v is not None]
+        unmatched = [i for i, v in enumerate(videos) if v.idImdb is None]
+        found = DB.search_imdb_ids(
+            (v.title, v.productionDate, v.director, v.duration) for v in (videos[i] for i in unmatched)
+        )
+        for i, idImdb in zip(unmatched, found):
+            videos[i] = videos[i]._replace(idImdb=idImdb)
+            self.__new.set(videos[i].id, idImdb)
+        for v in videos:
+            col[v.id].add(v)
         arr: set[Video] = set()
         for v in col.values():
             arr.add(self.__merge(v))
@@ -201,6 +245,12 @@ class Rtve(Web):
         logger.info(f"{len(videos)} recuperados de rtve")
         return videos
 
+    def prefetch_fichas(self, *ids: int):
+        cch = get_cache_obj(self.get_ficha)
+        if cch is not None:
+            ids = cch.stale(self, ids)
+        POOL.prefetch(self.get_ficha, ids, host=Rtve.API_HOST, label="rtve.get_ficha")
+
     def __merge(self, videos: set[Video]):
         if len(videos) == 0:
             raise ValueError(videos)
@@ -378,20 +428,13 @@ class Rtve(Web):
                 n.extract()
         return str(soup)
 
-    @Cache("rec/rtve/ficha/{}.json")
+    @Cache("rec/rtve/ficha/{}.json.zst", revalidate=True, version=(_clean_js, _parse_ficha), rebuild=_rebuild_ficha, raw=_raw_url, zstd_dict="rtve_ficha")
     def get_ficha(self, id: int) -> dict[str, Any]:
-        url = f"https://api.rtve.es/api/videos/{id}.json"
-        js = self.json(url)
-        if not isinstance(js, dict):
-            raise ValueError(f"not dict {url}")
-        error = js.get("http error 404")
-        if error:
-            logger.critical(f"{error} in {url}")
-            return None
-        page = js.get('page')
-        if not isinstance(page, dict):
-            raise ValueError(f"not dict[page] {url}")
-        return mapdict(_clean_js, page['items'][0], compact=True)
+        url = _ficha_url(id)
+        r = self._get(url)
+        js = r.json()
+        RAW.save(url, r.content)
+        return _parse_ficha(url, js)
 
 
 if __name__ == "__main__":
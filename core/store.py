@@ -0,0 +1,319 @@
+from sqlite3 import connect, Connection
+from threading import RLock, Timer, current_thread
+from atexit import register
+from contextlib import contextmanager, nullcontext
+from functools import cache
+from pathlib import Path
+from os import utime
+from time import time
+from typing import Iterable, Any
+from core.filemanager import FM
+from core.util import get_env, iter_chunk
+import json
+import logging
+import re
+
+logger = logging.getLogger(__name__)
+
+ZST = ".zst"
+
+
+def _glob_escape(s: str) -> str:
+    # en GLOB [*] es un * literal (y lo mismo con ? y [)
+    return re.sub(r"([*?\[])", r"[\1]", s)
+
+
+class FileStore:
+    """
+    Almacen de la Cache por defecto: cada entrada es un fichero
+    y la clave es su ruta (relativa a la raiz del proyecto).
+    Si la clave es .json.zst y aun no existe se usa el .json antiguo
+    (hasta que se vuelva a guardar, momento en que se borra)
+    """
+
+    def __legacy(self, path: Path) -> Path | None:
+        if path.name.endswith(ZST):
+            return path.with_name(path.name[:-len(ZST)])
+        return None
+
+    def __path(self, key: str) -> Path:
+        path = FM.resolve_path(key)
+        if not path.is_file():
+            legacy = self.__legacy(path)
+            if legacy is not None and legacy.is_file():
+                return legacy
+        return path
+
+    def exists(self, key: str) -> bool:
+        return self.__path(key).is_file()
+
+    def mtime(self, key: str) -> float | None:
+        path = self.__path(key)
+        if not path.is_file():
+            return None
+        return path.stat().st_mtime
+
+    def size(self, key: str) -> int:
+        path = self.__path(key)
+        if not path.is_file():
+            return 0
+        return path.stat().st_size
+
+    def keys(self, pattern: str = "{}") -> tuple[str, ...]:
+        """
+        Claves que encajan con el patron de una Cache (ej: rec/rtve/ficha/{}.json),
+        solo se admite {} en el nombre del fichero
+        """
+        path = FM.resolve_path(pattern.replace("{}", "*"))
+        files = list(path.parent.glob(path.name))
+        legacy = self.__legacy(path)
+        if legacy is not None:
+            files.extend(fl.with_name(fl.name + ZST) for fl in legacy.parent.glob(legacy.name))
+        arr = set()
+        for fl in files:
+            if not self.__path(fl).is_file():
+                continue
+            if Path(pattern).is_absolute():
+                arr.add(str(fl))
+            else:
+                arr.add(str(fl.relative_to(FM.root)))
+        return tuple(sorted(arr))
+
+    def load(self, key: str, **kwargs):
+        path = self.__path(key)
+        if path != FM.resolve_path(key):
+            # fichero antiguo sin comprimir
+            return FM.load(path)
+        return FM.load(path, **kwargs)
+
+    def dump(self, key: str, data, **kwargs):
+        FM.dump(key, data, **kwargs)
+        legacy = self.__legacy(FM.resolve_path(key))
+        if legacy is not None and legacy.is_file():
+            legacy.unlink()
+
+    def touch(self, key: str, mtime: float = None):
+        path = self.__path(key)
+        if mtime is None:
+            path.touch()
+        else:
+            utime(path, (mtime, mtime))
+
+    def meta_file(self, key: str) -> Path:
+        path = FM.resolve_path(key)
+        name = path.name[:-len(ZST)] if path.name.endswith(ZST) else path.name
+        return path.parent.joinpath(".meta", name).with_suffix(".json")
+
+    def load_meta(self, key: str) -> dict:
+        meta = self.meta_file(key)
+        if not meta.is_file():
+            return {}
+        data = FM.load_json(meta)
+        return data if isinstance(data, dict) else {}
+
+    def dump_meta(self, key: str, meta: dict):
+        FM.dump(self.meta_file(key), meta)
+
+    def rm(self, key: str):
+        path = FM.resolve_path(key)
+        FM.rm(path)
+        legacy = self.__legacy(path)
+        if legacy is not None:
+            FM.rm(legacy)
+        FM.rm(self.meta_file(key))
+
+    def load_many(self, keys: Iterable[str], **kwargs) -> dict[str, Any]:
+        return {k: self.load(k, **kwargs) for k in keys if self.exists(k)}
+
+    def mtimes(self, keys: Iterable[str]) -> dict[str, float]:
+        obj = {k: self.mtime(k) for k in keys}
+        return {k: v for k, v in obj.items() if v is not None}
+
+    def batch(self):
+        return nullcontext(self)
+
+
+class SqliteStore:
+    """
+    Guarda todas las entradas en una unica base de datos sqlite
+    (key, data, mtime, meta) en lugar de un fichero por entrada.
+    Las escrituras se agrupan en transacciones de batch_size entradas
+    o de las que se hagan en max_delay segundos, lo que antes ocurra
+    """
+
+    def __init__(self, file: str, batch_size: int = 500, max_delay: float = 5):
+        self.__file = FM.resolve_path(file)
+        self.__batch_size = batch_size
+        self.__max_delay = max_delay
+        self.__con: Connection = None
+        self.__pending = 0
+        self.__depth = 0
+        self.__timer: Timer = None
+        self.__lock = RLock()
+        register(self.close)
+
+    @property
+    def file(self):
+        return self.__file
+
+    @property
+    def con(self) -> Connection:
+        if self.__con is None:
+            self.__file.parent.mkdir(parents=True, exist_ok=True)
+            logger.info(f"Connecting to {self.__file}")
+            self.__con = connect(self.__file, check_same_thread=False)
+            self.__con.execute("PRAGMA journal_mode=WAL")
+            self.__con.execute("PRAGMA synchronous=NORMAL")
+            self.__con.execute("""
+                CREATE TABLE IF NOT EXISTS kv (
+                    key TEXT PRIMARY KEY,
+                    data BLOB,
+                    mtime REAL NOT NULL,
+                    meta TEXT
+                )
+            """)
+            self.__con.commit()
+        return self.__con
+
+    def __one(self, sql: str, *args):
+        with self.__lock:
+            return self.con.execute(sql, args).fetchone()
+
+    def __write(self, sql: str, *args):
+        with self.__lock:
+            self.con.execute(sql, args)
+            self.__pending = self.__pending + 1
+            if self.__depth > 0:
+                return
+            if self.__pending >= self.__batch_size:
+                self.commit()
+            elif self.__timer is None:
+                self.__timer = Timer(self.__max_delay, self.__flush)
+                self.__timer.daemon = True
+                self.__timer.start()
+
+    def __flush(self):
+        with self.__lock:
+            if self.__timer is current_thread():
+                self.__timer = None
+            if self.__depth == 0:
+                self.commit()
+
+    def commit(self):
+        with self.__lock:
+            if self.__timer is not None:
+                self.__timer.cancel()
+                self.__timer = None
+            if self.__con is not None and self.__pending > 0:
+                self.__con.commit()
+                self.__pending = 0
+
+    @contextmanager
+    def batch(self):
+        with self.__lock:
+            self.__depth = self.__depth + 1
+        try:
+            yield self
+        finally:
+            with self.__lock:
+                self.__depth = self.__depth - 1
+                if self.__depth == 0:
+                    self.commit()
+
+    def exists(self, key: str) -> bool:
+        return self.__one("select 1 from kv where key = ?", str(key)) is not None
+
+    def mtime(self, key: str) -> float | None:
+        row = self.__one("select mtime from kv where key = ?", str(key))
+        return None if row is None else row[0]
+
+    def size(self, key: str) -> int:
+        row = self.__one("select length(data) from kv where key = ?", str(key))
+        return 0 if row is None or row[0] is None else row[0]
+
+    def load(self, key: str, **kwargs):
+        row = self.__one("select data from kv where key = ?", str(key))
+        if row is None or row[0] is None:
+            return None
+        return FM.loads_json(row[0])
+
+    def dump(self, key: str, data, mtime: float = None, **kwargs):
+        self.__write(
+            "insert into kv (key, data, mtime) values (?, ?, ?) on conflict(key) do update set data=excluded.data, mtime=excluded.mtime",
+            str(key), FM.dumps_json(data, indent=None), time() if mtime is None else mtime
+        )
+
+    def touch(self, key: str, mtime: float = None):
+        self.__write("update kv set mtime = ? where key = ?", time() if mtime is None else mtime, str(key))
+
+    def load_meta(self, key: str) -> dict:
+        row = self.__one("select meta from kv where key = ?", str(key))
+        if row is None or row[0] is None:
+            return {}
+        return json.loads(row[0])
+
+    def dump_meta(self, key: str, meta: dict):
+        self.__write("update kv set meta = ? where key = ?", json.dumps(meta), str(key))
+
+    def rm(self, key: str):
+        self.__write("delete from kv where key = ?", str(key))
+
+    def load_many(self, keys: Iterable[str], **kwargs) -> dict[str, Any]:
+        obj = {}
+        for chunk in iter_chunk(500, list(map(str, keys))):
+            prm = ", ".join(["?"] * len(chunk))
+            with self.__lock:
+                rows = self.con.execute(f"select key, data from kv where key in ({prm})", chunk).fetchall()
+            for k, d in rows:
+                if d is not None:
+                    obj[k] = FM.loads_json(d)
+        return obj
+
+    def mtimes(self, keys: Iterable[str]) -> dict[str, float]:
+        obj = {}
+        for chunk in iter_chunk(500, list(map(str, keys))):
+            prm = ", ".join(["?"] * len(chunk))
+            with self.__lock:
+                rows = self.con.execute(f"select key, mtime from kv where key in ({prm})", chunk).fetchall()
+            obj.update(dict(rows))
+        return obj
+
+    def keys(self, pattern: str = "{}") -> tuple[str, ...]:
+        # GLOB y no LIKE: distingue mayusculas y el _ de las claves no es un comodin
+        glob = "*".join(map(_glob_escape, pattern.split("{}")))
+        with self.__lock:
+            rows = self.con.execute("select key from kv where key glob ? order by key", (glob, )).fetchall()
+        return tuple(r[0] for r in rows)
+
+    def close(self):
+        with self.__lock:
+            if self.__con is None:
+                return
+            self.commit()
+            logger.info(f"Closing {self.__file}")
+            self.__con.close()
+            self.__con = None
+
+
+FILE_STORE = FileStore()
+
+
+def get_store(name: str = None) -> FileStore | SqliteStore:
+    """
+    name (o la variable de entorno CACHE_STORE) puede ser:
+    file -> un fichero por entrada (por defecto)
+    sqlite o sqlite:ruta.sqlite -> SqliteStore (rec/cache.sqlite por defecto)
+    """
+    if name is None:
+        name = get_env('CACHE_STORE', default='file')
+    if name == 'file':
+        return FILE_STORE
+    if name.split(":", 1)[0] == 'sqlite':
+        file = name.split(":", 1)[1] if ":" in name else "rec/cache.sqlite"
+        return _get_sqlite_store(file)
+    raise ValueError(f"CACHE_STORE={name} no soportado")
+
+
+@cache
+def _get_sqlite_store(file: str):
+    return SqliteStore(file)
@@ -350,6 +350,34 @@ def plain_text(s: Union[str, Tag], is_html=False):
     return s
 
 
+# articulos que se ignoran al principio de un titulo (o al final tras una coma: "Padrino, El")
+# solo articulos en español e ingles; 'a' no, que en español es preposicion
+TITLE_ARTICLES = (
+    'el', 'la', 'los', 'las', 'lo', 'un', 'una', 'unos', 'unas',
+    'the', 'an'
+)
+re_title_punct = re.compile(r"[^\w]+|_+")
+re_title_article = re.compile(r"^(?:" + "|".join(TITLE_ARTICLES) + r") (?=\w)")
+re_title_article_tail = re.compile(r", (?:" + "|".join(TITLE_ARTICLES) + r")$")
+
+
+def norm_title(s: str):
+    """
+    Titulo normalizado para buscar peliculas por igualdad: minusculas,
+    sin acentos, sin signos de puntuacion y sin articulo inicial
+    ("El padrino", "Padrino, El" y "padrino" dan "padrino")
+    """
+    if not isinstance(s, str):
+        return None
+    s = unidecode(re_sp.sub(" ", s)).strip().lower()
+    s = re_title_article_tail.sub("", s)
+    s = re_title_punct.sub(" ", s).strip()
+    s = re_title_article.sub("", s)
+    if len(s) == 0:
+        return None
+    return s
+
+
 def re_or(s: str, *args: Union[str, Tuple[str]], to_log: str = None, flags = 0):
     if s is None or len(s) == 0 or len(args) == 0:
         return None
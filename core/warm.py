@@ -0,0 +1,151 @@
+"""
+Rellena de antemano las caches que va a necesitar build_site.py
+para que la build se ejecute (casi) entera desde cache:
+
+python -m core.warm [rtve] [efilm] [imdb] [filmaffinity] [--all]
+
+imdb y filmaffinity solo se rellenan para las fichas que hay ahora en
+rtve y efilm (las que va a procesar la build); con --all para todos
+los ids de cache/*.dct.txt, incluidas las fichas que ya no estan
+"""
+from core.filemanager import FM
+from core.log import config_log
+from sqlite3 import OperationalError
+from pathlib import Path
+from functools import cache
+import argparse
+import logging
+import re
+
+logger = logging.getLogger(__name__)
+
+re_imdb = re.compile(r"^tt\d+$")
+TARGETS = ("rtve", "efilm", "imdb", "filmaffinity")
+
+
+@cache
+def _rtve():
+    from core.rtve import Rtve
+    return Rtve()
+
+
+@cache
+def _efilm():
+    from core.efilm import EFilm
+    return EFilm()
+
+
+@cache
+def get_fichas() -> dict[str, frozenset[str]]:
+    """
+    Ids de las fichas que va a procesar la build, por el nombre del
+    fichero cache/{nombre}.dct.txt (y {nombre}.new.dct.txt) que las
+    asocia con su id de imdb o filmaffinity
+    """
+    fichas: dict[str, frozenset[str]] = {}
+    for name, fnc in (
+        ("rtve", lambda: _rtve().get_ids()),
+        ("efilm", lambda: tuple(i['id'] for i in _efilm().get_items())),
+    ):
+        try:
+            fichas[name] = frozenset(map(str, fnc()))
+        except Exception as e:
+            logger.critical(f"warm {name}: {e}", exc_info=True)
+    return fichas
+
+
+def _iter_dct(pattern: str, fichas: dict[str, frozenset[str]] = None):
+    """
+    Valores de los cache/pattern, solo los de las fichas dadas
+    (ver get_fichas) si fichas no es None
+    """
+    for fl in sorted(Path(FM.resolve_path("cache")).glob(pattern)):
+        keys = None
+        if fichas is not None:
+            keys = fichas.get(fl.name.split(".")[0])
+            if keys is None:
+                continue
+        obj = FM.load(fl)
+        if isinstance(obj, dict):
+            for k, v in obj.items():
+                if keys is None or str(k) in keys:
+                    yield v
+
+
+def get_imdb_ids(fichas: dict[str, frozenset[str]] = None) -> tuple[str, ...]:
+    ids: set[str] = set()
+    for v in _iter_dct("*.dct.txt", fichas):
+        if isinstance(v, str) and re_imdb.match(v):
+            ids.add(v)
+    return tuple(sorted(ids))
+
+
+def get_filmaffinity_ids(*imdb: str, fichas: dict[str, frozenset[str]] = None) -> tuple[int, ...]:
+    """
+    Los ids de cache/filmaffinity/*.dct.txt (de las fichas dadas si
+    fichas no es None) y los que la base de datos asocia a los ids de
+    imdb dados
+    """
+    from core.dblite import DB
+    ids: set[int] = set()
+    for v in _iter_dct("filmaffinity/*.dct.txt", fichas):
+        nums = set(map(int, re.findall(r"\d+", str(v))))
+        if len(nums) == 1:
+            ids.add(nums.pop())
+    try:
+        ids.update(f for f in DB.get_movies(imdb)['filmaffinity'] if f is not None)
+    except OperationalError as e:
+        logger.warning(f"{DB.file}: {e}")
+    return tuple(sorted(ids))
+
+
+def warm_rtve():
+    r = _rtve()
+    ids = r.get_ids()
+    logger.info(f"rtve: {len(ids)} fichas")
+    r.prefetch_fichas(*ids)
+
+
+def warm_efilm():
+    e = _efilm()
+    ids = tuple(i['id'] for i in e.get_items())
+    logger.info(f"efilm: {len(ids)} fichas")
+    e.prefetch_fichas(*ids)
+
+
+def warm_imdb(full: bool = False):
+    from core.imdb import IMDB
+    ids = get_imdb_ids(None if full else get_fichas())
+    logger.info(f"imdb: {len(ids)} ids")
+    IMDB.prefetch(*ids)
+
+
+def warm_filmaffinity(full: bool = False):
+    from core.filmaffinity import FilmM
+    fichas = None if full else get_fichas()
+    ids = get_filmaffinity_ids(*get_imdb_ids(fichas), fichas=fichas)
+    logger.info(f"filmaffinity: {len(ids)} ids")
+    FilmM.prefetch(*ids)
+
+
+def warm(*targets: str, full: bool = False):
+    fncs = {
+        "rtve": warm_rtve,
+        "efilm": warm_efilm,
+        "imdb": lambda: warm_imdb(full),
+        "filmaffinity": lambda: warm_filmaffinity(full),
+    }
+    for t in (targets or TARGETS):
+        try:
+            fncs[t]()
+        except Exception as e:
+            logger.critical(f"warm {t}: {e}", exc_info=True)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Rellena las caches que necesita build_site.py')
+    parser.add_argument('targets', nargs='*', choices=TARGETS, help='caches a rellenar (por defecto todas)')
+    parser.add_argument('--all', dest='full', action='store_true', help='imdb y filmaffinity de todos los ids de cache/*.dct.txt, no solo de las fichas actuales')
+    args = parser.parse_args()
+    config_log("log/warm.log")
+    warm(*args.targets, full=args.full)
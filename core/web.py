@@ -30,6 +30,7 @@ from selenium.webdriver.remote.webelement import WebElement
 import logging
 from typing import Union
 from requests import RequestException
+from core.ratelimit import RL
 
 logger = logging.getLogger(__name__)
 
@@ -123,7 +124,7 @@ class WebException(Exception):
 
 class Web:
     def __init__(self, refer=None, verify=True):
-        self.s = requests.Session()
+        self.s = RL.mount(requests.Session())
         self.s.headers = default_headers
         self.response = None
         self.soup = None
@@ -3,12 +3,12 @@ import logging
 from typing import Any, NamedTuple
 from functools import cache
 import re
-from time import sleep
 from functools import wraps
 from core.git import G
 from core.req import R
+from core.ratelimit import RL
+from core.retry import RetryPolicy
 from collections import defaultdict
-from datetime import datetime, timedelta
 from core.util import iter_chunk
 from urllib.error import HTTPError
 from core.country import CF
@@ -18,6 +18,7 @@ import json
 logger = logging.getLogger(__name__)
 re_sp = re.compile(r"\s+")
 LANGS = ('es', 'en', 'ca', 'gl', 'it', 'fr')
+WIKIDATA_SPARQL = "https://query.wikidata.org/sparql"
 
 
 class WikiUrl(NamedTuple):
@@ -75,7 +76,10 @@ class WikiError(Exception):
         return self.__query
 
 
-def retry_fetch(chunk_size=5000):
+def retry_fetch(chunk_size=5000, policy: RetryPolicy = None):
+    if policy is None:
+        policy = RetryPolicy(tries=3, base=5, max_wait=60, deadline=60*5, name="retry_fetch")
+
     def decorator(func):
         internal_cache: dict[tuple[str, str], Any] = {}
 
@@ -103,15 +107,13 @@ def retry_fetch(chunk_size=5000):
 
             error_query = {}
             count = 0
-            tries = 0
-            until = datetime.now() + timedelta(seconds=60*5)
             cur_chunk_size = int(chunk_size)
-            while undone and (tries == 0 or (datetime.now() < until and tries < 3)):
+            for tries in policy.attempts():
+                if not undone:
+                    break
                 error_query = {}
-                tries = tries + 1
-                if tries > 1:
+                if tries > 0:
                     cur_chunk_size = max(1, min(cur_chunk_size, len(undone)) // 3)
-                    sleep(5)
                 logger.info(_log_line(undone, kwargs, cur_chunk_size))
                 for chunk in iter_chunk(cur_chunk_size, list(undone)):
                     count += 1
@@ -122,7 +124,7 @@ def retry_fetch(chunk_size=5000):
                     except WikiError as e:
                         logger.warning(f"└ [KO] {e.msg}")
                         if e.http_code == 429:
-                            sleep(60)
+                            RL.penalize(WIKIDATA_SPARQL)
                         elif e.http_code is not None:
                             last_error = error_query.get(e.http_code)
                             if last_error is None or len(last_error) > len(e.query):
@@ -166,7 +168,7 @@ class WikiApi:
         self.__last_query = query
         try:
             return R.get_json(
-                "https://query.wikidata.org/sparql",
+                WIKIDATA_SPARQL,
                 headers=self.__headers,
                 data=self.__last_query.encode('utf-8'),
                 wait_if_status={429: 60}
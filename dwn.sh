@@ -1,6 +1,17 @@
 #!/bin/bash
+set -o pipefail
 URL="https://s-nt-s.github.io/imdb-sql/imdb.sqlite.zst"
 rm -rf imdb.sqlite
+# IMDB_SLIM=1: usar la version reducida (tool/slim_db.py) que ha dejado
+# la ultima build en la cache de github actions, salvo los domingos,
+# que se baja la completa para recoger las novedades de imdb
+# (y con ella se vuelve a generar la reducida)
+if [ "$IMDB_SLIM" == "1" ] && [ -f imdb.slim.sqlite ] && [ "$(date +%u)" != "7" ]; then
+    echo "[OK] imdb.slim.sqlite"
+    ls -lah imdb.slim.sqlite
+    exit 0
+fi
+rm -rf imdb.slim.sqlite
 echo "[..] $URL"
 curl -sqL "$URL" | zstd -dq -o imdb.sqlite
 if [ $? -eq 0 ]; then
@@ -8,4 +19,4 @@ if [ $? -eq 0 ]; then
 else
     echo "[KO] $URL"
 fi
-ls -lah imdb.sqlite
\ No newline at end of file
+ls -lah imdb.sqlite
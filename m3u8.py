@@ -8,6 +8,7 @@ import requests
 from os import environ
 import re
 from dotenv import load_dotenv
+from core.retry import RetryPolicy
 
 load_dotenv()
 
@@ -16,6 +17,7 @@ logging.basicConfig(
     format='%(message)s'
 )
 logger = logging.getLogger(__name__)
+RETRY = RetryPolicy(tries=2, base=5, retry_on=(YoutubeDLError, ), statuses=None, name="m3u8")
 
 
 @cache
@@ -41,23 +43,15 @@ def get_m3u8(url):
 
 
 def safe_get_m3u8(*urls):
-    r = dict()
-    tries: dict[str, int] = dict()
-    urls = list(urls)
-    while urls:
-        url = urls.pop()
+    for url in reversed(urls):
         try:
-            m3u8 = get_m3u8(url)
+            m3u8 = RETRY.call(get_m3u8, url)
             if m3u8 is None:
                 logger.warning(f"[¿?] {url}")
                 continue
             yield url, m3u8
             logger.info(f"[OK] {url}")
         except YoutubeDLError as e:
-            tries[url] = tries.get(url, 0) + 1
-            if tries[url] < 2:
-                urls.append(url)
-                continue
             logger.warning(f"[KO] {url} {e}")
 
 
@@ -0,0 +1,126 @@
+import os
+import random
+from pathlib import Path
+from sqlite3 import connect
+from unidecode import unidecode
+import pytest
+
+# core.git necesita saber el repositorio aunque no haya remote (ej: en un tarball)
+os.environ.setdefault("GITHUB_REPOSITORY", "s-nt-s/cine")
+# core.j2 las lee al importarse (las define el workflow)
+os.environ.setdefault("PAGE_URL", "https://s-nt-s.github.io/cine")
+os.environ.setdefault("REPO_URL", "https://github.com/s-nt-s/cine")
+
+ROOT = Path(__file__).resolve().parent.parent
+
+# las tablas de imdb.sqlite, los indices, fts y vistas estan en sql/sqlite.sql
+TABLES = """
+CREATE TABLE MOVIE (id TEXT PRIMARY KEY, type TEXT, year INTEGER, duration INTEGER, rating REAL, votes INTEGER);
+CREATE TABLE EXTRA (movie TEXT PRIMARY KEY, filmaffinity INTEGER, wikipedia TEXT, countries TEXT);
+CREATE TABLE TITLE (movie TEXT NOT NULL, title TEXT NOT NULL);
+CREATE TABLE PERSON (id TEXT PRIMARY KEY, name TEXT NOT NULL);
+CREATE TABLE DIRECTOR (movie TEXT NOT NULL, person TEXT NOT NULL);
+"""
+WORDS = (
+    "amor", "guerra", "noche", "ciudad", "río", "sombra", "invierno", "café",
+    "verano", "mar", "tierra", "corazón", "camino", "último", "fuego", "luna"
+)
+NAMES = ("José", "María", "Ángel", "Luis", "Pilar", "Jesús", "Inés", "Ramón")
+SURNAMES = ("García", "Martín", "Núñez", "López", "Sáez", "Díaz", "Peña", "Ruiz")
+
+
+def build_imdb(file: Path, size: int = 600, seed: int = 0):
+    """
+    imdb.sqlite de juguete con el esquema de sql/sqlite.sql, con titulos
+    y directores repetidos en distintos años para que haya ambiguedad
+    """
+    rnd = random.Random(seed)
+    persons = tuple((f"nm{i:07d}", f"{n} {s}") for i, (n, s) in enumerate(
+        ((n, s) for n in NAMES for s in SURNAMES), start=1
+    ))
+    movies, titles, directors = [], [], []
+    for i in range(1, size + 1):
+        mid = f"tt{i:07d}"
+        words = rnd.sample(WORDS, rnd.choice((1, 2, 2, 3)))
+        movies.append((mid, "movie", rnd.randint(1950, 2024), rnd.randint(70, 150), rnd.randint(10, 90) / 10, rnd.randint(0, 200000)))
+        titles.append((mid, " ".join(words).capitalize()))
+        if rnd.random() < 0.5:
+            titles.append((mid, "El " + " ".join(reversed(words))))
+        for p in rnd.sample(persons, rnd.choice((1, 1, 2))):
+            directors.append((mid, p[0]))
+    con = connect(file)
+    try:
+        con.executescript(TABLES)
+        con.executemany("insert into movie values (?, ?, ?, ?, ?, ?)", movies)
+        con.executemany("insert into extra values (?, null, null, null)", ((m[0], ) for m in movies))
+        con.executemany("insert into title values (?, ?)", titles)
+        con.executemany("insert into person values (?, ?)", persons)
+        con.executemany("insert into director values (?, ?)", directors)
+        con.commit()
+        con.executescript(ROOT.joinpath("sql/sqlite.sql").read_text())
+    finally:
+        con.close()
+    return file
+
+
+@pytest.fixture(autouse=True)
+def clear_memory():
+    """
+    Cada test empieza sin entradas en core.memcache.MEMORY
+    """
+    from core.memcache import MEMORY
+    MEMORY.clear()
+    yield
+    MEMORY.clear()
+
+
+@pytest.fixture(scope="session")
+def imdb_file(tmp_path_factory) -> Path:
+    return build_imdb(tmp_path_factory.mktemp("imdb") / "imdb.sqlite")
+
+
+def get_items(file: Path, min_year: int = None, max_year: int = None):
+    """
+    Busquedas de las peliculas (de la ventana de años si se pasa) con el
+    año, titulo, director o duracion algo cambiados, la mitad sin tildes
+    para que solo se encuentren por TITLE_FTS / PERSON_FTS,
+    y alguna que no existe
+    """
+    con = connect(file)
+    try:
+        rows = con.execute("""
+            select
+                (select t.title from title t where t.movie=m.id order by t.rowid desc limit 1),
+                m.year,
+                (select group_concat(p.name, '|') from director d join person p on p.id=d.person where d.movie=m.id),
+                m.duration
+            from movie m
+            where m.year between ? and ?
+            order by m.id
+        """, (min_year or 0, max_year or 9999)).fetchall()
+    finally:
+        con.close()
+    items = []
+    for i, (title, year, director, duration) in enumerate(rows):
+        if i % 2:
+            title, director = unidecode(title), unidecode(director)
+        if i % 5 == 0:
+            director = None
+        items.append((title, year + (i % 3) - 1, tuple(director.split("|")) if director else None, duration if i % 4 else None))
+    items.append(("No existe", 2000, ("Nadie", ), 90))
+    items.append(("Amor", None, None, None))
+    return tuple(items)
+
+
+@pytest.fixture(scope="session", params=(False, True), ids=("fts", "norm"))
+def db_file(request, imdb_file, tmp_path_factory) -> Path:
+    """
+    imdb.sqlite sin y con la tabla de titulos normalizados de tool/norm_title.py
+    """
+    from tool import norm_title
+    if not request.param:
+        return imdb_file
+    file = tmp_path_factory.mktemp("norm") / "imdb.sqlite"
+    file.write_bytes(imdb_file.read_bytes())
+    norm_title.build(str(file))
+    return file
@@ -0,0 +1,61 @@
+from os import utime
+from time import time
+from core.cache import StaticCache
+from core.cache_gc import CacheGC
+from core.store import FileStore
+from core.raw import RawStore
+from core.filemanager import FM
+import core.cache
+
+DAY = 86400
+
+
+def test_gc_last_use(tmp_path):
+    @StaticCache(str(tmp_path / "gc" / "{}.json"), store=FileStore(), maxOld=None)
+    def get(i):
+        return {"id": i}
+
+    for i in ("live", "recent", "old"):
+        get(i)
+    cch = get.__cache_obj__
+    old = time() - 365 * DAY
+    for k in cch.keys():
+        utime(k, (old, old))
+    used_file = str(tmp_path / "used.json")
+    cch.used = {cch.file.format("live")}
+    # recent no se ha usado en esta ejecucion pero si hace poco
+    FM.dump(used_file, {cch.file.format("recent"): time() - DAY})
+    report = CacheGC(max_old=180, used_file=used_file).run([cch])
+    assert report["removed"] == 1
+    assert cch.keys() == tuple(sorted(cch.file.format(i) for i in ("live", "recent")))
+    used = FM.load(used_file)
+    assert set(used) == set(cch.keys())
+
+
+def test_gc_raw(tmp_path):
+    raw = RawStore(str(tmp_path / "raw"))
+    urls = ("https://api/1", "https://api/2")
+    for u in urls:
+        raw.save(u, b'{"id": 1}')
+    old = time() - 365 * DAY
+    for k in raw.keys():
+        utime(FM.resolve_path(k), (old, old))
+    raw.used = {raw.key(urls[0])}
+    report = CacheGC(max_old=180, used_file=str(tmp_path / "used.json")).run([], raws=[raw])
+    assert report["removed"] == 1
+    assert raw.keys() == (raw.key(urls[0]), )
+    assert raw.load_json(urls[0]) == {"id": 1}
+
+
+def test_cache_marks_raw(tmp_path, monkeypatch):
+    raw = RawStore(str(tmp_path / "raw"))
+    monkeypatch.setattr(core.cache, "RAW", raw)
+
+    @StaticCache(str(tmp_path / "ficha" / "{}.json"), store=FileStore(), maxOld=None, raw=lambda i: f"https://api/{i}")
+    def get(i):
+        return {"id": i}
+
+    # la entrada de la cache sigue viva y con ella su respuesta original
+    get(1)
+    get(1)
+    assert raw.used == {raw.key("https://api/1")}
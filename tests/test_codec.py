@@ -0,0 +1,67 @@
+import json
+import re
+from datetime import date, datetime
+from typing import NamedTuple
+import pytest
+import core.j2
+from core.j2 import Jnj2, CustomEncoder, re_sp, MADRID_TZ
+from core.codec import get_codec, orjson
+
+CODECS = ("json", "orjson") if orjson is not None else ("json", )
+
+
+class Film(NamedTuple):
+    id: int
+    title: str
+    genres: tuple[str, ...]
+
+
+DATA = dict(
+    FILMS=[Film(1, "El señor de los anillos", ("Acción", "Fantasía")), Film(2, "Amélie 🎬", tuple())],
+    GENRES={"acción": 1, "fantasía": 2},
+    TAGS={"ñ", "a", "z"},
+    DATES=[date(2024, 1, 2), datetime(2024, 1, 2, 3, 4, tzinfo=MADRID_TZ)],
+    RAW="[1, 2]",
+)
+
+
+def reference(minify: bool, **kargv) -> str:
+    """
+    create_script antes de pasar por CODEC (json.dumps + CustomEncoder)
+    """
+    indent = None if minify else 2
+    separators = (',', ':') if indent is None else None
+    out = []
+    for k, v in kargv.items():
+        if isinstance(v, str):
+            out.append("const " + k + " = " + v + ";")
+            continue
+        js = json.dumps(v, indent=indent, separators=separators, cls=CustomEncoder)
+        js = re.sub(r'\[\s*"<<(Map|Set|Date)>>"\s*,\s*', r'new \1(', js)
+        js = re.sub(r'\s*,\s*"<</END>>"\s*\]', ')', js)
+        if not minify:
+            js = re.sub(r'\s*\[[^\[\]]+\]\s*', lambda x: re_sp.sub(" ", x.group()).strip(), js)
+        out.append("const " + k + " = " + js + ";")
+    return "\n".join(out)
+
+
+@pytest.mark.parametrize("name", CODECS)
+@pytest.mark.parametrize("minify", (False, True))
+def test_create_script_identical(tmp_path, monkeypatch, name, minify):
+    monkeypatch.setattr(core.j2, "CODEC", get_codec(name))
+    j = Jnj2("template/", str(tmp_path) + "/")
+    j.minify = minify
+    j.create_script("info.js", replace=True, **DATA)
+    out = (tmp_path / "info.js").read_bytes()
+    assert out == reference(minify, **DATA).encode("ascii")
+
+
+@pytest.mark.parametrize("name", CODECS)
+def test_ensure_ascii(name):
+    codec = get_codec(name)
+    obj = {"ñ": ["Amélie 🎬", " "]}
+    for indent in (None, 2):
+        assert codec.dumps(obj, indent=indent, ensure_ascii=True) == json.dumps(
+            obj, indent=indent, separators=(',', ':') if indent is None else None
+        )
+        assert codec.loads(codec.dumps(obj, indent=indent)) == obj
@@ -0,0 +1,138 @@
+from concurrent.futures import ThreadPoolExecutor
+import re
+from sqlite3 import connect
+import pytest
+from core.dblite import DBlite, score_candidates
+from core.util import norm_title
+from tool import norm_title as norm_table
+from conftest import get_items
+
+re_person = re.compile(r"select t\.qid, x\.id person from (\S+) t cross join PERSON x on [^\n]+")
+
+
+def test_search_imdb_ids_score(db_file):
+    items = get_items(db_file)
+    db = DBlite(str(db_file), use_misses=False)
+    try:
+        plain = db.search_imdb_ids(items, score=False)
+        scored = db.search_imdb_ids(items, score=True)
+    finally:
+        db.close()
+    # la puntuacion solo resuelve las que quedaban sin decidir
+    assert all(s == p for s, p in zip(scored, plain) if p is not None)
+    assert sum(1 for i in scored if i is not None) >= sum(1 for i in plain if i is not None)
+
+
+def test_score_candidates():
+    pytest.importorskip("numpy")
+    cols = {
+        'qid': (0, 0, 1, 1),
+        'movie': ("tt1", "tt2", "tt3", "tt4"),
+        'title': (1.0, 0.6, 1.0, 1.0),
+        'director': (1, 0, 0, 0),
+        'year': (2000, 2000, 1990, 1990),
+        'q_year': (2000, 2000, 1990, 1990),
+        'duration': (90, 90, None, None),
+        'q_duration': (90, 90, None, None),
+        'votes': (1000, 10, 100, 100),
+    }
+    # en 1 los dos candidatos empatan
+    assert score_candidates(cols) == {0: "tt1"}
+
+
+def test_mem_table_no_open_transaction(imdb_file):
+    db = DBlite(str(imdb_file), use_misses=False)
+    try:
+        with db.keys_table(("tt0000001", "tt0000002")) as keys:
+            assert not db.con.in_transaction
+            assert db.one(f"select count(*) from {keys}") == 2
+        assert not db.con.in_transaction
+    finally:
+        db.close()
+
+
+@pytest.mark.parametrize("full_match", (False, True))
+def test_search_imdb_ids_vs_search_imdb_id(db_file, full_match):
+    items = get_items(db_file)
+    db = DBlite(str(db_file), use_misses=False)
+    try:
+        one = tuple(db.search_imdb_id(*i, full_match=full_match) for i in items)
+        many = db.search_imdb_ids(items, full_match=full_match, score=False)
+    finally:
+        db.close()
+    assert many == one
+    assert sum(1 for i in one if i is not None) > len(items) / 3
+    assert one[-2:] == (None, None)
+
+
+def test_search_imdb_ids_person_index(imdb_file):
+    db = DBlite(str(imdb_file), use_misses=False)
+    sqls = []
+    try:
+        db.con.set_trace_callback(sqls.append)
+        db.search_imdb_ids(get_items(imdb_file)[:10], score=False)
+        db.con.set_trace_callback(None)
+        # la busqueda exacta de directores, con una tabla de nombres equivalente
+        sql = next(m.group(0) for m in map(re_person.search, sqls) if m)
+        with db.mem_table("qid INTEGER, name TEXT, fts TEXT", ((1, "José García", '"José García"'), )) as qd:
+            plan = db.to_tuple("explain query plan " + sql.replace(re_person.search(sql).group(1), qd))
+    finally:
+        db.close()
+    assert any("idx_person_name_nocase" in str(p) for p in plan)
+
+
+def test_norm_title():
+    assert norm_title("El padrino") == norm_title("Padrino, El") == norm_title("padrino") == "padrino"
+    assert norm_title("The Matrix") == "matrix"
+    # articulos de otros idiomas no, que dan colisiones
+    assert norm_title("Die Hard") == "die hard"
+    assert norm_title("Le Mans") == "le mans"
+    assert norm_title("L.A. Confidential") == "l a confidential"
+    assert norm_title("A ciegas") == "a ciegas"
+
+
+@pytest.fixture(scope="module")
+def norm_file(imdb_file, tmp_path_factory):
+    file = tmp_path_factory.mktemp("norm") / "imdb.sqlite"
+    file.write_bytes(imdb_file.read_bytes())
+    con = connect(file)
+    con.executemany("insert into movie values (?, 'movie', ?, 100, 5, 100)", (
+        ("tt9000001", 1931), ("tt9000002", 1932), ("tt9000003", 1931)
+    ))
+    con.executemany("insert into title values (?, ?)", (
+        ("tt9000001", "Los lunes"), ("tt9000002", "Lunes"), ("tt9000003", "Martes, El")
+    ))
+    con.commit()
+    con.close()
+    norm_table.build(str(file))
+    return file
+
+
+@pytest.mark.parametrize("item, imdb", (
+    # el normalizado es ambiguo (los dos son "lunes"): manda el titulo exacto
+    (("Los lunes", 1931), "tt9000001"),
+    (("Lunes", 1932), "tt9000002"),
+    # solo se encuentra por el normalizado
+    (("El martes", 1931), "tt9000003"),
+))
+def test_search_norm_title(norm_file, item, imdb):
+    db = DBlite(str(norm_file), use_misses=False)
+    try:
+        assert db.search_imdb_id(*item) == imdb
+        assert db.search_imdb_ids((item + (None, None), ), score=False) == (imdb, )
+    finally:
+        db.close()
+
+
+def test_threads(imdb_file):
+    items = get_items(imdb_file)
+    db = DBlite(str(imdb_file), use_misses=False)
+    try:
+        one = tuple(db.search_imdb_id(*i) for i in items)
+        chunks = [items[i::4] for i in range(4)]
+        with ThreadPoolExecutor(max_workers=4) as ex:
+            many = list(ex.map(lambda c: db.search_imdb_ids(c, score=False), chunks))
+    finally:
+        db.close()
+    for i, r in enumerate(many):
+        assert r == one[i::4]
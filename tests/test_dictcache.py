@@ -0,0 +1,36 @@
+from core.cache import DictCache
+from core.cache_gc import CacheGC
+import core.cache
+
+MIRROR = "http://mirror/"
+
+
+def test_mirror_sync_lazy(tmp_path, monkeypatch):
+    files = {f"{i}.json": "2020-01-01 00:00" for i in range(3)}
+    requested = []
+
+    def safe_get_json(url, *args, **kwargs):
+        requested.append(url)
+        if url == MIRROR + DictCache.MANIFEST:
+            return {"files": files}
+        name = url[len(MIRROR):]
+        if name in files:
+            return {"id": name, "__time__": files[name]}
+        return None
+
+    monkeypatch.setattr(core.cache.R, "safe_get_json", safe_get_json)
+
+    class Api:
+        @DictCache(str(tmp_path / "mirror" / "{}.json"), mirror=(MIRROR, ), maxOld=None)
+        def get(self, i):
+            raise AssertionError(f"{i} deberia venir del mirror")
+
+    api = Api()
+    assert api.get(1) == {"id": "1.json", "__time__": "2020-01-01 00:00"}
+    cch = Api.get.__cache_obj__
+    # solo se baja la entrada pedida y cuenta como usada para CacheGC
+    assert requested == [MIRROR + DictCache.MANIFEST, MIRROR + "1.json"]
+    assert cch.keys() == (cch.file.format(1), )
+    assert cch.used == {cch.file.format(1)}
+    CacheGC(max_old=180, used_file=str(tmp_path / "used.json")).run([cch])
+    assert cch.keys() == (cch.file.format(1), )
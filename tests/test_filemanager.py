@@ -0,0 +1,57 @@
+import pytest
+from core.filemanager import FM, DictFile
+
+
+def test_atomic(tmp_path):
+    file = tmp_path / "x.json"
+    FM.dump(file, {"a": 1})
+    with pytest.raises(RuntimeError):
+        with FM.atomic(file) as tmp:
+            tmp.write_text("{")
+            raise RuntimeError()
+    assert FM.load(file) == {"a": 1}
+    assert [f.name for f in tmp_path.iterdir()] == ["x.json"]
+
+
+def test_atomic_nothing_written(tmp_path):
+    file = tmp_path / "x.dct.txt"
+    # dump_dct no escribe nada si no es un dict
+    FM.dump(file, ["a"])
+    assert list(tmp_path.iterdir()) == []
+    FM.dump(file, {1: "a"})
+    FM.dump(file, None)
+    assert FM.load(file) == {1: "a"}
+    assert [f.name for f in tmp_path.iterdir()] == ["x.dct.txt"]
+
+
+def test_dictfile_journal_replay(tmp_path):
+    file = str(tmp_path / "test.dct.txt")
+    FM.dump(file, {1: "a", 2: "b"})
+    d = DictFile(file, journal=True)
+    d.set(3, "c")
+    d.set(1, "x")
+    d.discard(2)
+    d.set(4, None)
+    journal = tmp_path / ".test.dct.txt.journal"
+    assert journal.is_file()
+    # la ejecucion se corta antes del dump: el fichero no ha cambiado
+    assert FM.load(file) == {1: "a", 2: "b"}
+    # y la ultima linea del journal esta a medio escribir
+    with open(journal, "a") as f:
+        f.write('["set", 5, "')
+    d2 = DictFile(file, journal=True)
+    assert dict(d2.items()) == {1: "x", 3: "c"}
+    d2.dump()
+    assert not journal.is_file()
+    assert FM.load(file) == {1: "x", 3: "c"}
+    assert dict(DictFile(file).items()) == {1: "x", 3: "c"}
+
+
+def test_dictfile_without_journal(tmp_path):
+    file = str(tmp_path / "test.dct.txt")
+    d = DictFile(file)
+    d.set(1, "a")
+    assert not (tmp_path / ".test.dct.txt.journal").exists()
+    assert dict(DictFile(file).items()) == {}
+    d.dump()
+    assert dict(DictFile(file).items()) == {1: "a"}
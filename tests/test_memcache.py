@@ -0,0 +1,62 @@
+import os
+from core.memcache import MemoryLRU
+from core.codec import CODEC
+from core.cache import StaticCache
+from core.store import FileStore
+
+
+def test_size_decoded():
+    m = MemoryLRU(1000)
+    data = {"title": "x" * 100, "tags": ["a", "b"]}
+    m.put("k", 1, data)
+    assert m.bytes == len(CODEC.dumpb(data))
+    # lo que no cabe no se guarda, y lo mas antiguo sale primero
+    m.put("big", 1, "x" * 2000)
+    assert m.get("big", 1) is None
+    for i in range(20):
+        m.put(i, 1, {"title": "y" * 100})
+    assert m.bytes <= 1000
+    assert m.get("k", 1) is None
+    assert m.get(19, 1) == {"title": "y" * 100}
+
+
+def test_copies():
+    m = MemoryLRU(1000)
+    data = {"genres": ["drama"]}
+    m.put("k", 1, data)
+    data["genres"].append("comedia")
+    got = m.get("k", 1)
+    assert got == {"genres": ["drama"]}
+    got["genres"].append("terror")
+    assert m.get("k", 1) == {"genres": ["drama"]}
+
+
+def test_mtime():
+    m = MemoryLRU(1000)
+    m.put("k", 1, {"a": 1})
+    m.retime("k", 2)
+    assert m.get("k", 1) is None
+    m.put("k", 1, {"a": 1})
+    assert m.get("k", None) is None
+    assert len(m) == 0
+
+
+def test_cache_memory(tmp_path):
+    calls = []
+
+    @StaticCache(str(tmp_path / "{}.json"), store=FileStore(), maxOld=None)
+    def get(i):
+        calls.append(i)
+        return {"id": i, "tags": []}
+
+    get(1)
+    get(1)["tags"].append("x")
+    assert get(1) == {"id": 1, "tags": []}
+    assert get.__cache_obj__.stats.to_dict()["memory"] == 1
+    # se reescribe el fichero por fuera: cambia el mtime y se vuelve a leer
+    fl = tmp_path / "1.json"
+    fl.write_text('{"id": 2}')
+    st = fl.stat()
+    os.utime(fl, (st.st_atime, st.st_mtime + 10))
+    assert get(1) == {"id": 2}
+    assert calls == [1]
@@ -0,0 +1,114 @@
+import pytest
+from requests import Response
+from requests.exceptions import HTTPError, ConnectionError
+from core.retry import RetryPolicy, RetryBudget
+from core.req import Req
+from core.ratelimit import RL
+
+
+def http_error(status: int):
+    r = Response()
+    r.status_code = status
+    return HTTPError(response=r)
+
+
+def failing(*errors: Exception, result="ok"):
+    calls = []
+
+    def fnc():
+        calls.append(1)
+        if len(calls) <= len(errors):
+            raise errors[len(calls) - 1]
+        return result
+    return fnc, calls
+
+
+def policy(tries: int = 3, budget: RetryBudget = None, **kwargs):
+    return RetryPolicy(tries=tries, base=0, jitter=0, budget=budget or RetryBudget(100), **kwargs)
+
+
+def test_retries_until_ok():
+    fnc, calls = failing(ConnectionError(), http_error(503))
+    assert policy().call(fnc) == "ok"
+    assert len(calls) == 3
+
+
+def test_gives_up_after_tries():
+    fnc, calls = failing(*(http_error(502) for _ in range(5)))
+    with pytest.raises(HTTPError):
+        policy(tries=3).call(fnc)
+    assert len(calls) == 3
+
+
+def test_not_retryable():
+    fnc, calls = failing(http_error(404), ValueError())
+    with pytest.raises(HTTPError):
+        policy().call(fnc)
+    fnc, calls = failing(ValueError())
+    with pytest.raises(ValueError):
+        policy().call(fnc)
+    assert len(calls) == 1
+
+
+def test_budget_shared():
+    budget = RetryBudget(2)
+    p1 = policy(tries=5, budget=budget)
+    p2 = policy(tries=5, budget=budget)
+    fnc, calls = failing(*(ConnectionError() for _ in range(10)))
+    with pytest.raises(ConnectionError):
+        p1.call(fnc)
+    # 1 intento + 2 reintentos del presupuesto
+    assert len(calls) == 3
+    assert not budget.take()
+    fnc, calls = failing(ConnectionError())
+    with pytest.raises(ConnectionError):
+        p2.call(fnc)
+    assert len(calls) == 1
+
+
+def test_backoff():
+    p = RetryPolicy(base=1, factor=2, max_wait=5, jitter=0)
+    assert [p.backoff(i) for i in range(5)] == [0, 1, 2, 4, 5]
+    p = RetryPolicy(base=4, factor=1, jitter=0.5)
+    assert all(2 <= p.backoff(1) <= 4 for _ in range(50))
+
+
+def test_deadline():
+    p = RetryPolicy(tries=10, base=10, jitter=0, deadline=0, budget=RetryBudget(100))
+    assert list(p.attempts()) == [0]
+
+
+def test_decorator():
+    fnc, calls = failing(ConnectionError())
+    assert policy()(fnc)() == "ok"
+    assert len(calls) == 2
+
+
+@pytest.fixture
+def req(monkeypatch):
+    penalized = []
+    monkeypatch.setattr(RL, "penalize", lambda url, wait, response=None: penalized.append(wait))
+    r = Req()
+    r.penalized = penalized
+    return r
+
+
+def test_get_json_wait_if_status(req):
+    fnc, calls = failing(http_error(429), result={"ok": 1})
+    req._Req__get_json = lambda *args, **kwargs: fnc()
+    assert req.get_json("https://example.org", wait_if_status={429: 60}) == {"ok": 1}
+    assert len(calls) == 2
+    assert req.penalized == [60]
+
+
+def test_get_json_one_try(req):
+    fnc, calls = failing(http_error(500), http_error(429), http_error(429))
+    req._Req__get_json = lambda *args, **kwargs: fnc()
+    with pytest.raises(HTTPError):
+        req.get_json("https://example.org", wait_if_status={429: 60})
+    assert len(calls) == 1
+    # solo un reintento aunque vuelva a dar el mismo codigo
+    with pytest.raises(HTTPError):
+        req.get_json("https://example.org", wait_if_status={429: 60})
+    assert len(calls) == 3
+    assert req.penalized == [60, 60]
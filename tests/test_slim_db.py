@@ -0,0 +1,133 @@
+from sqlite3 import connect
+import pytest
+from core.dblite import DBlite, SLIM_TABLE
+from tool.slim_db import slim, YEAR_GAP
+from conftest import get_items
+
+MIN_YEAR = 1990
+MAX_YEAR = 2025
+
+
+@pytest.fixture(scope="module")
+def dbs(db_file, tmp_path_factory):
+    full = db_file
+    dst = tmp_path_factory.mktemp("slim") / "imdb.slim.sqlite"
+    # 2 ids fuera de la ventana, como los que vienen del catalogo
+    con = connect(full)
+    ids = tuple(r[0] for r in con.execute("select id from movie where year < ? order by id limit 2", (MIN_YEAR, )))
+    con.close()
+    slim(str(full), str(dst), ids, min_year=MIN_YEAR, max_year=MAX_YEAR)
+    return full, dst, ids
+
+
+def test_slim_subset(dbs):
+    full, dst, ids = dbs
+    con = connect(dst)
+    try:
+        years = con.execute("select min(year), max(year) from movie where id not in (?, ?)", ids).fetchone()
+        assert MIN_YEAR - YEAR_GAP <= years[0] and years[1] <= MAX_YEAR + YEAR_GAP
+        assert con.execute("select count(*) from movie where id in (?, ?)", ids).fetchone()[0] == 2
+        # las fts reconstruidas solo tienen las filas de las tablas reducidas
+        for fts, table in (("TITLE_FTS_AUX", "TITLE"), ("PERSON_FTS_AUX", "PERSON")):
+            n_fts = con.execute(f"select count(*) from {fts}").fetchone()[0]
+            n_tb = con.execute(f"select count(*) from {table}").fetchone()[0]
+            assert n_fts == n_tb
+            # con rank=1 tambien se compara con la tabla content=, falla si no coinciden
+            con.execute(f"insert into {fts}({fts}, rank) values ('integrity-check', 1)")
+        # y los rowid de las vistas apuntan a las mismas filas que en la original
+        con.execute("attach database ? as src", (str(full), ))
+        assert con.execute("""
+            select count(*) from TITLE_FTS v
+            where not exists (select 1 from src.TITLE t where t.movie=v.movie and t.title=v.title)
+        """).fetchone()[0] == 0
+        info = dict(con.execute(f"select key, value from {SLIM_TABLE}"))
+        assert info["version"].endswith(f":{MIN_YEAR}-{MAX_YEAR}")
+    finally:
+        con.close()
+
+
+@pytest.mark.parametrize("score", (False, True))
+def test_slim_search_imdb_ids(dbs, score):
+    full, dst, _ = dbs
+    items = get_items(full, MIN_YEAR, MAX_YEAR)
+    db_full = DBlite(str(full), use_misses=False)
+    db_slim = DBlite(str(dst), use_misses=False)
+    try:
+        r_full = db_full.search_imdb_ids(items, score=score)
+        r_slim = db_slim.search_imdb_ids(items, score=score)
+    finally:
+        db_full.close()
+        db_slim.close()
+    assert sum(1 for i in r_full if i is not None) > len(items) / 2
+    assert r_slim == r_full
+
+
+def test_slim_version(dbs, tmp_path):
+    full, dst, ids = dbs
+    db_full = DBlite(str(full), use_misses=False)
+    db_slim = DBlite(str(dst), use_misses=False)
+    # otra reducida con otros ids tiene la misma version (no se pierden las busquedas fallidas)
+    other = tmp_path / "other.slim.sqlite"
+    slim(str(full), str(other), ids[:1], min_year=MIN_YEAR, max_year=MAX_YEAR)
+    db_other = DBlite(str(other), use_misses=False)
+    try:
+        assert db_slim.version == f"{db_full.version}:{MIN_YEAR}-{MAX_YEAR}"
+        assert db_other.version == db_slim.version
+        assert other.read_bytes() != dst.read_bytes()
+    finally:
+        db_full.close()
+        db_slim.close()
+        db_other.close()
+
+
+def search(file, items):
+    db = DBlite(str(file), use_misses=False)
+    try:
+        return db.search_imdb_ids(items, score=False)
+    finally:
+        db.close()
+
+
+def test_slim_edges(dbs):
+    full, dst, _ = dbs
+    # busquedas de los extremos de la ventana, con candidatos a menos de year_gap años fuera de ella
+    con = connect(full)
+    items = tuple(
+        (t, y, None, None) for t, y in con.execute("""
+            select t.title, case when m.year < ? then ? else ? end from movie m join title t on t.movie=m.id
+            where m.year between ? and ? or m.year between ? and ?
+            order by m.id
+        """, (
+            (MIN_YEAR + MAX_YEAR) // 2, MIN_YEAR, MAX_YEAR,
+            MIN_YEAR - YEAR_GAP + 1, MIN_YEAR + YEAR_GAP - 1,
+            MAX_YEAR - YEAR_GAP + 1, MAX_YEAR + YEAR_GAP - 1
+        ))
+    )
+    con.close()
+    r_full = search(full, items)
+    assert sum(1 for i in r_full if i is not None) > 0
+    assert search(dst, items) == r_full
+
+
+def test_slim_from_slim(dbs, tmp_path):
+    full, dst, ids = dbs
+    again = tmp_path / "again.slim.sqlite"
+    slim(str(dst), str(again), ids, min_year=MIN_YEAR, max_year=MAX_YEAR)
+    # una ventana mayor que la del origen se queda en la del origen
+    wider = tmp_path / "wider.slim.sqlite"
+    slim(str(dst), str(wider), ids, min_year=MIN_YEAR - 10, max_year=MAX_YEAR + 10)
+    narrow = tmp_path / "narrow.slim.sqlite"
+    slim(str(dst), str(narrow), ids, min_year=MIN_YEAR + 10, max_year=MAX_YEAR)
+    dbs = {f: DBlite(str(f), use_misses=False) for f in (full, dst, again, wider, narrow)}
+    try:
+        assert dbs[again].version == dbs[wider].version == dbs[dst].version
+        assert dbs[narrow].version == f"{dbs[full].version}:{MIN_YEAR+10}-{MAX_YEAR}"
+        assert dbs[again].one(f"select count(*) from {SLIM_TABLE}") == dbs[dst].one(f"select count(*) from {SLIM_TABLE}")
+        assert dbs[again].one("select count(*) from movie") == dbs[dst].one("select count(*) from movie")
+    finally:
+        for db in dbs.values():
+            db.close()
+    items = get_items(full, MIN_YEAR, MAX_YEAR)
+    assert search(again, items) == search(dst, items)
+    items = get_items(full, MIN_YEAR + 10, MAX_YEAR)
+    assert search(narrow, items) == search(full, items)
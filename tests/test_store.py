@@ -0,0 +1,96 @@
+from time import sleep
+from sqlite3 import connect
+import pytest
+from core.store import FileStore, SqliteStore
+from core.cache import StaticCache
+
+DATA = {"id": 1, "title": "Ñandú", "items": [1, 2.5, None, True], "sub": {"a": "b"}}
+
+
+@pytest.fixture(params=("file", "sqlite"))
+def store(request, tmp_path):
+    if request.param == "file":
+        yield FileStore()
+        return
+    st = SqliteStore(str(tmp_path / "cache.sqlite"))
+    yield st
+    st.close()
+
+
+def test_round_trip(store, tmp_path):
+    key = str(tmp_path / "rec" / "ficha" / "1.json")
+    assert not store.exists(key)
+    store.dump(key, DATA)
+    assert store.exists(key)
+    assert store.load(key) == DATA
+    assert store.size(key) > 0
+    store.touch(key, 1000)
+    assert store.mtime(key) == 1000
+    store.dump_meta(key, {"version": "x"})
+    assert store.load_meta(key) == {"version": "x"}
+    store.rm(key)
+    assert not store.exists(key)
+
+
+def test_many(store, tmp_path):
+    pattern = str(tmp_path / "rec" / "ficha" / "{}.json")
+    keys = [pattern.format(i) for i in range(5)]
+    with store.batch():
+        for i, k in enumerate(keys):
+            store.dump(k, {"id": i})
+    missing = pattern.format("x")
+    assert store.load_many(keys + [missing]) == {k: {"id": i} for i, k in enumerate(keys)}
+    assert set(store.mtimes(keys + [missing])) == set(keys)
+    assert store.keys(pattern) == tuple(sorted(keys))
+
+
+def test_sqlite_keys_literal(tmp_path):
+    st = SqliteStore(str(tmp_path / "cache.sqlite"))
+    try:
+        for k in ("rec/a_b/1.json", "rec/axb/1.json", "rec/A_b/2.json", "rec/a_b/[x]*.json"):
+            st.dump(k, {})
+        # ni _ ni % son comodines y se distinguen mayusculas
+        assert st.keys("rec/a_b/{}.json") == ("rec/a_b/1.json", "rec/a_b/[x]*.json")
+        assert st.keys("rec/a_b/[x]{}") == ("rec/a_b/[x]*.json", )
+    finally:
+        st.close()
+
+
+def test_sqlite_commit_delay(tmp_path):
+    file = tmp_path / "cache.sqlite"
+    st = SqliteStore(str(file), batch_size=1000, max_delay=0.1)
+    try:
+        st.dump("rec/1.json", {"id": 1})
+
+        def count():
+            con = connect(file)
+            try:
+                return con.execute("select count(*) from kv").fetchone()[0]
+            finally:
+                con.close()
+        assert count() == 0
+        sleep(0.5)
+        assert count() == 1
+    finally:
+        st.close()
+
+
+def test_cache_preload(tmp_path):
+    st = SqliteStore(str(tmp_path / "cache.sqlite"))
+    calls = []
+
+    @StaticCache(str(tmp_path / "{}.json"), store=st, maxOld=None)
+    def get(i):
+        calls.append(i)
+        return {"id": i}
+
+    try:
+        for i in range(3):
+            get(i)
+        cch = get.__cache_obj__
+        assert cch.stale(None, range(5)) == (3, 4)
+        assert cch.stats.to_dict()["preloaded"] == 3
+        assert [get(i) for i in range(5)] == [{"id": i} for i in range(5)]
+        assert calls == [0, 1, 2, 3, 4]
+    finally:
+        st.close()
@@ -0,0 +1,87 @@
+import pytest
+import core.filemanager
+from core.filemanager import FM, FileManager, ZstdDictNotFound
+from core.cache import StaticCache, TupleCache
+from core.memcache import MEMORY
+from core.store import FileStore
+from core import integrity
+
+zstandard = pytest.importorskip("zstandard")
+
+
+def clear_dicts():
+    FileManager.get_zstd_dict.cache_clear()
+    FileManager._FileManager__get_zstd_dicts.cache_clear()
+
+
+@pytest.fixture
+def dict_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(core.filemanager, "ZSTD_DICT_DIR", str(tmp_path / "zstd"))
+    (tmp_path / "zstd").mkdir()
+    clear_dicts()
+    yield tmp_path / "zstd"
+    clear_dicts()
+
+
+def train(dict_dir, seed: int):
+    samples = [FM.dumps_json({"id": i, "seed": seed, "title": f"titulo {i * seed}"}).encode() for i in range(200)]
+    dct = zstandard.train_dictionary(1024, samples)
+    dict_dir.joinpath("test.dict").write_bytes(dct.as_bytes())
+    clear_dicts()
+    return dct
+
+
+def test_missing_dict_is_a_miss(tmp_path, dict_dir):
+    train(dict_dir, 1)
+    calls = []
+
+    @StaticCache(str(tmp_path / "c" / "{}.json.zst"), store=FileStore(), maxOld=None, zstd_dict="test")
+    def get(i):
+        calls.append(i)
+        return {"id": i}
+
+    assert get(1) == {"id": 1}
+    fl = tmp_path / "c" / "1.json.zst"
+    assert zstandard.get_frame_parameters(fl.read_bytes()).dict_id != 0
+    # se reentrena y el diccionario anterior no se ha conservado
+    train(dict_dir, 2)
+    with pytest.raises(ZstdDictNotFound):
+        FM.load(fl)
+    assert integrity._check(str(fl)) is None
+    assert get(1) == {"id": 1}
+    assert calls == [1, 1]
+    assert FM.load(fl) == {"id": 1}
+
+
+
+def test_missing_dict_tuple_cache(tmp_path, dict_dir):
+    train(dict_dir, 1)
+    calls = []
+
+    @TupleCache(str(tmp_path / "c" / "{}.json.zst"), store=FileStore(), maxOld=None, zstd_dict="test", builder=lambda d: ("tuple", d["id"]))
+    def get(i):
+        calls.append(i)
+        return {"id": i}
+
+    assert get(1) == {"id": 1}
+    assert get(1) == ("tuple", 1)
+    train(dict_dir, 2)
+    # en una ejecucion nueva, sin la entrada en MEMORY
+    MEMORY.clear()
+    # no se llama a builder con None, se vuelve a generar
+    assert get(1) == {"id": 1}
+    assert calls == [1, 1]
+
+
+def test_train_keeps_dict_by_id(tmp_path, dict_dir):
+    from tool.zstd import train as tool_train
+    for i in range(100):
+        FM.dump(tmp_path / "s" / f"{i}.json", {"id": i, "title": f"titulo {i}", "tags": ["a", "b", str(i % 7)]})
+    tool_train("test", str(tmp_path / "s" / "{}.json"), size=1024)
+    old = zstandard.ZstdCompressionDict(dict_dir.joinpath("test.dict").read_bytes())
+    assert dict_dir.joinpath(f"test.{old.dict_id()}.dict").is_file()
+    data = FM.dumps_zst({"id": 1}, zstd_dict="test")
+    dict_dir.joinpath("test.dict").unlink()
+    clear_dicts()
+    # sin test.dict se sigue pudiendo leer con la copia por dict_id
+    assert FM.loads_zst(data) == {"id": 1}
@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+"""
+Micro-benchmark de DBlite.search_imdb_id / search_imdb_ids con una
+muestra de peliculas de la propia base de datos (titulo, año y duracion
+ligeramente alterados, como llegan de rtve o efilm), comparando la
+conexion sin ajustes con la de PRAGMAS
+
+python tool/bench_dblite.py --size 500 --repeat 3
+"""
+import argparse
+import logging
+import random
+from time import perf_counter
+from core.log import config_log
+from core.dblite import DB, DBlite
+
+logger = logging.getLogger(__name__)
+
+
+def get_workload(file: str, size: int, seed: int = 0) -> tuple[tuple[str, int, tuple[str, ...], int], ...]:
+    db = DBlite(file, use_misses=False)
+    rows = db.to_tuple("""
+        select
+            (select t.title from title t where t.movie=m.id limit 1),
+            m.year,
+            (select group_concat(p.name, '|') from director d join person p on p.id=d.person where d.movie=m.id),
+            m.duration
+        from movie m
+        where m.year is not null
+        order by random()
+        limit ?
+    """, size)
+    db.close()
+    rnd = random.Random(seed)
+    items = []
+    for title, year, director, duration in rows:
+        if not title:
+            continue
+        items.append((
+            title,
+            year + rnd.choice((-1, 0, 0, 1)),
+            tuple((director or "").split("|")) if director else tuple(),
+            duration + rnd.randint(-3, 3) if duration else None
+        ))
+    return tuple(items)
+
+
+def bench(label: str, fnc, repeat: int):
+    times = []
+    out = None
+    for _ in range(repeat):
+        start = perf_counter()
+        out = fnc()
+        times.append(perf_counter() - start)
+    best = min(times) * 1000
+    found = sum(1 for i in out if i is not None)
+    logger.info(f"{label:<32} {best:9.1f} ms ({found}/{len(out)} encontradas)")
+    return best, out
+
+
+def main(file: str, size: int, repeat: int):
+    items = get_workload(file, size)
+    logger.info(f"{file}: {len(items)} busquedas")
+    results = {}
+    for label, kw in (("sin pragmas", {"pragmas": {}}), ("PRAGMAS", {})):
+        def single():
+            # una instancia nueva por vuelta para que no influya @cache
+            db = DBlite(file, use_misses=False, **kw)
+            try:
+                return tuple(db.search_imdb_id(*i) for i in items)
+            finally:
+                db.close()
+
+        def batch():
+            db = DBlite(file, use_misses=False, **kw)
+            try:
+                return db.search_imdb_ids(items, score=False)
+            finally:
+                db.close()
+
+        t_single, r_single = bench(f"search_imdb_id {label}", single, repeat)
+        t_batch, r_batch = bench(f"search_imdb_ids {label}", batch, repeat)
+        if r_single != r_batch:
+            logger.critical(f"{label}: search_imdb_id y search_imdb_ids no coinciden")
+        results[label] = (t_single, t_batch)
+    (s_old, b_old), (s_new, b_new) = results.values()
+    logger.info(f"search_imdb_id x{s_old / s_new:.1f}, search_imdb_ids x{b_old / b_new:.1f}, batch vs uno a uno x{s_new / b_new:.1f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Benchmark de las busquedas en imdb.sqlite')
+    parser.add_argument('file', nargs='?', default=DB.file)
+    parser.add_argument('--size', type=int, default=500, help='numero de peliculas de la muestra')
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+    config_log("log/bench_dblite.log")
+    main(args.file, args.size, args.repeat)
@@ -0,0 +1,81 @@
+#!/usr/bin/env python3
+"""
+Compara el json estandar con el codec rapido (orjson) serializando
+el catalogo completo (out/films.json o, si no existe, el publicado)
+como objetos Film, igual que hace build_site.py
+
+python tool/bench_json.py --repeat 5
+"""
+import argparse
+import json
+import logging
+from time import perf_counter
+from typing import get_type_hints, get_args, Union
+from core.log import config_log
+from core.filemanager import FM
+from core.codec import JsonCodec, get_codec, to_builtin
+from core.film import Film
+from core.req import R
+from core.git import G
+
+logger = logging.getLogger(__name__)
+
+
+def _convert(tp, v):
+    if v is None:
+        return None
+    args = get_args(tp)
+    if getattr(tp, "__origin__", None) is Union:
+        tp = next(a for a in args if a is not type(None))
+        args = get_args(tp)
+    if isinstance(v, dict) and getattr(tp, "_fields", None) is not None:
+        return _build(tp, v)
+    if isinstance(v, list) and getattr(tp, "__origin__", None) is tuple and args:
+        return tuple(_convert(args[0], i) for i in v)
+    return v
+
+
+def _build(cls, d: dict):
+    hints = get_type_hints(cls)
+    return cls(**{k: _convert(hints.get(k), d.get(k)) for k in cls._fields if k in d})
+
+
+def load_films() -> tuple[Film, ...]:
+    file = FM.resolve_path("out/films.json")
+    data = FM.load(file) if file.is_file() else R.safe_get_json(f"{G.page}/films.json")
+    if not isinstance(data, list):
+        raise ValueError("No se ha podido cargar el catalogo")
+    return tuple(_build(Film, d) for d in data)
+
+
+def bench(label: str, fnc, repeat: int):
+    times = []
+    for _ in range(repeat):
+        start = perf_counter()
+        out = fnc()
+        times.append(perf_counter() - start)
+    best = min(times) * 1000
+    logger.info(f"{label:<28} {best:9.1f} ms")
+    return best, out
+
+
+def main(repeat: int):
+    films = load_films()
+    logger.info(f"{len(films)} films")
+    std = JsonCodec()
+    fast = get_codec()
+    t_old, s_old = bench("json.dumps(__parse(films))", lambda: json.dumps(to_builtin(films), indent=2), repeat)
+    t_new, s_new = bench(f"{fast.name}.dumps(films)", lambda: fast.dumpb(films, indent=2), repeat)
+    if json.loads(s_old) != fast.loads(s_new):
+        logger.critical("La salida de ambos codec no es equivalente")
+    t_lold, _ = bench("json.loads", lambda: std.loads(s_old), repeat)
+    t_lnew, _ = bench(f"{fast.name}.loads", lambda: fast.loads(s_new), repeat)
+    logger.info(f"dumps x{t_old / t_new:.1f}, loads x{t_lold / t_lnew:.1f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Benchmark de los codec json')
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+    config_log("log/bench_json.log")
+    main(args.repeat)
@@ -0,0 +1,54 @@
+#!/usr/bin/env python3
+"""
+Importa / exporta las caches de ficheros a / desde SqliteStore
+
+python tool/cache_store.py import rec/cache.sqlite "rec/rtve/ficha/{}.json.zst" "rec/efilm/ficha/{}.json.zst"
+python tool/cache_store.py export rec/cache.sqlite "rec/rtve/ficha/{}.json.zst"
+"""
+import argparse
+import logging
+from core.log import config_log
+from core.store import FILE_STORE, SqliteStore
+
+logger = logging.getLogger(__name__)
+
+
+def do_import(db: SqliteStore, *patterns: str):
+    for pattern in patterns:
+        count = 0
+        with db.batch():
+            for key in FILE_STORE.keys(pattern):
+                db.dump(key, FILE_STORE.load(key), mtime=FILE_STORE.mtime(key))
+                meta = FILE_STORE.load_meta(key)
+                if meta:
+                    db.dump_meta(key, meta)
+                count = count + 1
+        logger.info(f"{pattern}: {count} entradas importadas en {db.file}")
+
+
+def do_export(db: SqliteStore, *patterns: str):
+    for pattern in patterns:
+        count = 0
+        for key in db.keys(pattern):
+            FILE_STORE.dump(key, db.load(key))
+            FILE_STORE.touch(key, db.mtime(key))
+            meta = db.load_meta(key)
+            if meta:
+                FILE_STORE.dump_meta(key, meta)
+            count = count + 1
+        logger.info(f"{pattern}: {count} entradas exportadas desde {db.file}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Importa/exporta caches entre ficheros y sqlite')
+    parser.add_argument('action', choices=('import', 'export'))
+    parser.add_argument('db', help='fichero sqlite, ej: rec/cache.sqlite')
+    parser.add_argument('patterns', nargs='+', help='patron de la Cache, ej: rec/rtve/ficha/{}.json')
+    args = parser.parse_args()
+    config_log("log/cache_store.log")
+    db = SqliteStore(args.db)
+    if args.action == 'import':
+        do_import(db, *args.patterns)
+    else:
+        do_export(db, *args.patterns)
+    db.close()
@@ -1,4 +1,4 @@
-from core.dblite import DB, dict_factory
+from core.dblite import DB, iter_rows
 from core.filemanager import DictFile
 from types import MappingProxyType
 from core.j2 import Jnj2
@@ -66,18 +66,10 @@ efilm = load_dct(
     "cache/efilm.new.dct.txt",
     ok_file="cache/efilm.dct.txt",
 )
-imdb_ids = tuple(sorted(set(efilm.values()).union(set(rtve.values())))) + ('', )
-imdb: dict[str, dict] = {r['id']: r for r in DB.to_tuple(f"""
-    select
-        *
-    from
-        movie
-    where
-        id in {imdb_ids}
-""", row_factory=dict_factory)}
-imdb_title = DB.get_dict_set(f"select movie, title from title where movie in {imdb_ids}")
-imdb_film = DB.get_dict(f"select movie, filmaffinity from extra where movie in {imdb_ids}")
-
+imdb_cols = DB.get_movies(set(efilm.values()).union(rtve.values()))
+imdb: dict[str, dict] = {r['id']: r for r in iter_rows(imdb_cols)}
+imdb_title = {k: set(v) for k, v in zip(imdb_cols['id'], imdb_cols['titles']) if v}
+imdb_film = dict(zip(imdb_cols['id'], imdb_cols['filmaffinity']))
 
 RTVE = RtveApi()
 EFFILM = EfilmApi()
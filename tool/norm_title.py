@@ -0,0 +1,48 @@
+#!/usr/bin/env python3
+"""
+Añade a imdb.sqlite la tabla TITLE_NORM (norm, year, movie) con los
+titulos normalizados con core.util.norm_title, para que DBlite pueda
+buscar por titulo con una igualdad indexada antes de recurrir a TITLE_FTS
+
+python tool/norm_title.py [imdb.sqlite]  # por defecto la que usa DBlite
+"""
+import argparse
+import logging
+from sqlite3 import connect
+from time import time
+from core.log import config_log
+from core.util import norm_title
+from core.dblite import DB, NORM_TABLE
+
+logger = logging.getLogger(__name__)
+
+
+def build(file: str):
+    start = time()
+    con = connect(file)
+    con.create_function("norm_title", 1, norm_title, deterministic=True)
+    try:
+        con.execute(f"drop table if exists {NORM_TABLE}")
+        con.execute(f"create table {NORM_TABLE} (norm TEXT NOT NULL, year INTEGER, movie TEXT NOT NULL)")
+        con.execute(f"""
+            insert into {NORM_TABLE} (norm, year, movie)
+            select distinct n.norm, m.year, n.movie from (
+                select norm_title(title) norm, movie from title
+            ) n join movie m on m.id=n.movie
+            where n.norm is not null
+        """)
+        con.execute(f"create index {NORM_TABLE}_norm_year on {NORM_TABLE} (norm, year)")
+        con.commit()
+        count = con.execute(f"select count(*) from {NORM_TABLE}").fetchone()[0]
+    finally:
+        con.close()
+    logger.info(f"{file}: {NORM_TABLE} con {count} titulos en {time()-start:.0f}s")
+    return count
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Tabla de titulos normalizados en imdb.sqlite')
+    parser.add_argument('file', nargs='?', default=DB.file, help='base de datos de imdb')
+    args = parser.parse_args()
+    config_log("log/norm_title.log")
+    build(args.file)
@@ -0,0 +1,72 @@
+#!/usr/bin/env python3
+"""
+Regenera las fichas cacheadas a partir de la respuesta original guardada
+en RAW (rec/raw), sin pedir nada al servidor, usando varios procesos
+
+python tool/reparse.py rtve efilm
+python tool/reparse.py rtve --all  # tambien las que ya tienen la version actual
+"""
+import argparse
+import logging
+from os import cpu_count
+from concurrent.futures import ProcessPoolExecutor
+from core.log import config_log
+from core.cache import Cache, get_cache_obj
+from core.rtve import Rtve
+from core.efilm import EFilm
+
+logger = logging.getLogger(__name__)
+
+TARGETS = {
+    "rtve": Rtve.get_ficha,
+    "efilm": EFilm.get_ficha,
+}
+
+
+def _get_cache(target: str) -> Cache:
+    return get_cache_obj(TARGETS[target])
+
+
+def _rebuild(target: str, args: tuple[str, ...]):
+    cch = _get_cache(target)
+    try:
+        return cch.rebuild(None, *args)
+    except Exception as e:
+        return e
+
+
+def reparse(target: str, workers: int = None, force: bool = False):
+    cch = _get_cache(target)
+    keys: list[str] = []
+    args: list[tuple[str, ...]] = []
+    for k in cch.keys():
+        a = cch.parse_key(k)
+        if a is None or (not force and cch.isCurrent(k)):
+            continue
+        keys.append(k)
+        args.append(a)
+    logger.info(f"{target}: {len(keys)} entradas a regenerar (version {cch.version})")
+    ok = ko = 0
+    with ProcessPoolExecutor(max_workers=workers) as ex:
+        results = ex.map(_rebuild, [target] * len(args), args, chunksize=64)
+        for k, data in zip(keys, results):
+            if isinstance(data, Exception):
+                logger.warning(f"{k}: {data}")
+                ko = ko + 1
+            elif data is None:
+                ko = ko + 1
+            else:
+                cch.save_rebuilt(k, data, cch.store.mtime(k))
+                ok = ok + 1
+    logger.info(f"{target}: {ok} regeneradas, {ko} sin respuesta original o con error")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Regenera las fichas a partir de la respuesta original')
+    parser.add_argument('targets', nargs='*', choices=tuple(TARGETS.keys()), help='caches a regenerar (por defecto todas)')
+    parser.add_argument('--workers', type=int, default=cpu_count(), help='numero de procesos')
+    parser.add_argument('--all', action='store_true', help='regenerar tambien las entradas con la version actual')
+    args = parser.parse_args()
+    config_log("log/reparse.log")
+    for t in (args.targets or TARGETS.keys()):
+        reparse(t, workers=args.workers, force=args.all)
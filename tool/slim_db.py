@@ -0,0 +1,194 @@
+#!/usr/bin/env python3
+"""
+Genera una version reducida de imdb.sqlite (mismo esquema) con:
+- las peliculas que referencia el catalogo (ids tt... de cache/*.dct.txt,
+  out/films.json y los ficheros que se pasen con --ids)
+- las peliculas de la ventana de años --min-year / --max-year, ampliada
+  en --year-gap años por cada lado, que son los candidatos que puede
+  devolver DBlite.search_imdb_id para una busqueda de esa ventana
+- las filas del resto de tablas (title, extra, director...) que cuelgan
+  de esas peliculas y las personas que aparecen en ellas
+Las tablas fts5 con content= (TITLE_FTS_AUX, PERSON_FTS_AUX) no se copian,
+se reconstruyen a partir de las tablas ya reducidas
+
+En SLIM_INFO se guarda la version de la base de datos original y la
+ventana de años, que DBlite usa como version de la reducida.
+Si el origen ya es una version reducida se conserva la version de la
+original y la ventana no puede ser mayor que la suya
+
+DBlite la usa automaticamente si no existe imdb.sqlite
+
+python tool/slim_db.py imdb.sqlite imdb.slim.sqlite --min-year 1986 --max-year 2027 --year-gap 5
+"""
+import argparse
+import logging
+import re
+from datetime import date
+from sqlite3 import connect
+from pathlib import Path
+from time import time
+from core.log import config_log
+from core.filemanager import FM
+from core.dblite import DBlite, SLIM_TABLE
+
+logger = logging.getLogger(__name__)
+
+IDS_FILES = ("cache/*.dct.txt", "out/films.json", "out/publication.json")
+# ventana de años por defecto: los ultimos YEARS años (y el siguiente)
+YEARS = 40
+# el year_gap por defecto de DBlite.search_imdb_id
+YEAR_GAP = 5
+re_imdb = re.compile(r"\btt\d+\b")
+re_content = re.compile(r"\bcontent\s*=\s*'([^']+)'", re.IGNORECASE)
+
+
+def get_ids(*patterns: str) -> tuple[str, ...]:
+    ids: set[str] = set()
+    for pattern in patterns:
+        path = FM.resolve_path(pattern)
+        for fl in path.parent.glob(path.name):
+            if fl.is_file():
+                ids.update(re_imdb.findall(fl.read_text(errors="ignore")))
+    return tuple(sorted(ids))
+
+
+def _columns(con, table: str) -> tuple[str, ...]:
+    return tuple(r[1].lower() for r in con.execute(f"pragma src.table_info('{table}')"))
+
+
+def _int(v) -> int | None:
+    return None if v is None else int(v)
+
+
+def get_source(src: str) -> tuple[str, int | None, int | None]:
+    """
+    Version de la base de datos original de la que sale src y la ventana
+    de años de src (None, None si src no es una version reducida)
+    """
+    db = DBlite(src, use_misses=False)
+    try:
+        if not db.has_table(SLIM_TABLE):
+            return db.version, None, None
+        info = db.get_dict(f"select key, value from {SLIM_TABLE}")
+        source = info.get("source") or info["version"].rsplit(":", 1)[0]
+        return source, _int(info.get("min_year")), _int(info.get("max_year"))
+    finally:
+        db.close()
+
+
+def slim(src: str, dst: str, ids: tuple[str, ...], min_year: int = None, max_year: int = None, year_gap: int = YEAR_GAP):
+    start = time()
+    if not Path(src).is_file():
+        raise FileNotFoundError(src)
+    source, src_min, src_max = get_source(src)
+    if src_min is not None:
+        min_year = src_min if min_year is None else max(min_year, src_min)
+    if src_max is not None:
+        max_year = src_max if max_year is None else min(max_year, src_max)
+    version = f"{source}:{min_year or ''}-{max_year or ''}"
+    with FM.atomic(dst) as tmp:
+        con = connect(f"file:{tmp}", uri=True)
+        try:
+            con.execute("attach database ? as src", (f"file:{Path(src).resolve()}?mode=ro&immutable=1", ))
+            schema = con.execute("""
+                select type, name, sql from src.sqlite_master
+                where sql is not null and name not like 'sqlite_%' and name != ?
+            """, (SLIM_TABLE, )).fetchall()
+            virtual = tuple(n for t, n, sql in schema if t == 'table' and sql.upper().startswith("CREATE VIRTUAL"))
+            # tablas internas de fts5 (TITLE_FTS_AUX_data, TITLE_FTS_AUX_idx...), las crea el propio CREATE VIRTUAL TABLE
+            shadow = set(n for t, n, _ in schema if t == 'table' and any(n.startswith(v + "_") for v in virtual))
+            # fts5 con content='TABLA': sus rowid son los de TABLA, se reconstruyen al final
+            rebuild = tuple(n for t, n, sql in schema if n in virtual and re_content.search(sql))
+            without_rowid = set(n for t, n, sql in schema if t == 'table' and "WITHOUT ROWID" in sql.upper())
+            tables = tuple(n for t, n, _ in schema if t == 'table' and n not in shadow and n not in rebuild)
+            for t, n, sql in schema:
+                if t == 'table' and n not in shadow:
+                    con.execute(sql)
+
+            con.execute("create temp table keep_movie (id TEXT PRIMARY KEY)")
+            con.executemany("insert or ignore into keep_movie values (?)", ((i, ) for i in ids))
+            where, args = [], []
+            if min_year is not None:
+                where.append("year >= ?")
+                args.append(min_year - year_gap)
+            if max_year is not None:
+                where.append("year <= ?")
+                args.append(max_year + year_gap)
+            con.execute(
+                "insert or ignore into keep_movie select id from src.movie" + (" where " + " and ".join(where) if where else ""),
+                args
+            )
+            con.execute("create temp table keep_person (id TEXT PRIMARY KEY)")
+
+            def copy(table: str, where: str = None):
+                cols = ", ".join(_columns(con, table))
+                # se conserva el rowid para que sigan valiendo los join por rowid
+                if table not in without_rowid:
+                    cols = "rowid, " + cols
+                sql = f"insert into main.{table} ({cols}) select {cols} from src.{table}"
+                if where:
+                    sql = sql + " where " + where
+                return con.execute(sql).rowcount
+
+            later: list[str] = []
+            for table in tables:
+                cols = _columns(con, table)
+                if table.lower() == "movie":
+                    n = copy(table, "id in (select id from keep_movie)")
+                elif "movie" in cols:
+                    n = copy(table, "movie in (select id from keep_movie)")
+                    if "person" in cols:
+                        con.execute(f"insert or ignore into keep_person select person from main.{table}")
+                else:
+                    later.append(table)
+                    continue
+                logger.info(f"{table}: {n} filas")
+            for table in later:
+                cols = _columns(con, table)
+                if table.lower().startswith("person") and "id" in cols:
+                    n = copy(table, "id in (select id from keep_person)")
+                else:
+                    n = copy(table)
+                logger.info(f"{table}: {n} filas")
+            for table in rebuild:
+                con.execute(f"insert into main.{table}({table}) values ('rebuild')")
+                logger.info(f"{table}: rebuild")
+
+            for t, n, sql in schema:
+                if t not in ('table', ) and n not in shadow:
+                    con.execute(sql)
+            con.execute(f"create table {SLIM_TABLE} (key TEXT PRIMARY KEY, value TEXT)")
+            con.executemany(f"insert into {SLIM_TABLE} values (?, ?)", (
+                ("version", version),
+                ("source", source),
+                ("min_year", min_year),
+                ("max_year", max_year),
+                ("year_gap", year_gap),
+                ("movies", con.execute("select count(*) from keep_movie").fetchone()[0]),
+            ))
+            con.commit()
+        finally:
+            con.close()
+    size = FM.resolve_path(dst).stat().st_size
+    logger.info(f"{src} -> {dst} ({version}): {Path(src).stat().st_size} -> {size} bytes en {time()-start:.0f}s")
+
+
+if __name__ == "__main__":
+    year = date.today().year
+    parser = argparse.ArgumentParser(description='Version reducida de imdb.sqlite')
+    parser.add_argument('src', nargs='?', default='imdb.sqlite', help='base de datos de origen (la completa)')
+    parser.add_argument('dst', nargs='?', default='imdb.slim.sqlite', help='base de datos a generar')
+    parser.add_argument('--min-year', type=int, default=year - YEARS, help='año minimo de las busquedas')
+    parser.add_argument('--max-year', type=int, default=year + 1, help='año maximo de las busquedas')
+    parser.add_argument('--year-gap', type=int, default=YEAR_GAP, help='años que se amplia la ventana por cada lado')
+    parser.add_argument('--ids', nargs='*', default=[], help='otros ficheros de los que sacar ids tt...')
+    args = parser.parse_args()
+    config_log("log/slim_db.log")
+    slim(
+        args.src,
+        args.dst,
+        get_ids(*IDS_FILES, *args.ids),
+        min_year=args.min_year,
+        max_year=args.max_year,
+        year_gap=args.year_gap
+    )
@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+"""
+Herramientas para las caches comprimidas con zstd (.json.zst)
+
+Entrenar un diccionario compartido con una muestra de fichas
+(se guarda en cache/zstd/<nombre>.dict y lo usa la Cache con zstd_dict=<nombre>,
+y una copia en cache/zstd/<nombre>.<dict_id>.dict para poder seguir leyendo
+los ficheros comprimidos con el al reentrenar):
+python tool/zstd.py train rtve_ficha "rec/rtve/ficha/{}.json.zst"
+
+Migrar los .json antiguos a .json.zst (conservando mtime y meta):
+python tool/zstd.py migrate "rec/rtve/ficha/{}.json.zst" --dict rtve_ficha
+"""
+import argparse
+import logging
+import random
+from os import utime
+from core.log import config_log
+from core.filemanager import FM, ZSTD_DICT_DIR, ZSTD_LEVEL
+from core.store import FILE_STORE, ZST
+import zstandard
+
+logger = logging.getLogger(__name__)
+
+
+def _legacy(pattern: str):
+    if not pattern.endswith(ZST):
+        raise ValueError(f"{pattern} no es un patron .json.zst")
+    return pattern[:-len(ZST)]
+
+
+def train(name: str, pattern: str, size: int = 112640, samples: int = 2000):
+    keys = list(FILE_STORE.keys(pattern))
+    random.shuffle(keys)
+    data: list[bytes] = []
+    for k in keys[:samples]:
+        obj = FILE_STORE.load(k)
+        if obj is not None:
+            data.append(FM.dumps_json(obj, indent=None).encode('utf-8'))
+    if len(data) < 10:
+        raise ValueError(f"{pattern}: no hay suficientes muestras ({len(data)})")
+    dct = zstandard.train_dictionary(size, data, level=ZSTD_LEVEL)
+    file = FM.resolve_path(ZSTD_DICT_DIR).joinpath(name + ".dict")
+    file.parent.mkdir(parents=True, exist_ok=True)
+    file.write_bytes(dct.as_bytes())
+    # FM.loads_zst busca el diccionario por dict_id entre todos los .dict
+    file.with_name(f"{name}.{dct.dict_id()}.dict").write_bytes(dct.as_bytes())
+    raw = sum(map(len, data))
+    plain = sum(len(zstandard.ZstdCompressor(level=ZSTD_LEVEL).compress(d)) for d in data)
+    withd = sum(len(zstandard.ZstdCompressor(level=ZSTD_LEVEL, dict_data=dct).compress(d)) for d in data)
+    logger.info(f"{file}: {len(data)} muestras, {raw} -> {plain} bytes sin diccionario, {withd} con diccionario")
+
+
+def migrate(pattern: str, zstd_dict: str = None):
+    legacy = FM.resolve_path(_legacy(pattern).replace("{}", "*"))
+    count = before = after = 0
+    for fl in sorted(legacy.parent.glob(legacy.name)):
+        if not fl.is_file():
+            continue
+        new = fl.with_name(fl.name + ZST)
+        mtime = fl.stat().st_mtime
+        before = before + fl.stat().st_size
+        obj = FM.load(fl)
+        FM.dump(new, obj, zstd_dict=zstd_dict)
+        utime(new, (mtime, mtime))
+        after = after + new.stat().st_size
+        fl.unlink()
+        count = count + 1
+    logger.info(f"{pattern}: {count} ficheros migrados, {before} -> {after} bytes")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Caches .json.zst')
+    sub = parser.add_subparsers(dest='action', required=True)
+    p_train = sub.add_parser('train', help='entrena un diccionario zstd')
+    p_train.add_argument('name', help='nombre del diccionario, ej: rtve_ficha')
+    p_train.add_argument('pattern', help='patron de la Cache, ej: rec/rtve/ficha/{}.json.zst')
+    p_train.add_argument('--size', type=int, default=112640, help='tamaño del diccionario en bytes')
+    p_train.add_argument('--samples', type=int, default=2000, help='numero maximo de muestras')
+    p_migrate = sub.add_parser('migrate', help='convierte los .json antiguos a .json.zst')
+    p_migrate.add_argument('pattern', help='patron de la Cache, ej: rec/rtve/ficha/{}.json.zst')
+    p_migrate.add_argument('--dict', dest='zstd_dict', help='diccionario a usar')
+    args = parser.parse_args()
+    config_log("log/zstd.log")
+    if args.action == 'train':
+        train(args.name, args.pattern, size=args.size, samples=args.samples)
+    else:
+        migrate(args.pattern, zstd_dict=args.zstd_dict)